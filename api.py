@@ -1,10 +1,52 @@
-from flask import Flask, jsonify, request
-from flask_mysqldb import MySQL
+from flask import Flask, Response, jsonify, request, g, stream_with_context
 from flask_cors import CORS
 from datetime import datetime, timedelta
-import firebase_admin
-from firebase_admin import credentials, messaging
+import base64
+import click
+import logging
 import os
+import threading
+
+import MySQLdb
+from cachetools import TTLCache
+from MySQLdb import cursors
+
+from db_pool import ConnectionPool
+from exports import EXPORT_FORMATS, export_chunks
+from catalog_cache import ALL_BOOKS, CatalogCache, book_scopes
+from counters import (
+    bump_counters, bump_due_bucket, bump_due_buckets, track_stock_change, track_stock_changes,
+    read_dashboard_stats, reconcile_counters
+)
+from fines import (
+    FINE_PER_DAY, accrue_fines, calculate_fine, open_fine, read_student_ledger, record_issues,
+    record_returns
+)
+from importers import ImportJobs, chunked, iter_rows, iter_upload_rows, spool_upload
+from logins import LoginBuffer, record_login
+from media import COVER_ROOT, cover_url, ensure_placeholder, media_url, serve_media
+from migrations import apply_migrations
+from negotiation import MSGPACK, compress, pack, preferred_mimetype
+from photos import (
+    MAX_PHOTO_BYTES, PhotoProcessor, PhotoTooLarge, UnsupportedPhoto, save_upload, variant_paths
+)
+from notifications import (
+    FirebaseTransport, HttpTransport, issue_notice, overdue_reminders, return_notice
+)
+from outbox import (
+    OUTBOX_RETENTION_DAYS, OutboxWorkers, enqueue, enqueue_for_students, outbox_stats, purge
+)
+from queries import (
+    BOOKS_BY_CLASS, BOOKS_BY_CLASS_SEMESTER, CATALOG, CATALOG_PAGE, OVERDUE_BOOKS, STUDENT_BY_EMAIL,
+    STUDENT_BY_MOBILE, STUDENTS, TRANSACTIONS_AFTER, TRANSACTIONS_BEFORE, TRANSACTIONS_OFFSET,
+    TRANSACTIONS_PAGE, student_clashes, student_filters, transactions_where
+)
+from query_plans import PLAN_MIN_ROWS, check_query_plans
+from search import book_match, id_filter, match_filter, student_match
+from semesters import SemesterRollover, calculate_semester, roll_over
+from sql_metrics import SqlMetrics, current_route
+from student_index import StudentIndex
+from student_snapshots import StudentSnapshots, load_snapshot
 
 app = Flask(__name__)
 CORS(app)  # Allow React/React Native to connect
@@ -16,15 +58,86 @@ CORS(app)  # Allow React/React Native to connect
 # app.config['MYSQL_DB'] = 'library_management_system'
 # app.config['MYSQL_CURSORCLASS'] = 'DictCursor'  # This is the key change
 
-app.config['MYSQL_HOST'] = 'ballast.proxy.rlwy.net'
-app.config['MYSQL_PORT'] = 23387
-app.config['MYSQL_USER'] = 'root'
-app.config['MYSQL_PASSWORD'] = 'QBtSdGVeovggNCFUymzMqjElIqrIlDyU'
-app.config['MYSQL_DB'] = 'railway'
+app.config['MYSQL_HOST'] = os.environ.get('MYSQL_HOST', 'ballast.proxy.rlwy.net')
+app.config['MYSQL_PORT'] = int(os.environ.get('MYSQL_PORT', 23387))
+app.config['MYSQL_USER'] = os.environ.get('MYSQL_USER', 'root')
+app.config['MYSQL_PASSWORD'] = os.environ.get('MYSQL_PASSWORD', 'QBtSdGVeovggNCFUymzMqjElIqrIlDyU')
+app.config['MYSQL_DB'] = os.environ.get('MYSQL_DB', 'railway')
 app.config['MYSQL_CURSORCLASS'] = 'DictCursor'
 
-
-mysql = MySQL(app)
+# Connection pool
+app.config['MYSQL_POOL_MIN_SIZE'] = int(os.environ.get('MYSQL_POOL_MIN_SIZE', 2))
+app.config['MYSQL_POOL_MAX_SIZE'] = int(os.environ.get('MYSQL_POOL_MAX_SIZE', 10))
+app.config['MYSQL_POOL_CHECKOUT_TIMEOUT'] = 10     # seconds to wait for a free connection
+app.config['MYSQL_POOL_PING_AFTER_IDLE'] = 30      # ping connections idle longer than this
+app.config['MYSQL_POOL_MAX_LIFETIME'] = 1800       # recycle connections older than this
+app.config['MYSQL_POOL_PREWARM'] = os.environ.get('MYSQL_POOL_PREWARM', '1') == '1'
+
+
+pool = ConnectionPool(
+    host=app.config['MYSQL_HOST'],
+    port=app.config['MYSQL_PORT'],
+    user=app.config['MYSQL_USER'],
+    password=app.config['MYSQL_PASSWORD'],
+    db=app.config['MYSQL_DB'],
+    cursorclass=app.config['MYSQL_CURSORCLASS'],
+    min_size=app.config['MYSQL_POOL_MIN_SIZE'],
+    max_size=app.config['MYSQL_POOL_MAX_SIZE'],
+    checkout_timeout=app.config['MYSQL_POOL_CHECKOUT_TIMEOUT'],
+    ping_after_idle=app.config['MYSQL_POOL_PING_AFTER_IDLE'],
+    max_lifetime=app.config['MYSQL_POOL_MAX_LIFETIME'],
+)
+
+if app.config['MYSQL_POOL_PREWARM']:
+    try:
+        pool.prewarm()
+    except Exception as e:
+        logging.getLogger(__name__).warning("Could not pre-warm MySQL pool: %s", e)
+
+# Per-route SQL metrics and slow-query log for /metrics (see sql_metrics.py)
+app.config['SQL_METRICS'] = os.environ.get('SQL_METRICS', '0') == '1'
+app.config['SLOW_QUERY_MS'] = float(os.environ.get('SLOW_QUERY_MS', 200))
+sql_metrics = SqlMetrics(slow_threshold=app.config['SLOW_QUERY_MS'] / 1000) if app.config['SQL_METRICS'] else None
+
+
+# One pooled connection per request, checked out on first use
+def db_connection():
+    if 'db_conn' not in g:
+        g.db_conn = pool.checkout()
+        g.db_cursors = []
+    return g.db_conn
+
+
+def rollback_request_connection():
+    # For except branches: only roll back a connection this request actually
+    # holds. Checking one out here would raise again when the original error
+    # was the pool timing out.
+    conn = g.get('db_conn')
+    if conn is not None:
+        conn.rollback()
+
+
+def db_cursor(cursorclass=None):
+    conn = db_connection()
+    cur = conn.cursor(cursorclass) if cursorclass else conn.cursor()
+    if sql_metrics is not None:
+        cur = sql_metrics.cursor(cur, current_route())
+    g.db_cursors.append(cur)
+    return cur
+
+
+# Close cursors and hand the connection back, including on early returns and errors
+@app.teardown_appcontext
+def release_db_connection(exc):
+    conn = g.pop('db_conn', None)
+    if conn is None:
+        return
+    for cur in g.pop('db_cursors', []):
+        try:
+            cur.close()
+        except Exception:
+            pass
+    pool.checkin(conn)
 
 
 LIBRARIANS = {
@@ -38,6 +151,159 @@ LIBRARIANS = {
 # firebase_admin.initialize_app(cred)
 
 
+# /books paging
+CATALOG_PAGE_SIZE = 50
+CATALOG_MAX_PAGE_SIZE = 500
+CATALOG_STREAM_BATCH = 500
+
+# Catalog reads (/books, /books/<class>[/<semester>], /books/<id>) are served
+# from memory until a write to the books involved
+app.config['CATALOG_CACHE_MAX_BYTES'] = int(os.environ.get('CATALOG_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+app.config['CATALOG_CACHE_TTL'] = int(os.environ.get('CATALOG_CACHE_TTL', 300))
+catalog_cache = CatalogCache(
+    max_bytes=app.config['CATALOG_CACHE_MAX_BYTES'], ttl=app.config['CATALOG_CACHE_TTL']
+)
+
+# List responses: MessagePack for clients that ask for it, and gzip (brotli
+# when installed) for bodies over COMPRESS_MIN_BYTES
+app.config['COMPRESS_MIN_BYTES'] = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+app.config['GZIP_LEVEL'] = int(os.environ.get('GZIP_LEVEL', 6))
+app.config['BROTLI_QUALITY'] = int(os.environ.get('BROTLI_QUALITY', 5))
+
+# Student app screens share one snapshot per student
+student_snapshots = StudentSnapshots()
+
+# /transactions totals, cached per search term
+TRANSACTION_TOTAL_TTL = 30  # seconds
+transaction_totals = TTLCache(maxsize=1024, ttl=TRANSACTION_TOTAL_TTL)
+transaction_totals_lock = threading.Lock()
+
+
+# Bulk imports
+app.config['BULK_IMPORT_CHUNK_SIZE'] = 1000
+BULK_IMPORT_MAX_CHUNK_SIZE = 10000
+
+IMPORT_ERROR_PREVIEW = 100  # errors shown by the job status endpoint unless ?errors=all
+import_jobs = ImportJobs(pool, max_workers=2)
+
+# Student photos: variants are rendered in a process pool
+app.config['PHOTO_WORKERS'] = int(os.environ.get('PHOTO_WORKERS', 2))
+PHOTO_FORM_OVERHEAD = 64 * 1024  # multipart headers around the image itself
+photo_processor = PhotoProcessor(pool, max_workers=app.config['PHOTO_WORKERS'])
+
+# /uploads: let a front-end proxy send file bodies (X-Sendfile) when set
+app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE', '0') == '1'
+ensure_placeholder()
+
+# /student-login: buffer device/last_login writes and flush them in batches
+app.config['LOGIN_WRITE_BEHIND'] = os.environ.get('LOGIN_WRITE_BEHIND', '0') == '1'
+app.config['LOGIN_FLUSH_INTERVAL'] = float(os.environ.get('LOGIN_FLUSH_INTERVAL', 2))
+login_buffer = None
+if app.config['LOGIN_WRITE_BEHIND']:
+    login_buffer = LoginBuffer(pool, flush_interval=app.config['LOGIN_FLUSH_INTERVAL'])
+    login_buffer.start()
+
+# Pushes go to FCM unless FCM_TRANSPORT_URL points somewhere else
+# (e.g. benchmarks/fake_fcm.py for load tests)
+app.config['FCM_TRANSPORT_URL'] = os.environ.get('FCM_TRANSPORT_URL')
+# Outbox delivery threads started inside the web process with its first
+# request; 0 leaves delivery to `flask --app api outbox-worker`
+app.config['OUTBOX_WORKERS'] = int(os.environ.get('OUTBOX_WORKERS', 2))
+# Days sent and failed outbox rows are kept before the workers purge them
+app.config['OUTBOX_RETENTION_DAYS'] = int(os.environ.get('OUTBOX_RETENTION_DAYS', OUTBOX_RETENTION_DAYS))
+
+# /students and /export/students: semester filters within a class only
+SEMESTER_NEEDS_CLASS = "semester filter requires class"
+
+BOOK_REQUIRED_FIELDS = ['title', 'author', 'class', 'quantity', 'semester','subject']
+STUDENT_REQUIRED_FIELDS = [
+    'name',
+    'father_name',
+    'class',
+    'admission_year',
+    'roll_no',
+    'mobile_number',
+    'guardian_mobile_number'
+]
+
+
+def missing_field(data, required_fields):
+    for field in required_fields:
+        if field not in data or not data[field]:
+            return field
+    return None
+
+
+# Circulation rules
+MAX_ISSUED_BOOKS = 5
+ISSUE_PERIOD_DAYS = 14
+MAX_BATCH_RETURNS = 500
+
+
+@app.after_request
+def count_response(response):
+    if sql_metrics is not None:
+        sql_metrics.observe_response(current_route(), response.status_code)
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    return compress(
+        response, request.accept_encodings,
+        min_bytes=app.config['COMPRESS_MIN_BYTES'],
+        gzip_level=app.config['GZIP_LEVEL'],
+        brotli_quality=app.config['BROTLI_QUALITY']
+    )
+
+
+# students.current_semester is rewritten once per term, on the first request
+# that notices the term has changed
+semester_rollover = SemesterRollover(pool)
+
+
+@app.before_request
+def keep_semesters_current():
+    try:
+        semester_rollover.ensure_current(datetime.now())
+    except Exception as e:
+        # Retried on the next request; the stored semesters stay as they were
+        app.logger.warning("Semester rollover failed: %s", e)
+
+
+# /students/search typeahead, served from memory
+student_index = StudentIndex(pool, semester_of=calculate_semester)
+
+
+def issue_book_atomic(cur, student_id, book_id, current_date, check_semester):
+    # A single CALL locks the student and book rows, checks the issue limit,
+    # availability and (optionally) class/semester, then decrements, inserts
+    # and updates the counters. See migrations.ISSUE_BOOK_PROCEDURE_0012.
+    issue_date = current_date.strftime('%Y-%m-%d')
+    due_date = (current_date + timedelta(days=ISSUE_PERIOD_DAYS)).strftime('%Y-%m-%d')
+    cur.execute("CALL issue_book_atomic(%s, %s, %s, %s, %s, %s)", (
+        student_id, book_id, issue_date, due_date, MAX_ISSUED_BOOKS,
+        1 if check_semester else 0
+    ))
+    result = cur.fetchone()
+    # Drain the CALL's trailing status result before the connection is reused
+    while cur.nextset():
+        pass
+    result['due_date'] = due_date
+    return result
+
+
+def issue_failure(result, not_available_message):
+    if result['result'] == 'student_not_found':
+        return jsonify({'error': 'Student not found'}), 404
+    if result['result'] == 'limit_reached':
+        return jsonify({'error': 'Student has reached maximum issued books limit'}), 400
+    if result['result'] == 'wrong_semester':
+        return jsonify({
+            'error': f"Book is for {result['book_class']}-Sem{result['book_semester']}, student is in {result['student_class']}-Sem{result['student_semester']}"
+        }), 400
+    return jsonify({'error': not_available_message}), 400
+
 
 def calculate_status(quantity):
     if quantity > 5:
@@ -48,10 +314,68 @@ def calculate_status(quantity):
         return 'Out of Stock'
 
 
+def encode_body(data, mimetype):
+    if mimetype == MSGPACK:
+        return pack(data)
+    return app.json.dumps(data).encode('utf-8')
+
+
+def negotiated_response(data):
+    # JSON, or MessagePack when the Accept header prefers it
+    mimetype = preferred_mimetype(request.accept_mimetypes)
+    response = Response(encode_body(data, mimetype), mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+
+def cached_catalog_response(key, scopes, load):
+    # load() returns the response data, or None when the item doesn't exist.
+    # Each encoding is cached separately.
+    mimetype = preferred_mimetype(request.accept_mimetypes)
+
+    def encode():
+        data = load()
+        return None if data is None else encode_body(data, mimetype)
+
+    body = catalog_cache.get_or_load(key + (mimetype,), scopes, encode)
+    if body is None:
+        return None
+    response = Response(body, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+
+def invalidate_books(books):
+    # books: (book_id, class, semester) of every book a committed write touched
+    scopes = set()
+    for book_id, book_class, semester in books:
+        scopes |= book_scopes(book_id, book_class, semester)
+    if scopes:
+        catalog_cache.invalidate(scopes)
+
+
+def student_snapshot(student_id):
+    today = datetime.now().date()
+
+    def load():
+        cur = db_cursor()
+        snapshot = load_snapshot(cur, student_id, today)
+        cur.close()
+        return snapshot
+
+    return student_snapshots.get(student_id, today, load)
+
+
+def format_catalog_book(book):
+    book['status'] = calculate_status(book['quantity'])
+    book['isbn'] = f"ISBN-{book['id']:010d}"  # Generate dummy ISBN
+    return book
+
+
 @app.route('/test-db')
 def test_db():
     try:
-        cur = mysql.connection.cursor()
+        cur = db_cursor()
         cur.execute("SHOW TABLES")
         tables = cur.fetchall()
         return jsonify({'status': 'success', 'tables': tables})
@@ -60,45 +384,65 @@ def test_db():
 
 
 
+@app.route('/db-pool-stats', methods=['GET'])
+def get_db_pool_stats():
+    return jsonify(pool.stats())
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    # Prometheus text format; the SQL series need SQL_METRICS=1
+    stats = pool.stats()
+    lines = [
+        "# HELP library_db_pool_connections Pooled MySQL connections",
+        "# TYPE library_db_pool_connections gauge",
+        f'library_db_pool_connections{{state="idle"}} {stats["idle"]}',
+        f'library_db_pool_connections{{state="in_use"}} {stats["in_use"]}',
+        "# HELP library_db_pool_wait_seconds_total Time spent waiting for a free connection",
+        "# TYPE library_db_pool_wait_seconds_total counter",
+        f"library_db_pool_wait_seconds_total {stats['wait_seconds_total']:.6f}",
+    ]
+    body = '\n'.join(lines) + '\n'
+    if sql_metrics is not None:
+        body += sql_metrics.render()
+    return Response(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/metrics/slow-queries', methods=['GET'])
+def get_slow_queries():
+    if sql_metrics is None:
+        return jsonify({'error': 'SQL metrics are off; set SQL_METRICS=1'}), 404
+    return jsonify({
+        'threshold_ms': app.config['SLOW_QUERY_MS'],
+        'slow_queries': sql_metrics.slow_queries()
+    })
+
+
+@app.route('/catalog-cache-stats', methods=['GET'])
+def get_catalog_cache_stats():
+    return jsonify(catalog_cache.stats())
+
+
+@app.route('/student-snapshot-stats', methods=['GET'])
+def get_student_snapshot_stats():
+    return jsonify(student_snapshots.stats())
+
+
+
 @app.route('/dashboard-stats', methods=['GET'])
 def get_dashboard_stats():
     try:
-        cur = mysql.connection.cursor()
-        
-        # Total books
-        cur.execute("SELECT COUNT(*) as total_books FROM books")
-        total_books = cur.fetchone()['total_books']
-        
-        # Available books
-        cur.execute("SELECT COUNT(*) as available_books FROM books WHERE quantity > 0")
-        available_books = cur.fetchone()['available_books']
-        
-        # Total students
-        cur.execute("SELECT COUNT(*) as total_students FROM students")
-        total_students = cur.fetchone()['total_students']
-        
-        # Currently issued books
-        cur.execute("SELECT COUNT(*) as issued_books FROM book_issues WHERE status = 'Issued'")
-        issued_books = cur.fetchone()['issued_books']
+        cur = db_cursor()
         
-        # Overdue books
+        # Counters are maintained by the write paths (see counters.py)
         today = datetime.now().strftime('%Y-%m-%d')
-        cur.execute("""
-            SELECT COUNT(*) as overdue_books 
-            FROM book_issues 
-            WHERE status = 'Issued' AND due_date < %s
-        """, (today,))
-        overdue_books = cur.fetchone()['overdue_books']
-        
+        stats = read_dashboard_stats(cur, today)
         cur.close()
         
-        return jsonify({
-            'total_books': total_books,
-            'available_books': available_books,
-            'total_students': total_students,
-            'issued_books': issued_books,
-            'overdue_books': overdue_books
-        })
+        if not stats:
+            return jsonify({'error': 'Counters not initialised, run `flask --app api migrate`'}), 500
+        
+        return jsonify(stats)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -108,7 +452,7 @@ def get_dashboard_stats():
 @app.route('/classes', methods=['GET'])
 def get_classes():
     try:
-        cur = mysql.connection.cursor()
+        cur = db_cursor()
         
         # Get distinct classes from students table
         cur.execute("SELECT DISTINCT class FROM students ORDER BY class")
@@ -149,8 +493,8 @@ def login():
         return jsonify({"success": True, "user_type": "librarian", "redirect": "/dashboard"})
     else:
         # Check student login
-        cur = mysql.connection.cursor()
-        cur.execute("SELECT student_id FROM students WHERE email = %s AND password = %s", (email, password))
+        cur = db_cursor()
+        cur.execute(STUDENT_BY_EMAIL, (email, password))
         student = cur.fetchone()
         if student:
             return jsonify({"success": True, "user_type": "student", "student_id": student['student_id'], "redirect": "/dashboard"})
@@ -161,87 +505,145 @@ def login():
 # API 1: Get books by class (BCA/BFA/BCOM)
 @app.route('/books/<class_name>', methods=['GET'])
 def get_books(class_name):
-    cur = mysql.connection.cursor()
-    cur.execute("SELECT * FROM books WHERE class = %s", (class_name,))
-    books = cur.fetchall()
-    return jsonify(books)
+    def load():
+        cur = db_cursor()
+        cur.execute(BOOKS_BY_CLASS, (class_name,))
+        books = cur.fetchall()
+        cur.close()
+        return books
+
+    return cached_catalog_response(('class', class_name), [('class', class_name)], load)
 
 
 
 # Get Book From Database
 @app.route('/books', methods=['GET'])
 def get_all_books():
+    # ?stream=1 streams the whole catalog as a JSON array,
+    # ?limit=N[&after=<last book id>] returns one keyset page
+    if request.args.get('stream') in ('1', 'true'):
+        return stream_all_books()
+
     try:
-        cur = mysql.connection.cursor()
-        
-        # Get all books with required fields - using dictionary cursor
-        # cur = mysql.connection.cursor(dictionary=True)
-        cur.execute("""
-            SELECT book_id as id, title, author, subject, class, 
-                   quantity, semester 
-            FROM books
-        """)
-        books = cur.fetchall()
-        # Calculate status for each book
-        for book in books:
-            book['status'] = calculate_status(book['quantity'])
-            book['isbn'] = f"ISBN-{book['id']:010d}"  # Generate dummy ISBN
-        
-        # Get unique values for filters
-        cur.execute("SELECT DISTINCT class FROM books")
-        classes = [row['class'] for row in cur.fetchall()]
-        
-        cur.execute("SELECT DISTINCT subject FROM books")
-        subjects = [row['subject'] for row in cur.fetchall()]
-        
-        statuses = ['Available', 'Low Stock', 'Out of Stock']
-        
-        # Count stats - note the correct column name (quantity vs qunatity)
+        limit = request.args.get('limit', type=int)
+        after = request.args.get('after', type=int)
+        paginated = limit is not None or after is not None
+        if paginated:
+            limit = min(max(limit or CATALOG_PAGE_SIZE, 1), CATALOG_MAX_PAGE_SIZE)
+
+        return cached_catalog_response(
+            ('books', limit, after), [ALL_BOOKS], lambda: load_catalog(limit, after, paginated)
+        )
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def load_catalog(limit, after, paginated):
+    cur = db_cursor()
+
+    # Get all books with required fields - using dictionary cursor
+    # cur = mysql.connection.cursor(dictionary=True)
+    if paginated:
+        cur.execute(CATALOG_PAGE, (after or 0, limit + 1))
+    else:
+        cur.execute(CATALOG)
+    books = [format_catalog_book(book) for book in cur.fetchall()]
+
+    if paginated:
+        has_more = len(books) > limit
+        books = books[:limit]
+        pagination = {
+            'limit': limit,
+            'after': after,
+            'next_cursor': books[-1]['id'] if has_more else None
+        }
+        # Filters and stats only come with the first page
+        if after:
+            cur.close()
+            return {'books': books, 'pagination': pagination}
+
+    # Get unique values for filters
+    cur.execute("SELECT DISTINCT class FROM books")
+    classes = [row['class'] for row in cur.fetchall()]
+    
+    cur.execute("SELECT DISTINCT subject FROM books")
+    subjects = [row['subject'] for row in cur.fetchall()]
+    
+    statuses = ['Available', 'Low Stock', 'Out of Stock']
+    
+    # Count stats - note the correct column name (quantity vs qunatity)
+    cur.execute("""
+        SELECT 
+            SUM(quantity > 5) as available,
+            SUM(quantity > 0 AND quantity <= 5) as low_stock,
+            SUM(quantity = 0) as out_of_stock,
+            COUNT(*) as total 
+        FROM books
+    """)
+    stats = cur.fetchone()
+    
+    cur.close()
+    
+    response = {
+        'books': books,
+        'filters': {
+            'classes': classes,
+            'subjects': subjects,
+            'statuses': statuses
+        },
+        'stats': stats
+    }
+    if paginated:
+        response['pagination'] = pagination
+
+    return response
+
+
+def stream_all_books():
+    # Rows come off an unbuffered server-side cursor and are encoded a batch
+    # at a time, so memory stays flat however large the catalog gets.
+    def generate():
+        cur = db_cursor(cursors.SSDictCursor)
         cur.execute("""
-            SELECT 
-                SUM(quantity > 5) as available,
-                SUM(quantity > 0 AND quantity <= 5) as low_stock,
-                SUM(quantity = 0) as out_of_stock,
-                COUNT(*) as total 
+            SELECT book_id as id, title, author, subject, class,
+                   quantity, semester
             FROM books
+            ORDER BY book_id
         """)
-        stats = cur.fetchone()
-        
+        yield '['
+        first = True
+        while True:
+            rows = cur.fetchmany(CATALOG_STREAM_BATCH)
+            if not rows:
+                break
+            chunk = ','.join(app.json.dumps(format_catalog_book(book)) for book in rows)
+            yield chunk if first else ',' + chunk
+            first = False
+        yield ']'
         cur.close()
-        
-        response = {
-            'books': books,
-            'filters': {
-                'classes': classes,
-                'subjects': subjects,
-                'statuses': statuses
-            },
-            'stats': stats
-        }
-        
-        return jsonify(response)
-    
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
 
 #Get Book By Book Id
 @app.route('/books/<int:book_id>', methods=['GET'])
 def get_book_id(book_id):
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("""
-            SELECT book_id as id, title, authour as author, subject, class, 
-                   qunatity as quantity, semester 
-            FROM books 
-            WHERE book_id = %s
-        """, (book_id,))
-        book = cur.fetchone()
-        cur.close()
-        
-        if book:
-            book['status'] = calculate_status(book['quantity'])
-            book['isbn'] = f"ISBN-{book['id']:010d}"  # Generate dummy ISBN
-            return jsonify(book)
+        def load():
+            cur = db_cursor()
+            cur.execute("""
+                SELECT book_id as id, title, author, subject, class, 
+                       quantity, semester 
+                FROM books 
+                WHERE book_id = %s
+            """, (book_id,))
+            book = cur.fetchone()
+            cur.close()
+            return format_catalog_book(book) if book else None
+        
+        response = cached_catalog_response(('book', book_id), [('book', book_id)], load)
+        if response:
+            return response
         return jsonify({'error': 'Book not found'}), 404
     
     except Exception as e:
@@ -254,25 +656,125 @@ def add_book():
     try:
         data = request.get_json()
         
-        # Validate required fields
-        required_fields = ['title', 'author', 'class', 'quantity', 'semester','subject']
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return jsonify({"success": False, "error": f"Missing or empty field: {field}"}), 400
+        # Required fields, and whole-number quantity and semester, checked
+        # before the INSERT as for imports
+        error = validate_book_row(data)
+        if error:
+            return jsonify({"success": False, "error": error}), 400
 
         # Insert into database
-        cur = mysql.connection.cursor()
+        cur = db_cursor()
         cur.execute(
             """INSERT INTO books 
             (title, author, class, quantity, semester, subject) 
             VALUES (%s, %s, %s, %s, %s, %s)""",
             (data['title'], data['author'], data['class'], data['quantity'], data['semester'], data['subject'])
         )
-        mysql.connection.commit()
+        bump_counters(cur, total_books=1, available_books=1 if data['quantity'] > 0 else 0)
+        db_connection().commit()
+        invalidate_books([(cur.lastrowid, data['class'], data['semester'])])
         return jsonify({"success": True, "message": "Book added successfully!"})
 
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
+
+
+def validate_book_row(record):
+    field = missing_field(record, BOOK_REQUIRED_FIELDS)
+    if field:
+        return f"Missing or empty field: {field}"
+    try:
+        quantity = int(record['quantity'])
+        semester = int(record['semester'])
+    except (TypeError, ValueError):
+        return "quantity and semester must be whole numbers"
+    if quantity < 0:
+        return "quantity cannot be negative"
+    record['quantity'] = quantity
+    record['semester'] = semester
+    return None
+
+
+# Bulk import books from a JSON array, NDJSON or CSV (request body or multipart `file`)
+@app.route('/books/import', methods=['POST'])
+def import_books():
+    # Chunks are committed as they go, so an upload that breaks part way
+    # through still reports what was inserted before the error
+    errors = []
+    counts = {'rows': 0, 'inserted': 0}
+    try:
+        chunk_size = request.args.get('chunk_size', app.config['BULK_IMPORT_CHUNK_SIZE'], type=int)
+        chunk_size = min(max(chunk_size, 1), BULK_IMPORT_MAX_CHUNK_SIZE)
+
+        def valid_rows():
+            for row_number, record, error in iter_upload_rows(request):
+                counts['rows'] += 1
+                if error is None:
+                    error = validate_book_row(record)
+                if error:
+                    errors.append({'row': row_number, 'error': error})
+                    continue
+                yield row_number, (
+                    record['title'], record['author'], record['class'],
+                    record['quantity'], record['semester'], record['subject']
+                )
+
+        cur = db_cursor()
+        conn = db_connection()
+
+        # One multi-row INSERT and one commit per chunk
+        try:
+            for chunk in chunked(valid_rows(), chunk_size):
+                try:
+                    cur.executemany(
+                        """INSERT INTO books
+                        (title, author, class, quantity, semester, subject)
+                        VALUES (%s, %s, %s, %s, %s, %s)""",
+                        [values for _, values in chunk]
+                    )
+                    bump_counters(
+                        cur,
+                        total_books=len(chunk),
+                        available_books=sum(1 for _, values in chunk if values[3] > 0)
+                    )
+                    conn.commit()
+                    counts['inserted'] += len(chunk)
+                except MySQLdb.Error as e:
+                    conn.rollback()
+                    errors.extend({'row': row_number, 'error': str(e)} for row_number, _ in chunk)
+        finally:
+            if counts['inserted']:
+                catalog_cache.clear()
+
+        cur.close()
+        errors.sort(key=lambda error: error['row'])
+
+        return jsonify({
+            "success": not errors,
+            "rows": counts['rows'],
+            "inserted": counts['inserted'],
+            "failed": len(errors),
+            "errors": errors
+        })
+
+    except ValueError as e:
+        return jsonify({
+            "success": False,
+            "error": f"Could not read upload: {e}",
+            "rows": counts['rows'],
+            "inserted": counts['inserted'],
+            "failed": len(errors),
+            "errors": errors
+        }), 400
+    except Exception as e:
+        return jsonify({
+            "success": False,
+            "error": str(e),
+            "rows": counts['rows'],
+            "inserted": counts['inserted'],
+            "failed": len(errors),
+            "errors": errors
+        }), 500
     
 
 
@@ -281,16 +783,17 @@ def add_book():
 @app.route('/students', methods=['GET'])
 def get_all_students():
     try:
-        cur = mysql.connection.cursor()
+        class_filter = request.args.get('class')
+        semester_filter = request.args.get('semester')
+        if semester_filter and not class_filter:
+            return jsonify({'error': SEMESTER_NEEDS_CLASS}), 400
         
-        # Get all students with required fields
-        cur.execute("""
-            SELECT 
-                student_id, name, father_name, mobile_number, 
-                guardian_mobile_number, class, admission_year, 
-                roll_no, college_rollno
-            FROM students
-        """)
+        cur = db_cursor()
+        
+        # Get all students with required fields; class/semester filters are
+        # a seek on idx_students_class_semester
+        where, params = student_filters(class_filter, semester_filter)
+        cur.execute(STUDENTS + where, params)
         students = cur.fetchall()
         
         # Get unique values for filters
@@ -317,7 +820,7 @@ def get_all_students():
             }
         }
         
-        return jsonify(response)
+        return negotiated_response(response)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -329,35 +832,18 @@ def add_student():
     try:
         data = request.get_json()
         
-        # Validate required fields
-        required_fields = [
-            'name', 
-            'father_name', 
-            'class', 
-            'admission_year', 
-            'roll_no',
-            'mobile_number',
-            'guardian_mobile_number'
-        ]
-        
-        for field in required_fields:
-            if field not in data or not data[field]:
-                return jsonify({"success": False, "error": f"Missing or empty field: {field}"}), 400
-
-        # Validate mobile numbers
-        if not str(data['mobile_number']).isdigit() or len(str(data['mobile_number'])) != 10:
-            return jsonify({"success": False, "error": "Mobile number must be 10 digits"}), 400
-            
-        if not str(data['guardian_mobile_number']).isdigit() or len(str(data['guardian_mobile_number'])) != 10:
-            return jsonify({"success": False, "error": "Guardian mobile number must be 10 digits"}), 400
+        # Validate required fields and mobile numbers
+        error = validate_student(data)
+        if error:
+            return jsonify({"success": False, "error": error}), 400
 
         # Insert into database
-        cur = mysql.connection.cursor()
+        cur = db_cursor()
         cur.execute(
             """INSERT INTO students 
             (name, father_name, class, admission_year, roll_no, college_rollno,
-             mobile_number, guardian_mobile_number) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+             mobile_number, guardian_mobile_number, current_semester) 
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
             (
                 data['name'], 
                 data['father_name'], 
@@ -366,10 +852,19 @@ def add_student():
                 data['roll_no'], 
                 data['college_rollno'],
                 data['mobile_number'],
-                data['guardian_mobile_number']
+                data['guardian_mobile_number'],
+                calculate_semester(int(data['admission_year']), datetime.now())
             )
         )
-        mysql.connection.commit()
+        bump_counters(cur, total_students=1)
+        db_connection().commit()
+        student_index.add({
+            'student_id': cur.lastrowid,
+            'name': data['name'],
+            'roll_no': data['roll_no'],
+            'class': data['class'],
+            'admission_year': int(data['admission_year'])
+        })
         
         return jsonify({
             "success": True, 
@@ -381,33 +876,157 @@ def add_student():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+def validate_student(data):
+    field = missing_field(data, STUDENT_REQUIRED_FIELDS)
+    if field:
+        return f"Missing or empty field: {field}"
+
+    if not str(data['mobile_number']).isdigit() or len(str(data['mobile_number'])) != 10:
+        return "Mobile number must be 10 digits"
+
+    if not str(data['guardian_mobile_number']).isdigit() or len(str(data['guardian_mobile_number'])) != 10:
+        return "Guardian mobile number must be 10 digits"
+
+    if not str(data['admission_year']).isdigit():
+        return "Admission year must be a year, e.g. 2024"
+
+    return None
+
+
+def run_student_import(job, path, fmt, chunk_size):
+    # Runs on an import worker thread, outside any request
+    enrolled_on = datetime.now()
+    seen_mobiles = set()
+    seen_rollnos = set()
+
+    def valid_rows():
+        with open(path, 'rb') as upload:
+            for row_number, record, error in iter_rows(upload, fmt):
+                job.rows += 1
+                if error is None:
+                    error = validate_student(record)
+                if error is None:
+                    mobile = str(record['mobile_number'])
+                    rollno = str(record.get('college_rollno') or '') or None
+                    if mobile in seen_mobiles:
+                        error = f"Duplicate mobile_number {mobile} in file"
+                    elif rollno and rollno in seen_rollnos:
+                        error = f"Duplicate college_rollno {rollno} in file"
+                if error:
+                    job.errors.append({'row': row_number, 'error': error})
+                    continue
+
+                seen_mobiles.add(mobile)
+                if rollno:
+                    seen_rollnos.add(rollno)
+                yield row_number, (
+                    record['name'], record['father_name'], record['class'],
+                    record['admission_year'], record['roll_no'], rollno,
+                    mobile, str(record['guardian_mobile_number']),
+                    calculate_semester(int(record['admission_year']), enrolled_on)
+                )
+
+    try:
+        with pool.connection() as conn:
+            cur = conn.cursor()
+            for chunk in chunked(valid_rows(), chunk_size):
+                import_jobs.checkpoint(job)  # progress up to the previous chunk
+                # One set-based lookup per chunk for clashes with existing students
+                mobiles = [values[6] for _, values in chunk]
+                rollnos = [values[5] for _, values in chunk if values[5]]
+                cur.execute(*student_clashes(mobiles, rollnos))
+                existing = cur.fetchall()
+                existing_mobiles = {str(row['mobile_number']) for row in existing}
+                existing_rollnos = {str(row['college_rollno']) for row in existing if row['college_rollno']}
+
+                fresh = []
+                for row_number, values in chunk:
+                    if values[6] in existing_mobiles:
+                        job.errors.append({'row': row_number, 'error': f"mobile_number {values[6]} is already registered"})
+                    elif values[5] and values[5] in existing_rollnos:
+                        job.errors.append({'row': row_number, 'error': f"college_rollno {values[5]} is already registered"})
+                    else:
+                        fresh.append((row_number, values))
+                if not fresh:
+                    continue
+
+                try:
+                    cur.executemany(
+                        """INSERT INTO students
+                        (name, father_name, class, admission_year, roll_no, college_rollno,
+                         mobile_number, guardian_mobile_number, current_semester)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)""",
+                        [values for _, values in fresh]
+                    )
+                    bump_counters(cur, total_students=len(fresh))
+                    conn.commit()
+                    job.inserted += len(fresh)
+                except MySQLdb.Error as e:
+                    conn.rollback()
+                    job.errors.extend({'row': row_number, 'error': str(e)} for row_number, _ in fresh)
+            cur.close()
+        if job.inserted:
+            student_index.refresh()
+    finally:
+        os.remove(path)
+
+
+# Bulk enrollment: the upload is spooled to disk and imported by a background
+# job; poll the returned status_url for progress.
+@app.route('/students/import', methods=['POST'])
+def import_students():
+    try:
+        chunk_size = request.args.get('chunk_size', app.config['BULK_IMPORT_CHUNK_SIZE'], type=int)
+        chunk_size = min(max(chunk_size, 1), BULK_IMPORT_MAX_CHUNK_SIZE)
+
+        path, fmt = spool_upload(request)
+        job = import_jobs.submit('students', run_student_import, path, fmt, chunk_size)
+
+        return jsonify({
+            "success": True,
+            "job_id": job.id,
+            "status_url": f"/students/import/{job.id}"
+        }), 202
+
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/students/import/<job_id>', methods=['GET'])
+def get_student_import(job_id):
+    job = import_jobs.get(job_id)
+    if not job:
+        return jsonify({"success": False, "error": "Import job not found"}), 404
+
+    max_errors = None if request.args.get('errors') == 'all' else IMPORT_ERROR_PREVIEW
+    return jsonify({"success": True, **job.to_dict(max_errors)})
+
+
 
 @app.route('/books/<class_name>/<int:semester>', methods=['GET'])
 def get_class_books(class_name, semester):
     try:
-        cur = mysql.connection.cursor()
-        cur.execute("""
-            SELECT 
-                book_id, title, author, subject, 
-                quantity, semester, class
-            FROM books 
-            WHERE class = %s AND semester = %s
-            ORDER BY subject
-        """, (class_name, semester))
-        books = cur.fetchall()
-        
-        # Calculate status for each book
-        for book in books:
-            book['status'] = 'Available' if book['quantity'] > 0 else 'Out of Stock'
-            book['cover_image'] = 'https://via.placeholder.com/150'
-            # f"https://covers.openlibrary.org/b/isbn/{book['isbn']}-M.jpg" if book['isbn'] else 'https://via.placeholder.com/150'
+        def load():
+            cur = db_cursor()
+            cur.execute(BOOKS_BY_CLASS_SEMESTER, (class_name, semester))
+            books = cur.fetchall()
+            cur.close()
+            
+            # Calculate status for each book
+            for book in books:
+                book['status'] = 'Available' if book['quantity'] > 0 else 'Out of Stock'
+                book['cover_image'] = cover_url(book.pop('cover_path'))
+                # f"https://covers.openlibrary.org/b/isbn/{book['isbn']}-M.jpg" if book['isbn'] else 'https://via.placeholder.com/150'
+            
+            return {
+                'success': True,
+                'books': books,
+                'class': class_name,
+                'semester': semester
+            }
         
-        return jsonify({
-            'success': True,
-            'books': books,
-            'class': class_name,
-            'semester': semester
-        })
+        scope = ('class', class_name, semester)
+        return cached_catalog_response(scope, [scope], load)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
     
@@ -493,14 +1112,10 @@ def student_login():
         if not mobile_number :
             return jsonify({"success": False, "error": "Mobile number required"}), 400
 
-        cur = mysql.connection.cursor()
+        cur = db_cursor()
         
         # 1. Verify student credentials using mobile number
-        cur.execute("""
-            SELECT student_id, name, class 
-            FROM students 
-            WHERE mobile_number = %s
-        """, (mobile_number,))
+        cur.execute(STUDENT_BY_MOBILE, (mobile_number,))
         student = cur.fetchone()
         
         if not student:
@@ -512,40 +1127,14 @@ def student_login():
 
         student_id = student['student_id']
         
-        # 2. Update login info in student_logins table
+        # 2. Update login info in student_logins table (one upsert, or
+        # buffered and flushed in batches when write-behind is on)
         now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        
-        # Check if device exists
-        cur.execute(
-            """SELECT id FROM student_logins 
-            WHERE student_id = %s """,
-            (student_id,)
-        )
-        existing_device = cur.fetchone()
-
-        if existing_device:
-            # Update existing device
-            cur.execute(
-                """UPDATE student_logins SET 
-                last_login = %s,
-                device_name = %s,
-                device_os = %s,
-                device_token = %s
-                WHERE id = %s""",
-                (now, device_info.get('name'), device_info.get('os'),device_info.get('token'), 
-                 existing_device['id'])
-            )
+        if login_buffer is not None:
+            login_buffer.record(student_id, now, device_info)
         else:
-            # Insert new device
-            cur.execute(
-                """INSERT INTO student_logins 
-                (student_id, register_on, last_login, device_name, device_os, device_token)
-                VALUES (%s, %s, %s, %s, %s, %s)""",
-                (student_id, now, now, device_info.get('name'), device_info.get('os'), 
-                 device_info.get('token'))
-            )
-        
-        mysql.connection.commit()
+            record_login(cur, student_id, now, device_info)
+            db_connection().commit()
         
         return jsonify({
             "success": True,
@@ -563,39 +1152,103 @@ def student_login():
 @app.route('/student/<int:student_id>/upload-photo', methods=['POST'])
 def upload_student_photo(student_id):
     try:
-        if 'photo' not in request.files:
-            return jsonify({'success': False, 'error': 'No file uploaded'}), 400
-            
-        photo = request.files['photo']
-        if photo.filename == '':
-            return jsonify({'success': False, 'error': 'No selected file'}), 400
-            
-        # Save to uploads folder (create if doesn't exist)
-        upload_folder = 'uploads/student_photos'
-        if not os.path.exists(upload_folder):
-            os.makedirs(upload_folder)
-            
-        filename = f"{student_id}_{secure_filename(photo.filename)}"
-        filepath = os.path.join(upload_folder, filename)
-        photo.save(filepath)
+        # Reject oversized bodies before reading anything
+        if request.content_length and request.content_length > MAX_PHOTO_BYTES + PHOTO_FORM_OVERHEAD:
+            return jsonify({'success': False, 'error': 'Photo is too large'}), 413
+        
+        # Either a raw image body or the multipart `photo` field
+        if request.mimetype.startswith('image/'):
+            stream = request.stream
+        else:
+            if 'photo' not in request.files:
+                return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+            photo = request.files['photo']
+            if photo.filename == '':
+                return jsonify({'success': False, 'error': 'No selected file'}), 400
+            stream = photo.stream
+        
+        # Streamed to disk in chunks and stored under its content hash
+        try:
+            digest, filepath, size, _ = save_upload(stream)
+        except PhotoTooLarge as e:
+            return jsonify({'success': False, 'error': str(e)}), 413
+        except UnsupportedPhoto as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        # Variants of a picture seen before can be used straight away
+        variants = variant_paths(digest)
+        ready = all(os.path.exists(path) for path in variants.values())
         
         # Update database with file path
-        cur = mysql.connection.cursor()
+        cur = db_cursor()
         cur.execute("""
             UPDATE students 
-            SET photo_path = %s 
+            SET photo_path = %s, photo_hash = %s,
+                photo_thumb_path = %s, photo_web_path = %s
             WHERE student_id = %s
-        """, (filepath, student_id))
-        mysql.connection.commit()
+        """, (filepath, digest,
+              variants['thumb'] if ready else None, variants['web'] if ready else None,
+              student_id))
+        db_connection().commit()
+        cur.close()
+        
+        if not ready:
+            photo_processor.submit(student_id, filepath, digest)
         
         return jsonify({
             'success': True,
-            'photo_url': f"/{filepath}"
+            'photo_url': media_url(filepath),
+            'thumbnail_url': media_url(variants['thumb']) if ready else None,
+            'web_url': media_url(variants['web']) if ready else None,
+            'variants': 'ready' if ready else 'processing',
+            'size': size
         })
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
     
 
+@app.route('/books/<int:book_id>/cover', methods=['POST'])
+def upload_book_cover(book_id):
+    try:
+        if request.content_length and request.content_length > MAX_PHOTO_BYTES + PHOTO_FORM_OVERHEAD:
+            return jsonify({'success': False, 'error': 'Cover is too large'}), 413
+        
+        if request.mimetype.startswith('image/'):
+            stream = request.stream
+        else:
+            if 'cover' not in request.files:
+                return jsonify({'success': False, 'error': 'No file uploaded'}), 400
+            stream = request.files['cover'].stream
+        
+        cur = db_cursor()
+        cur.execute("SELECT book_id, class, semester FROM books WHERE book_id = %s", (book_id,))
+        book = cur.fetchone()
+        if not book:
+            return jsonify({'success': False, 'error': 'Book not found'}), 404
+        
+        try:
+            _, filepath, size, _ = save_upload(stream, root=COVER_ROOT)
+        except PhotoTooLarge as e:
+            return jsonify({'success': False, 'error': str(e)}), 413
+        except UnsupportedPhoto as e:
+            return jsonify({'success': False, 'error': str(e)}), 400
+        
+        cur.execute("UPDATE books SET cover_path = %s WHERE book_id = %s", (filepath, book_id))
+        db_connection().commit()
+        cur.close()
+        invalidate_books([(book_id, book['class'], book['semester'])])
+        
+        return jsonify({'success': True, 'cover_url': media_url(filepath), 'size': size})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# Student photos and book covers, cacheable by URL
+@app.route('/uploads/<path:filename>', methods=['GET'])
+def get_media(filename):
+    return serve_media(filename)
+
+
 # Issue Book API
 @app.route('/issue-book', methods=['POST'])
 def issue_book():
@@ -603,34 +1256,26 @@ def issue_book():
         data = request.get_json()
         student_id = data['student_id']
         book_id = data['book_id']
-        issue_date = datetime.now().strftime('%Y-%m-%d')
-        due_date = (datetime.now() + timedelta(days=14)).strftime('%Y-%m-%d')  # 2 weeks
         
-        cur = mysql.connection.cursor()
+        cur = db_cursor()
         
-        # Check book availability
-        cur.execute("SELECT quantity FROM books WHERE book_id = %s", (book_id,))
-        book = cur.fetchone()
-        if not book or book['quantity'] <= 0:
-            return jsonify({'error': 'Book not available'}), 400
-        
-        # Issue book
-        cur.execute("""
-            INSERT INTO book_issues 
-            (student_id, book_id, issue_date, due_date, status) 
-            VALUES (%s, %s, %s, %s, 'Issued')
-        """, (student_id, book_id, issue_date, due_date))
+        # Availability, issue limit, insert and quantity update in one round trip
+        result = issue_book_atomic(cur, student_id, book_id, datetime.now(), check_semester=False)
+        if result['result'] != 'issued':
+            return issue_failure(result, 'Book not available')
+        enqueue_for_students(cur, [issue_notice(student_id, [result['book_title']], result['due_date'])])
         
-        # Update book quantity
-        cur.execute("UPDATE books SET quantity = quantity - 1 WHERE book_id = %s", (book_id,))
-        
-        mysql.connection.commit()
+        db_connection().commit()
         cur.close()
+        invalidate_transaction_totals()
+        student_index.adjust_issued({int(student_id): 1})
+        invalidate_books([(book_id, result['book_class'], result['book_semester'])])
+        student_snapshots.invalidate([student_id])
         
         return jsonify({'message': 'Book issued successfully'})
     
     except Exception as e:
-        mysql.connection.rollback()
+        rollback_request_connection()
         return jsonify({'error': str(e)}), 500
 
 # Return Book API
@@ -644,12 +1289,15 @@ def return_book():
         if not issue_id or not student_id:
             return jsonify({'success': False, 'error': 'Missing required fields'}), 400
         
-        cur = mysql.connection.cursor()
+        cur = db_cursor()
         
-        # Verify the book belongs to this student
+        # Verify the book belongs to this student (and lock the issue row)
         cur.execute("""
-            SELECT book_id FROM book_issues 
-            WHERE issue_id = %s AND student_id = %s AND status = 'Issued'
+            SELECT bi.book_id, bi.due_date, bi.fine, b.title, b.class, b.semester
+            FROM book_issues bi
+            JOIN books b ON bi.book_id = b.book_id
+            WHERE bi.issue_id = %s AND bi.student_id = %s AND bi.status = 'Issued'
+            FOR UPDATE
         """, (issue_id, student_id))
         issue = cur.fetchone()
         
@@ -658,10 +1306,8 @@ def return_book():
         
         # Calculate fine if overdue
         today = datetime.now().date()
-        cur.execute("SELECT due_date FROM book_issues WHERE issue_id = %s", (issue_id,))
-        due_date = cur.fetchone()['due_date']
-        days_late = max(0, (today - due_date).days)
-        fine = days_late * 10  # ₹10 per day
+        due_date = issue['due_date']
+        days_late, fine = calculate_fine(due_date, today)
         
         # Update records
         cur.execute("""
@@ -678,7 +1324,17 @@ def return_book():
             WHERE book_id = %s
         """, (issue['book_id'],))
         
-        mysql.connection.commit()
+        # Keep dashboard counters and the fine ledger in step
+        bump_counters(cur, issued_books=-1)
+        bump_due_bucket(cur, due_date, -1)
+        track_stock_change(cur, issue['book_id'], 1)
+        record_returns(cur, [(student_id, issue['fine'], fine)])
+        enqueue_for_students(cur, [return_notice(student_id, issue['title'], fine)])
+        
+        db_connection().commit()
+        student_index.adjust_issued({int(student_id): -1})
+        invalidate_books([(issue['book_id'], issue['class'], issue['semester'])])
+        student_snapshots.invalidate([student_id])
         
         return jsonify({
             'success': True,
@@ -687,7 +1343,106 @@ def return_book():
             'days_late': days_late
         })
     except Exception as e:
-        mysql.connection.rollback()
+        rollback_request_connection()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+
+# End-of-semester collection: return many issues in one transaction
+@app.route('/books/return-batch', methods=['POST'])
+def return_book_batch():
+    try:
+        data = request.get_json()
+        issue_ids = data.get('issue_ids') or []
+        student_id = data.get('student_id')  # optional: only accept this student's issues
+
+        if not isinstance(issue_ids, list) or not issue_ids:
+            return jsonify({'success': False, 'error': 'issue_ids must be a non-empty list'}), 400
+        if len(issue_ids) > MAX_BATCH_RETURNS:
+            return jsonify({'success': False, 'error': f'At most {MAX_BATCH_RETURNS} returns per batch'}), 400
+        try:
+            issue_ids = list(dict.fromkeys(int(issue_id) for issue_id in issue_ids))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'issue_ids must be integers'}), 400
+
+        cur = db_cursor()
+        today = datetime.now().date()
+
+        # All target issues in one query, locked for the rest of the transaction
+        clause, params = id_filter('issue_id', issue_ids)
+        query = ("SELECT bi.issue_id, bi.student_id, bi.book_id, bi.due_date, bi.fine, "
+                 "b.title, b.class, b.semester "
+                 "FROM book_issues bi JOIN books b ON bi.book_id = b.book_id "
+                 "WHERE bi." + clause + " AND bi.status = 'Issued'")
+        if student_id:
+            query += " AND bi.student_id = %s"
+            params.append(student_id)
+        cur.execute(query + " FOR UPDATE", params)
+        issues = {issue['issue_id']: issue for issue in cur.fetchall()}
+
+        # Fines for the whole batch in one pass
+        results = []
+        copies_back = {}   # book_id -> copies returned
+        due_buckets = {}   # due_date -> issues closed
+        total_fine = 0
+        ledger_returns = []
+        notices = []
+        for issue_id in issue_ids:
+            issue = issues.get(issue_id)
+            if not issue:
+                results.append({'issue_id': issue_id, 'returned': False, 'error': 'No active issue found'})
+                continue
+            days_late, fine = calculate_fine(issue['due_date'], today)
+            total_fine += fine
+            copies_back[issue['book_id']] = copies_back.get(issue['book_id'], 0) + 1
+            due_buckets[issue['due_date']] = due_buckets.get(issue['due_date'], 0) - 1
+            ledger_returns.append((issue['student_id'], issue['fine'], fine))
+            notices.append(return_notice(issue['student_id'], issue['title'], fine))
+            results.append({'issue_id': issue_id, 'returned': True, 'fine': fine, 'days_late': days_late})
+
+        if issues:
+            # The same fine formula as calculate_fine, applied server-side to every row
+            clause, params = id_filter('issue_id', list(issues))
+            cur.execute("""
+                UPDATE book_issues
+                SET return_date = %s,
+                    status = 'Returned',
+                    fine = GREATEST(DATEDIFF(%s, due_date), 0) * %s
+                WHERE """ + clause, [today, today, FINE_PER_DAY] + params)
+
+            # Restore stock with one UPDATE per distinct number of copies returned
+            books_by_copies = {}
+            for book_id, copies in copies_back.items():
+                books_by_copies.setdefault(copies, []).append(book_id)
+            for copies, book_ids in books_by_copies.items():
+                clause, params = id_filter('book_id', book_ids)
+                cur.execute("UPDATE books SET quantity = quantity + %s WHERE " + clause, [copies] + params)
+                track_stock_changes(cur, book_ids, copies)
+
+            # Keep dashboard counters and the fine ledger in step
+            bump_counters(cur, issued_books=-len(issues))
+            bump_due_buckets(cur, due_buckets)
+            record_returns(cur, ledger_returns)
+            enqueue_for_students(cur, notices)
+
+        db_connection().commit()
+        cur.close()
+        returned_by_student = {}
+        for issue in issues.values():
+            returned_by_student[issue['student_id']] = returned_by_student.get(issue['student_id'], 0) - 1
+        student_index.adjust_issued(returned_by_student)
+        invalidate_books((issue['book_id'], issue['class'], issue['semester'])
+                         for issue in issues.values())
+        student_snapshots.invalidate(returned_by_student)
+
+        return jsonify({
+            'success': bool(issues),
+            'returned': len(issues),
+            'total_fine': total_fine,
+            'results': results
+        })
+
+    except Exception as e:
+        rollback_request_connection()
         return jsonify({'success': False, 'error': str(e)}), 500
     
 
@@ -830,53 +1585,119 @@ def return_book():
 
 
 
+def encode_transaction_cursor(row):
+    raw = f"{row['issue_date']}|{row['issue_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_transaction_cursor(token):
+    padded = token + '=' * (-len(token) % 4)
+    issue_date, issue_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+    return issue_date, int(issue_id)
+
+
+def count_transactions(cur, search, where, params, approximate=False):
+    if approximate:
+        # Optimizer estimate instead of a count; free for the unfiltered case
+        if not params:
+            cur.execute("""
+                SELECT TABLE_ROWS as total FROM information_schema.TABLES
+                WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'book_issues'
+            """)
+            return int(cur.fetchone()['total'] or 0)
+        cur.execute("EXPLAIN SELECT COUNT(*) FROM book_issues bi " + where, params)
+        return int(cur.fetchone()['rows'] or 0)
+
+    key = search.strip().lower()
+    with transaction_totals_lock:
+        total = transaction_totals.get(key)
+    if total is None:
+        cur.execute("SELECT COUNT(*) as total FROM book_issues bi " + where, params)
+        total = cur.fetchone()['total']
+        with transaction_totals_lock:
+            transaction_totals[key] = total
+    return total
+
+
+def invalidate_transaction_totals():
+    # Only new book_issues rows change the counts; returns update rows in place
+    with transaction_totals_lock:
+        transaction_totals.clear()
+
+
 @app.route('/transactions', methods=['GET'])
 def get_transactions():
+    # Keyset paging: pass the `next`/`prev` cursor from a previous response as
+    # ?after= or ?before=. ?page= (OFFSET paging) still works for old clients.
+    # ?total=approximate swaps the count for the optimizer's row estimate.
     try:
         page = int(request.args.get('page', 1))
         per_page = int(request.args.get('per_page', 10))
         search = request.args.get('search', '')
+        after = request.args.get('after')
+        before = request.args.get('before')
+        approximate = request.args.get('total') == 'approximate'
         
-        cur = mysql.connection.cursor()
-        
-        base_query = """
-            SELECT 
-                bi.issue_id, bi.issue_date, bi.due_date, bi.return_date, bi.status,
-                b.title as book_title, b.author as book_author,
-                s.name as student_name, s.roll_no as student_roll
-            FROM book_issues bi
-            JOIN books b ON bi.book_id = b.book_id
-            JOIN students s ON bi.student_id = s.student_id
-            WHERE 1=1
-        """
-        
+        cur = db_cursor()
+
+        filters = []
         if search:
-            base_query += f"""
-                AND (b.title LIKE '%{search}%' 
-                OR b.author LIKE '%{search}%'
-                OR s.name LIKE '%{search}%'
-                OR s.roll_no LIKE '%{search}%')
-            """
-        
-        # Count total
-        count_query = "SELECT COUNT(*) as total FROM (" + base_query + ") as subquery"
-        cur.execute(count_query)
-        total = cur.fetchone()['total']
-        
-        # Pagination
-        offset = (page - 1) * per_page
-        base_query += f" ORDER BY bi.issue_date DESC LIMIT {per_page} OFFSET {offset}"
-        
-        cur.execute(base_query)
-        transactions = cur.fetchall()
+            # Resolve the term to ids through the FULLTEXT indexes, then
+            # touch book_issues only through its book_id/student_id indexes
+            for column, match in (('bi.book_id', book_match(search)),
+                                  ('bi.student_id', student_match(search))):
+                matched = match_filter(cur, column, match)
+                if matched:
+                    filters.append(matched)
+            if not filters:
+                cur.close()
+                return negotiated_response({
+                    'transactions': [],
+                    'pagination': {'page': page, 'per_page': per_page, 'total': 0,
+                                   'total_is_approximate': False, 'next': None, 'prev': None}
+                })
+
+        where, params = transactions_where(filters)
+
+        # Count total (cached per search term)
+        total = count_transactions(cur, search, where, params, approximate)
+
+        page_query = TRANSACTIONS_PAGE + where
+
+        # Pagination, newest first on (issue_date, issue_id)
+        if after or before:
+            try:
+                issue_date, issue_id = decode_transaction_cursor(after or before)
+            except ValueError:
+                return jsonify({'error': 'Invalid cursor'}), 400
+            page_query += TRANSACTIONS_AFTER if after else TRANSACTIONS_BEFORE
+            cur.execute(page_query, params + [issue_date, issue_date, issue_id, per_page + 1])
+            transactions = list(cur.fetchall())
+            has_more = len(transactions) > per_page
+            transactions = transactions[:per_page]
+            if before:
+                transactions.reverse()
+            has_next = has_more if after else True
+            has_prev = True if after else has_more
+        else:
+            offset = (page - 1) * per_page
+            page_query += TRANSACTIONS_OFFSET
+            cur.execute(page_query, params + [per_page + 1, offset])
+            transactions = list(cur.fetchall())
+            has_next = len(transactions) > per_page
+            transactions = transactions[:per_page]
+            has_prev = page > 1
         cur.close()
         
-        return jsonify({
+        return negotiated_response({
             'transactions': transactions,
             'pagination': {
                 'page': page,
                 'per_page': per_page,
-                'total': total
+                'total': total,
+                'total_is_approximate': approximate,
+                'next': encode_transaction_cursor(transactions[-1]) if transactions and has_next else None,
+                'prev': encode_transaction_cursor(transactions[0]) if transactions and has_prev else None
             }
         })
     
@@ -888,31 +1709,118 @@ def get_transactions():
 @app.route('/overdue-books', methods=['GET'])
 def get_overdue_books():
     try:
-        cur = mysql.connection.cursor()
+        cur = db_cursor()
         today = datetime.now().strftime('%Y-%m-%d')
         
-        cur.execute("""
-            SELECT 
-                bi.issue_id, bi.due_date,
-                b.title as book_title, b.author as book_author,
-                s.name as student_name, s.roll_no, s.mobile_number
-            FROM book_issues bi
-            JOIN books b ON bi.book_id = b.book_id
-            JOIN students s ON bi.student_id = s.student_id
-            WHERE bi.status = 'Issued' AND bi.due_date < %s
-            ORDER BY bi.due_date
-        """, (today,))
+        cur.execute(OVERDUE_BOOKS, (today,))
         
         overdue_books = cur.fetchall()
         cur.close()
         
-        return jsonify({'overdue_books': overdue_books})
+        return negotiated_response({'overdue_books': overdue_books})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
     
 
 
+def stream_export(name, query, params=()):
+    # ?format=csv (default) or ndjson. The query runs before the response
+    # starts, so a failing query is still a 500; rows then stream off an
+    # unbuffered cursor.
+    fmt = request.args.get('format', 'csv')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f"format must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+
+    cur = db_cursor(cursors.SSCursor)
+    cur.execute(query, params)
+
+    def generate():
+        try:
+            yield from export_chunks(cur, fmt)
+        finally:
+            cur.close()
+
+    response = Response(stream_with_context(generate()), mimetype=EXPORT_FORMATS[fmt])
+    filename = f"{name}-{datetime.now().strftime('%Y%m%d')}.{fmt}"
+    response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    response.headers['X-Accel-Buffering'] = 'no'  # don't let nginx hold the stream back
+    return response
+
+
+# Full circulation history, optionally ?status=Issued|Returned and
+# ?from=/?to= (YYYY-MM-DD, on issue date)
+@app.route('/export/transactions', methods=['GET'])
+def export_transactions():
+    try:
+        conditions, params = [], []
+        if request.args.get('status'):
+            conditions.append("bi.status = %s")
+            params.append(request.args['status'])
+        if request.args.get('from'):
+            conditions.append("bi.issue_date >= %s")
+            params.append(request.args['from'])
+        if request.args.get('to'):
+            conditions.append("bi.issue_date < %s + INTERVAL 1 DAY")
+            params.append(request.args['to'])
+
+        query = """
+            SELECT
+                bi.issue_id, bi.issue_date, bi.due_date, bi.return_date, bi.status,
+                b.book_id, b.title as book_title, b.author as book_author,
+                s.student_id, s.name as student_name, s.roll_no as student_roll,
+                s.class as student_class
+            FROM book_issues bi
+            JOIN books b ON bi.book_id = b.book_id
+            JOIN students s ON bi.student_id = s.student_id
+        """
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY bi.issue_id"
+        return stream_export('transactions', query, params)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@app.route('/export/overdue-books', methods=['GET'])
+def export_overdue_books():
+    try:
+        today = datetime.now().strftime('%Y-%m-%d')
+        return stream_export('overdue-books', """
+            SELECT
+                bi.issue_id, bi.issue_date, bi.due_date,
+                DATEDIFF(%s, bi.due_date) as days_overdue,
+                b.book_id, b.title as book_title, b.author as book_author,
+                s.student_id, s.name as student_name, s.roll_no, s.class as student_class,
+                s.mobile_number, s.guardian_mobile_number
+            FROM book_issues bi
+            JOIN books b ON bi.book_id = b.book_id
+            JOIN students s ON bi.student_id = s.student_id
+            WHERE bi.status = 'Issued' AND bi.due_date < %s
+            ORDER BY bi.due_date, bi.issue_id
+        """, (today, today))
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+# Student roster, optionally ?class= and ?semester= (with class) as on /students
+@app.route('/export/students', methods=['GET'])
+def export_students():
+    try:
+        class_filter = request.args.get('class')
+        semester_filter = request.args.get('semester')
+        if semester_filter and not class_filter:
+            return jsonify({'error': SEMESTER_NEEDS_CLASS}), 400
+        where, params = student_filters(class_filter, semester_filter)
+        return stream_export('students', STUDENTS + where + " ORDER BY student_id", params)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+
 # GET endpoint to search students by class/semester
 @app.route('/students/search', methods=['GET'])
 def search_students():
@@ -920,49 +1828,21 @@ def search_students():
         class_filter = request.args.get('class')
         semester_filter = request.args.get('semester')
         search_term = request.args.get('search', '')
-        current_year = datetime.now().year
-        current_month = datetime.now().month
-        
-        # Calculate current semester (assuming 2 semesters per year)
-        current_semester = 1 if current_month <= 6 else 2
         
-        query = """
-            SELECT 
-                s.student_id, 
-                s.name, 
-                s.roll_no, 
-                s.class, 
-                s.admission_year,
-                /* Calculate current semester */
-                ((%s - s.admission_year) * 2 + %s) AS current_semester,
-                (SELECT COUNT(*) FROM book_issues bi 
-                 WHERE bi.student_id = s.student_id AND bi.status = 'Issued') as issued_count
-            FROM students s
-            WHERE 1=1
-        """
-        
-        # Start with these parameters for semester calculation
-        params = [current_year, current_semester]
-        
-        if class_filter:
-            query += " AND s.class = %s"
-            params.append(class_filter)
-            
+        # Semesters are whole numbers; anything else matches no student
         if semester_filter:
-            # Compare against calculated semester
-            query += " AND ((%s - s.admission_year) * 2 + %s) = %s"
-            params.extend([current_year, current_semester, semester_filter])
-            
-        if search_term:
-            query += " AND (s.name LIKE %s OR s.roll_no LIKE %s)"
-            params.extend([f"%{search_term}%", f"%{search_term}%"])
-            
-        query += " ORDER BY s.name LIMIT 20"
+            try:
+                semester_filter = int(semester_filter)
+            except ValueError:
+                return jsonify([])
+        else:
+            semester_filter = None
         
-        cur = mysql.connection.cursor()
-        cur.execute(query, params)
-        students = cur.fetchall()
-        cur.close()
+        # Prefix match on name words and roll numbers, with active-issue
+        # counts, straight from the in-memory index
+        students = student_index.search(
+            search_term, datetime.now(), class_filter=class_filter, semester_filter=semester_filter
+        )
         
         return jsonify(students)
     
@@ -970,87 +1850,149 @@ def search_students():
         return jsonify({'error': str(e)}), 500
     
 
+@app.route('/students/search-index-stats', methods=['GET'])
+def get_student_index_stats():
+    return jsonify(student_index.stats())
+
+
 @app.route('/books/issue', methods=['POST'])
 def book_issue_book():
     try:
         data = request.get_json()
         student_id = data['student_id']
         book_id = data['book_id']
-        current_date = datetime.now()
         
-        # Validate student can borrow more books
-        cur = mysql.connection.cursor()
-        cur.execute("""
-            SELECT COUNT(*) as current_issues 
-            FROM book_issues 
-            WHERE student_id = %s AND status = 'Issued'
-        """, (student_id,))
-        issues = cur.fetchone()
+        # Issue limit, availability and class/semester match are checked by
+        # the same server-side call that issues the book
+        cur = db_cursor()
+        result = issue_book_atomic(cur, student_id, book_id, datetime.now(), check_semester=True)
+        if result['result'] != 'issued':
+            return issue_failure(result, 'Book not available for issuing')
+        enqueue_for_students(cur, [issue_notice(student_id, [result['book_title']], result['due_date'])])
         
-        if issues['current_issues'] >= 5:  # Max 5 books per student
-            return jsonify({'error': 'Student has reached maximum issued books limit'}), 400
-            
-        # Get book details
-        cur.execute("""
-            SELECT title, class, semester, quantity 
-            FROM books 
-            WHERE book_id = %s
-        """, (book_id,))
-        book = cur.fetchone()
+        db_connection().commit()
+        cur.close()
+        invalidate_transaction_totals()
+        student_index.adjust_issued({int(student_id): 1})
+        invalidate_books([(book_id, result['book_class'], result['book_semester'])])
+        student_snapshots.invalidate([student_id])
         
-        if not book or book['quantity'] <= 0:
-            return jsonify({'error': 'Book not available for issuing'}), 400
-            
-        # Get student details and calculate current semester
+        return jsonify({
+            'message': 'Book issued successfully',
+            'due_date': result['due_date'],
+            'book_title': result['book_title'],
+            'student_semester': result['student_semester']  # Return calculated semester for reference
+        })
+        
+    except Exception as e:
+        rollback_request_connection()
+        return jsonify({'error': str(e)}), 500
+
+
+# Circulation desk: issue several books to one student in a single transaction
+@app.route('/books/issue-batch', methods=['POST'])
+def book_issue_batch():
+    try:
+        data = request.get_json()
+        student_id = data.get('student_id')
+        book_ids = data.get('book_ids') or []
+        if not student_id or not isinstance(book_ids, list) or not book_ids:
+            return jsonify({'success': False, 'error': 'student_id and a list of book_ids are required'}), 400
+        if len(book_ids) > MAX_ISSUED_BOOKS:
+            return jsonify({'success': False, 'error': f'At most {MAX_ISSUED_BOOKS} books can be issued at once'}), 400
+        try:
+            book_ids = [int(book_id) for book_id in book_ids]
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'error': 'book_ids must be integers'}), 400
+
+        current_date = datetime.now()
+        cur = db_cursor()
+
+        # Student, their active-issue count and a row lock against concurrent checkouts
         cur.execute("""
-            SELECT class, admission_year FROM students WHERE student_id = %s
+            SELECT s.class, s.current_semester,
+                   (SELECT COUNT(*) FROM book_issues bi
+                    WHERE bi.student_id = s.student_id AND bi.status = 'Issued') as current_issues
+            FROM students s
+            WHERE s.student_id = %s
+            FOR UPDATE
         """, (student_id,))
         student = cur.fetchone()
-        
         if not student:
-            return jsonify({'error': 'Student not found'}), 404
-        
-        # Calculate current semester based on admission year
-        current_year = current_date.year
-        current_month = current_date.month
-        years_since_admission = current_year - student['admission_year']
-        current_semester = years_since_admission * 2 + (1 if current_month <= 6 else 2)
-        
-        # Validate class/semester match
-        if book['class'] != student['class'] or book['semester'] != current_semester:
-            return jsonify({
-                'error': f"Book is for {book['class']}-Sem{book['semester']}, student is in {student['class']}-Sem{current_semester}"
-            }), 400
-            
-        # Create issue record
+            return jsonify({'success': False, 'error': 'Student not found'}), 404
+
+        current_semester = student['current_semester']
+        slots = MAX_ISSUED_BOOKS - student['current_issues']
+
+        # Lock every requested book row at once
+        clause, params = id_filter('book_id', set(book_ids))
+        cur.execute(
+            "SELECT book_id, title, class, semester, quantity FROM books WHERE " + clause + " FOR UPDATE",
+            params
+        )
+        books = {book['book_id']: book for book in cur.fetchall()}
+
+        results = []
+        accepted = []
+        for book_id in book_ids:
+            book = books.get(book_id)
+            error = None
+            if book_id in accepted:
+                error = 'Book listed more than once'
+            elif not book or book['quantity'] <= 0:
+                error = 'Book not available for issuing'
+            elif book['class'] != student['class'] or book['semester'] != current_semester:
+                error = f"Book is for {book['class']}-Sem{book['semester']}, student is in {student['class']}-Sem{current_semester}"
+            elif len(accepted) >= slots:
+                error = 'Student has reached maximum issued books limit'
+
+            if error:
+                results.append({'book_id': book_id, 'issued': False, 'error': error})
+            else:
+                accepted.append(book_id)
+                results.append({'book_id': book_id, 'issued': True, 'book_title': book['title']})
+
         issue_date = current_date.strftime('%Y-%m-%d')
-        due_date = (current_date + timedelta(days=14)).strftime('%Y-%m-%d')
-        
-        cur.execute("""
-            INSERT INTO book_issues 
-            (student_id, book_id, issue_date, due_date, status)
-            VALUES (%s, %s, %s, %s, 'Issued')
-        """, (student_id, book_id, issue_date, due_date))
-        
-        # Update book quantity
-        cur.execute("""
-            UPDATE books SET quantity = quantity - 1 
-            WHERE book_id = %s
-        """, (book_id,))
-        
-        mysql.connection.commit()
+        due_date = (current_date + timedelta(days=ISSUE_PERIOD_DAYS)).strftime('%Y-%m-%d')
+
+        if accepted:
+            clause, params = id_filter('book_id', accepted)
+            cur.execute("UPDATE books SET quantity = quantity - 1 WHERE " + clause, params)
+            cur.executemany("""
+                INSERT INTO book_issues
+                (student_id, book_id, issue_date, due_date, status)
+                VALUES (%s, %s, %s, %s, 'Issued')
+            """, [(student_id, book_id, issue_date, due_date) for book_id in accepted])
+
+            # Keep dashboard counters in step
+            bump_counters(cur, issued_books=len(accepted))
+            bump_due_bucket(cur, due_date, len(accepted))
+            track_stock_changes(cur, accepted, -1)
+            record_issues(cur, student_id, len(accepted))
+            enqueue_for_students(cur, [
+                issue_notice(student_id, [books[book_id]['title'] for book_id in accepted], due_date)
+            ])
+
+        db_connection().commit()
         cur.close()
-        
+        if accepted:
+            invalidate_transaction_totals()
+            student_index.adjust_issued({int(student_id): len(accepted)})
+            invalidate_books((book_id, books[book_id]['class'], books[book_id]['semester'])
+                             for book_id in accepted)
+            student_snapshots.invalidate([student_id])
+
         return jsonify({
-            'message': 'Book issued successfully',
+            'success': bool(accepted),
+            'issued': len(accepted),
             'due_date': due_date,
-            'book_title': book['title'],
-            'student_semester': current_semester  # Return calculated semester for reference
+            'student_semester': current_semester,
+            'results': results
         })
-        
+
     except Exception as e:
-        mysql.connection.rollback()
-        return jsonify({'error': str(e)}), 500
+        rollback_request_connection()
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 
 # @app.route('/students/<int:student_id>/issued-books', methods=['GET'])
@@ -1131,66 +2073,34 @@ def book_issue_book():
 @app.route('/students/<int:student_id>/issued-books', methods=['GET'])
 def get_student_issued_books(student_id):
     try:
-        cur = mysql.connection.cursor()
+        snapshot = student_snapshot(student_id)
         
-        # Verify student exists
-        cur.execute("SELECT name FROM students WHERE student_id = %s", (student_id,))
-        student = cur.fetchone()
-        
-        if not student:
+        if not snapshot:
             return jsonify({'error': 'Student not found'}), 404
         
-        # Get issued books with book details
-        cur.execute("""
-            SELECT 
-                bi.issue_id,
-                b.book_id,
-                b.title as book_title,
-                b.author as book_author,
-                b.class as book_class,
-                b.subject as book_subject,
-                DATE(bi.issue_date) as issue_date,
-                DATE(bi.due_date) as due_date,
-                bi.status
-            FROM book_issues bi
-            JOIN books b ON bi.book_id = b.book_id
-            WHERE bi.student_id = %s
-            ORDER BY bi.issue_date DESC
-        """, (student_id,))
-        
-        issued_books = cur.fetchall()
-        today = datetime.now().date()
-        
-        # Calculate additional fields
-        for book in issued_books:
-            # Convert string dates to date objects (if not already)
-            issue_date = datetime.strptime(book['issue_date'], '%Y-%m-%d').date() if isinstance(book['issue_date'], str) else book['issue_date']
-            due_date = datetime.strptime(book['due_date'], '%Y-%m-%d').date() if isinstance(book['due_date'], str) else book['due_date']
-            
-            # Calculate status display
-            book['overdue'] = book['status'] == 'Issued' and due_date < today
-            book['status_display'] = 'Overdue' if book['overdue'] else book['status']
-            
-            # Format dates consistently
-            book['issue_date'] = issue_date.strftime('%Y-%m-%d')
-            book['due_date'] = due_date.strftime('%Y-%m-%d')
-        
-        # Calculate summary counts
-        total_issued = len(issued_books)
-        currently_issued = len([b for b in issued_books if b['status'] == 'Issued'])
-        overdue_books = len([b for b in issued_books if b.get('overdue', False)])
-        
-        cur.close()
+        issued_books = [{
+            'issue_id': issue['issue_id'],
+            'book_id': issue['book_id'],
+            'book_title': issue['book_title'],
+            'book_author': issue['book_author'],
+            'book_class': issue['book_class'],
+            'book_subject': issue['book_subject'],
+            'issue_date': issue['issue_date'].strftime('%Y-%m-%d'),
+            'due_date': issue['due_date'].strftime('%Y-%m-%d'),
+            'status': issue['status'],
+            'overdue': issue['overdue'],
+            'status_display': 'Overdue' if issue['overdue'] else issue['status']
+        } for issue in snapshot['issues']]
         
         return jsonify({
             'success': True,
-            'student_name': student['name'],
+            'student_name': snapshot['student_name'],
             'student_id': student_id,
             'issued_books': issued_books,
             'stats': {
-                'total_issued': total_issued,
-                'currently_issued': currently_issued,
-                'overdue_books': overdue_books
+                'total_issued': len(issued_books),
+                'currently_issued': snapshot['currently_issued'],
+                'overdue_books': snapshot['overdue_books']
             }
         })
     
@@ -1208,32 +2118,17 @@ def get_student_issued_books(student_id):
 @app.route('/student/<int:student_id>/stats', methods=['GET'])
 def get_student_stats(student_id):
     try:
-        cur = mysql.connection.cursor()
+        cur = db_cursor()
         
-        # 1. Get total books currently issued
-        cur.execute("""
-            SELECT COUNT(*) as issued_count 
-            FROM book_issues 
-            WHERE student_id = %s AND status = 'Issued'
-        """, (student_id,))
-        issued_count = cur.fetchone()['issued_count']
+        # One ledger row: open issues plus fines accrued by the nightly job
+        ledger = read_student_ledger(cur, student_id)
+        issued_count = ledger['issued_count']
         
-        # 2. Get pending returns (books not returned yet)
+        # Pending returns (books not returned yet)
         # Same as issued_count in this simple system
         pending_returns = issued_count
-        
-        # 3. Calculate fines for overdue books
-        today = datetime.now().strftime('%Y-%m-%d')
-        cur.execute("""
-            SELECT 
-                SUM(DATEDIFF(%s, due_date) * 10) as total_fine
-            FROM book_issues
-            WHERE student_id = %s 
-              AND status = 'Issued' 
-              AND due_date < %s
-        """, (today, student_id, today))
-        fines_result = cur.fetchone()
-        total_fine = fines_result['total_fine'] if fines_result['total_fine'] else 0
+        # Brought up to today from the student's overdue issues
+        total_fine = open_fine(cur, student_id, ledger, datetime.now().date())
         
         cur.close()
         
@@ -1253,48 +2148,29 @@ def get_student_stats(student_id):
 @app.route('/student/<int:student_id>/issued-books-student', methods=['GET'])
 def get_student_issued_books_application(student_id):
     try:
-        cur = mysql.connection.cursor()
+        snapshot = student_snapshot(student_id)
         
-        # Verify student exists
-        cur.execute("SELECT name FROM students WHERE student_id = %s", (student_id,))
-        student = cur.fetchone()
-        
-        if not student:
+        if not snapshot:
             return jsonify({'success': False, 'error': 'Student not found'}), 404
         
-        # Get issued books with book details
-        cur.execute("""
-            SELECT 
-                bi.issue_id,
-                b.book_id,
-                b.title as book_title,
-                b.author as book_author,
-                DATE(bi.issue_date) as issue_date,
-                DATE(bi.due_date) as due_date,
-                bi.status,
-                CASE 
-                    WHEN bi.status = 'Issued' AND bi.due_date < CURDATE() THEN 1
-                    ELSE 0
-                END as is_overdue
-            FROM book_issues bi
-            JOIN books b ON bi.book_id = b.book_id
-            WHERE bi.student_id = %s
-            ORDER BY bi.issue_date DESC
-        """, (student_id,))
-        
-        issued_books = cur.fetchall()
-        
         # Convert to proper format
-        for book in issued_books:
-            book['overdue'] = bool(book['is_overdue'])
-            book['coverImage'] = "https://via.placeholder.com/150"  # Placeholder image
-        
-        cur.close()
+        issued_books = [{
+            'issue_id': issue['issue_id'],
+            'book_id': issue['book_id'],
+            'book_title': issue['book_title'],
+            'book_author': issue['book_author'],
+            'issue_date': issue['issue_date'],
+            'due_date': issue['due_date'],
+            'status': issue['status'],
+            'is_overdue': 1 if issue['overdue'] else 0,
+            'overdue': issue['overdue'],
+            'coverImage': cover_url(issue['cover_path'])
+        } for issue in snapshot['issues']]
         
         return jsonify({
             'success': True,
             'issued_books': issued_books,
-            'student_name': student['name']
+            'student_name': snapshot['student_name']
         })
     
     except Exception as e:
@@ -1367,23 +2243,81 @@ def send_notification():
         title = data.get('title', 'New Notification')
         body = data.get('body', 'You have a new message')
         
-        # Create notification message
-        message = messaging.Message(
-            notification=messaging.Notification(
-                title=title,
-                body=body
-            ),
-            token=token
-        )
-        
-        # Send message
-        response = messaging.send(message)
+        # Queue it; an outbox worker delivers it (and retries) off the request path
+        cur = db_cursor()
+        outbox_id = enqueue(cur, token, title, body)
+        db_connection().commit()
+        cur.close()
         
         return jsonify({
             "success": True,
-            "message_id": response,
-            "message": "Notification sent successfully"
-        })
+            "outbox_id": outbox_id,
+            "message": "Notification queued"
+        }), 202
+    
+    except Exception as e:
+        rollback_request_connection()
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
+@app.route('/notifications/outbox-stats', methods=['GET'])
+def get_outbox_stats():
+    try:
+        cur = db_cursor()
+        stats = outbox_stats(cur)
+        cur.close()
+        stats['workers'] = outbox_workers.stats()
+        return jsonify(stats)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def push_transport():
+    if app.config['FCM_TRANSPORT_URL']:
+        return HttpTransport(app.config['FCM_TRANSPORT_URL'])
+    return FirebaseTransport()
+
+
+def run_overdue_reminders(dry_run=False):
+    # Queues one reminder per device; the outbox workers deliver them
+    cur = db_cursor()
+    try:
+        notices = overdue_reminders(cur, datetime.now().date())
+        if dry_run:
+            return {'students': len(notices), 'queued': 0}
+
+        queued = enqueue_for_students(cur, notices)
+        db_connection().commit()
+        return {'students': len(notices), 'queued': queued}
+    except Exception:
+        rollback_request_connection()
+        raise
+    finally:
+        cur.close()
+
+
+outbox_workers = OutboxWorkers(pool, push_transport, workers=app.config['OUTBOX_WORKERS'],
+                               retention_days=app.config['OUTBOX_RETENTION_DAYS'])
+if not app.config['OUTBOX_WORKERS']:
+    app.logger.warning("OUTBOX_WORKERS is 0: queued notifications are only delivered "
+                       "while `flask --app api outbox-worker` is running")
+
+
+@app.before_request
+def start_outbox_workers():
+    # Started here rather than at import so CLI commands don't deliver too
+    if app.config['OUTBOX_WORKERS']:
+        outbox_workers.start()
+
+
+# Queue a reminder for every device of every student with overdue books
+@app.route('/notifications/overdue-reminders', methods=['POST'])
+def send_overdue_reminders():
+    try:
+        dry_run = request.args.get('dry_run') == '1'
+        report = run_overdue_reminders(dry_run=dry_run)
+        return jsonify({"success": True, **report}), 200 if dry_run else 202
     
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -1400,12 +2334,12 @@ def old_issue_book():
             return jsonify({"success": False, "error": "Missing book_id or student_id"}), 400
 
         due_date = (datetime.now() + timedelta(days=15)).strftime('%Y-%m-%d')
-        cur = mysql.connection.cursor()
+        cur = db_cursor()
         cur.execute(
             "INSERT INTO transactions (book_id, student_id, issue_date, due_date) VALUES (%s, %s, %s, %s)",
             (data['book_id'], data['student_id'], datetime.now().strftime('%Y-%m-%d'), due_date)
         )
-        mysql.connection.commit()
+        db_connection().commit()
         return jsonify({"success": True})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -1420,7 +2354,7 @@ def old_return_book():
         if not data.get('txn_id'):
             return jsonify({"success": False, "error": "Missing txn_id"}), 400
 
-        cur = mysql.connection.cursor()
+        cur = db_cursor()
         cur.execute("SELECT due_date FROM transactions WHERE txn_id = %s", (data['txn_id'],))
         txn = cur.fetchone()
         if not txn:
@@ -1428,18 +2362,132 @@ def old_return_book():
 
         due_date = txn['due_date']
         return_date = datetime.now().date()
-        days_late = (return_date - due_date).days
-        fine = max(0, days_late) * 10  # ₹10/day fine
+        _, fine = calculate_fine(due_date, return_date)
 
         cur.execute(
             "UPDATE transactions SET return_date = %s, fine = %s WHERE txn_id = %s",
             (return_date, fine, data['txn_id'])
         )
-        mysql.connection.commit()
+        db_connection().commit()
         return jsonify({"success": True, "fine": fine})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
+# Maintenance commands: `flask --app api <command>`
+@app.cli.command('migrate')
+def migrate_command():
+    applied = apply_migrations(db_connection())
+    if applied:
+        for migration_id in applied:
+            click.echo(f"Applied {migration_id}")
+    else:
+        click.echo("Schema is up to date")
+    if semester_rollover.ensure_current(datetime.now()):
+        click.echo("Updated students.current_semester for the current term")
+
+
+@app.cli.command('check-query-plans')
+@click.option('--min-rows', default=PLAN_MIN_ROWS, show_default=True,
+              help='Full scans of smaller tables only warn')
+def check_query_plans_command(min_rows):
+    # EXPLAINs the hot queries; exits non-zero if one does a full table scan
+    cur = db_cursor()
+    try:
+        findings, failed = check_query_plans(cur, min_rows=min_rows)
+    finally:
+        cur.close()
+
+    for name, table, rows, fails in findings:
+        click.echo(f"{'FAIL' if fails else 'warn'}: {name} scans {table} (~{rows} rows)")
+    if failed:
+        raise click.ClickException("Full table scans on hot queries; check the indexes from `migrate`")
+    click.echo("No full table scans" if not findings else "Only small tables are scanned")
+
+
+@app.cli.command('rollover-semester')
+def rollover_semester_command():
+    # Normally automatic on the first request of a new term; this forces it
+    cur = db_cursor()
+    try:
+        updated = roll_over(cur, datetime.now())
+        db_connection().commit()
+    except Exception:
+        rollback_request_connection()
+        raise
+    finally:
+        cur.close()
+    click.echo(f"Recomputed current_semester for {updated} student(s)")
+
+
+@app.cli.command('accrue-fines')
+def accrue_fines_command():
+    cur = db_cursor()
+    try:
+        today = datetime.now().strftime('%Y-%m-%d')
+        advanced = accrue_fines(cur, today)
+        db_connection().commit()
+    except Exception:
+        rollback_request_connection()
+        raise
+    finally:
+        cur.close()
+    click.echo(f"Accrued fines through {today} for {advanced} overdue issue(s)")
+
+
+@app.cli.command('send-overdue-reminders')
+@click.option('--dry-run', is_flag=True, help='Count the students without queueing anything')
+def send_overdue_reminders_command(dry_run):
+    report = run_overdue_reminders(dry_run=dry_run)
+    if dry_run:
+        click.echo(f"{report['students']} student(s) would be reminded")
+    else:
+        click.echo(f"Queued {report['queued']} reminder(s) for {report['students']} student(s)")
+
+
+@app.cli.command('outbox-worker')
+@click.option('--workers', default=4, show_default=True, help='Delivery threads')
+def outbox_worker_command(workers):
+    # Runs until interrupted
+    worker_pool = OutboxWorkers(pool, push_transport, workers=workers,
+                                retention_days=app.config['OUTBOX_RETENTION_DAYS'])
+    worker_pool.start()
+    click.echo(f"Delivering notification outbox with {workers} worker(s)")
+    try:
+        worker_pool.join()
+    except KeyboardInterrupt:
+        worker_pool.stop()
+    click.echo(f"Stopped: {worker_pool.stats()}")
+
+
+@app.cli.command('purge-outbox')
+@click.option('--days', type=int, default=None, help='Keep rows this many days (default OUTBOX_RETENTION_DAYS)')
+def purge_outbox_command(days):
+    days = app.config['OUTBOX_RETENTION_DAYS'] if days is None else days
+    with pool.connection() as conn:
+        deleted = purge(conn, days)
+    click.echo(f"Deleted {deleted} sent/failed outbox row(s) older than {days} day(s)")
+
+
+@app.cli.command('reconcile-counters')
+def reconcile_counters_command():
+    cur = db_cursor()
+    try:
+        drift = reconcile_counters(cur)
+        db_connection().commit()
+    except Exception:
+        rollback_request_connection()
+        raise
+    finally:
+        cur.close()
+    
+    if not drift:
+        click.echo("Counters are in sync")
+        return
+    for name, (stored, actual) in drift.items():
+        click.echo(f"{name}: stored={stored} actual={actual}")
+    click.echo(f"Corrected {len(drift)} drifted counter(s)")
+
+
 if __name__ == '__main__':
     app.run(debug=True,host='0.0.0.0')  # http://localhost:5000
 
@@ -0,0 +1,644 @@
+# Endpoint benchmark suite.
+#
+# Seeds a local MySQL/MariaDB with synthetic books, students and issue
+# history at a chosen scale, starts the API on a local port and drives every
+# route, including the issue/return write paths, at a given concurrency.
+# Prints (or writes) a JSON report per scenario with throughput, p50/p95/p99
+# latency, and per route the SQL statements run per request (from the
+# sql_metrics instrumentation), so runs on different commits can be diffed.
+#
+#   MYSQL_HOST=127.0.0.1 MYSQL_PORT=3306 MYSQL_USER=root MYSQL_PASSWORD= \
+#   MYSQL_DB=library_bench python benchmarks/endpoints.py --scale 100k \
+#       --concurrency 16 --requests 200 --output bench-$(git rev-parse --short HEAD).json
+#
+#   python benchmarks/endpoints.py ... --compare bench-<older commit>.json
+#
+# The schema comes from `migrate` (migration 0000 builds an empty database).
+# Seeded rows all belong to BENCH-* classes. Seeding is deterministic for a
+# given --scale and --seed, and is skipped when the database already holds
+# that data set; --reset deletes every BENCH-* row first. Write scenarios
+# issue and return the same books, so repeated runs see the same stock.
+# Use a scratch database: MYSQL_HOST must be set explicitly.
+#
+# A scenario that gets any 5xx response is reported with "valid": false and
+# a warning on stderr, since its numbers partly time error paths. The
+# report is still written, but the run exits non-zero.
+
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+from werkzeug.serving import make_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCALES = {'1k': 1000, '100k': 100000, '1m': 1000000}  # issue rows
+READER_CLASSES = ['BENCH-A', 'BENCH-B', 'BENCH-C', 'BENCH-D']
+WRITER_CLASS = 'BENCH-W'   # students/books used by the write scenarios
+CREATED_CLASS = 'BENCH-N'  # rows created by add/import scenarios
+WRITER_STUDENTS = 512
+WRITER_BOOKS = 64
+SEED_BATCH = 5000
+LIBRARIAN = ('admin@college.com', 'lib123')
+
+FIRST_NAMES = ['Aarav', 'Aditi', 'Arjun', 'Diya', 'Ishaan', 'Kabir', 'Kavya', 'Meera', 'Neha', 'Nikhil',
+               'Pooja', 'Priya', 'Rahul', 'Riya', 'Rohan', 'Saanvi', 'Sara', 'Tanvi', 'Varun', 'Vihaan']
+LAST_NAMES = ['Agarwal', 'Bose', 'Chopra', 'Das', 'Gupta', 'Iyer', 'Jain', 'Kapoor', 'Khan', 'Mehta',
+              'Nair', 'Patel', 'Rao', 'Reddy', 'Shah', 'Sharma', 'Singh', 'Verma', 'Yadav', 'Joshi']
+SUBJECTS = ['Mathematics', 'Physics', 'Accounting', 'Databases', 'Networks', 'English', 'Economics']
+WORDS = ['Introduction', 'Principles', 'Advanced', 'Applied', 'Modern', 'Systems', 'Theory',
+         'Practice', 'Fundamentals', 'Analysis', 'Design', 'Handbook']
+
+
+def sizes(issues):
+    return {'issues': issues, 'students': max(200, issues // 10), 'books': max(100, issues // 20)}
+
+
+def bench_counts(cur):
+    placeholders = ', '.join(['%s'] * len(READER_CLASSES))
+    cur.execute(f"SELECT COUNT(*) AS n FROM students WHERE class IN ({placeholders})", READER_CLASSES)
+    students = cur.fetchone()['n']
+    cur.execute(f"""
+        SELECT COUNT(*) AS n FROM book_issues bi
+        JOIN students s ON s.student_id = bi.student_id
+        WHERE s.class IN ({placeholders})
+    """, READER_CLASSES)
+    return students, cur.fetchone()['n']
+
+
+def reset(conn):
+    cur = conn.cursor()
+    for statement in (
+        "DELETE bi FROM book_issues bi JOIN students s ON s.student_id = bi.student_id WHERE s.class LIKE 'BENCH-%'",
+        "DELETE bi FROM book_issues bi JOIN books b ON b.book_id = bi.book_id WHERE b.class LIKE 'BENCH-%'",
+        "DELETE sl FROM student_logins sl JOIN students s ON s.student_id = sl.student_id WHERE s.class LIKE 'BENCH-%'",
+        "DELETE l FROM student_fine_ledger l JOIN students s ON s.student_id = l.student_id WHERE s.class LIKE 'BENCH-%'",
+        "DELETE t FROM transactions t JOIN students s ON s.student_id = t.student_id WHERE s.class LIKE 'BENCH-%'",
+        "DELETE FROM notification_outbox WHERE token LIKE 'bench-%'",
+        "DELETE FROM students WHERE class LIKE 'BENCH-%'",
+        "DELETE FROM books WHERE class LIKE 'BENCH-%'",
+    ):
+        cur.execute(statement)
+        conn.commit()
+    cur.close()
+
+
+def insert_batches(conn, query, rows):
+    cur = conn.cursor()
+    for start in range(0, len(rows), SEED_BATCH):
+        cur.executemany(query, rows[start:start + SEED_BATCH])
+        conn.commit()
+    cur.close()
+
+
+def seed(conn, issues, rng, today):
+    from fines import FINE_PER_DAY, accrue_fines
+    from counters import reconcile_counters
+    from semesters import calculate_semester, current_term
+
+    counts = sizes(issues)
+
+    books = []
+    for n in range(counts['books']):
+        books.append((
+            ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))) + f" {n}",
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            rng.choice(READER_CLASSES), rng.randint(0, 30), rng.randint(1, 8), rng.choice(SUBJECTS),
+        ))
+    term = current_term(today)
+    books += [(f"Writer copy {n}", "Benchmark", WRITER_CLASS, 1000000, term, rng.choice(SUBJECTS))
+              for n in range(WRITER_BOOKS)]
+    insert_batches(conn, """
+        INSERT INTO books (title, author, class, quantity, semester, subject)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, books)
+
+    students = []
+    for n in range(counts['students']):
+        admission_year = today.year - rng.randint(0, 3)
+        students.append((
+            f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}",
+            rng.choice(READER_CLASSES), admission_year, f"BN{n:07d}", f"BENCH-{n:07d}",
+            f"6{n:09d}", f"7{n:09d}", calculate_semester(admission_year, today),
+        ))
+    students += [
+        (f"Writer {n}", "Benchmark", WRITER_CLASS, today.year, f"BW{n:05d}", f"BENCH-W-{n:05d}",
+         f"5{n:09d}", "7000000000", calculate_semester(today.year, today))
+        for n in range(WRITER_STUDENTS)
+    ]
+    insert_batches(conn, """
+        INSERT INTO students
+        (name, father_name, class, admission_year, roll_no, college_rollno,
+         mobile_number, guardian_mobile_number, current_semester)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, students)
+
+    cur = conn.cursor()
+    cur.execute("SELECT student_id, class FROM students WHERE class LIKE 'BENCH-%' ORDER BY student_id")
+    reader_ids = [row['student_id'] for row in cur.fetchall() if row['class'] in READER_CLASSES]
+    cur.execute("SELECT book_id, class FROM books WHERE class LIKE 'BENCH-%' ORDER BY book_id")
+    book_ids = [row['book_id'] for row in cur.fetchall() if row['class'] in READER_CLASSES]
+    cur.close()
+
+    active = {}
+    rows = []
+    for _ in range(issues):
+        student_id = rng.choice(reader_ids)
+        issue_date = today - timedelta(days=rng.randint(0, 730))
+        due_date = issue_date + timedelta(days=14)
+        recent = issue_date > today - timedelta(days=45)
+        if (recent or rng.random() < 0.02) and active.get(student_id, 0) < 5:
+            active[student_id] = active.get(student_id, 0) + 1
+            rows.append((student_id, rng.choice(book_ids), issue_date, due_date, None, 'Issued', 0))
+        else:
+            return_date = issue_date + timedelta(days=rng.randint(1, 25))
+            fine = max(0, (return_date - due_date).days) * FINE_PER_DAY
+            rows.append((student_id, rng.choice(book_ids), issue_date, due_date, return_date, 'Returned', fine))
+    rows.sort(key=lambda row: row[2])
+    insert_batches(conn, """
+        INSERT INTO book_issues (student_id, book_id, issue_date, due_date, return_date, status, fine)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, rows)
+
+    insert_batches(conn, """
+        INSERT INTO student_logins (student_id, register_on, last_login, device_name, device_os, device_token)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, [(student_id, today, today, 'Bench phone', 'Android', f"bench-token-{student_id}")
+          for student_id in reader_ids[::2]])
+
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO student_fine_ledger (student_id, issued_count, settled_fine)
+        SELECT bi.student_id,
+               SUM(bi.status = 'Issued'),
+               COALESCE(SUM(CASE WHEN bi.status = 'Returned' THEN bi.fine ELSE 0 END), 0)
+        FROM book_issues bi
+        JOIN students s ON s.student_id = bi.student_id
+        WHERE s.class LIKE 'BENCH-%'
+        GROUP BY bi.student_id
+        ON DUPLICATE KEY UPDATE issued_count = VALUES(issued_count), settled_fine = VALUES(settled_fine)
+    """)
+    accrue_fines(cur, today.strftime('%Y-%m-%d'))
+    reconcile_counters(cur)
+    conn.commit()
+    cur.close()
+
+
+def load_fixtures(conn):
+    # Ids and values the scenarios pick from
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT student_id, name, class, current_semester, mobile_number
+        FROM students WHERE class LIKE 'BENCH-%%' AND class <> %s ORDER BY student_id
+    """, (CREATED_CLASS,))
+    students = cur.fetchall()
+    cur.execute("SELECT book_id, class, semester FROM books WHERE class LIKE 'BENCH-%%' ORDER BY book_id")
+    books = cur.fetchall()
+    cur.close()
+    return {
+        'readers': [row for row in students if row['class'] != WRITER_CLASS],
+        'writers': [row['student_id'] for row in students if row['class'] == WRITER_CLASS],
+        'books': [row for row in books if row['class'] in READER_CLASSES],
+        'writer_books': [row['book_id'] for row in books if row['class'] == WRITER_CLASS],
+    }
+
+
+def sample_jpeg():
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (640, 480), (120, 160, 200)).save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class Worker:
+    def __init__(self, index, base_url, fixtures, pool, concurrency, seed):
+        self.index = index
+        self.base_url = base_url
+        self.fixtures = fixtures
+        self.pool = pool
+        self.rng = random.Random(seed * 1000 + index)
+        self.session = requests.Session()
+        # Each worker owns a slice of the writer students, so one student
+        # never has two requests in flight
+        self.writers = fixtures['writers'][index::concurrency]
+
+    def call(self, method, path, rule, **kwargs):
+        started = time.perf_counter()
+        response = self.session.request(method, self.base_url + path, **kwargs)
+        response.content  # read the whole body, streamed or not
+        return (f"{method} {rule}", response.status_code, time.perf_counter() - started), response
+
+    def reader(self):
+        return self.rng.choice(self.fixtures['readers'])
+
+    def book(self):
+        return self.rng.choice(self.fixtures['books'])
+
+    def writer(self, ticket):
+        return self.writers[ticket % len(self.writers)]
+
+    def open_issue_ids(self, student_id):
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT issue_id FROM book_issues WHERE student_id = %s AND status = 'Issued'", (student_id,))
+            issue_ids = [row['issue_id'] for row in cur.fetchall()]
+            cur.close()
+        return issue_ids
+
+    def latest_txn(self, student_id):
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT MAX(txn_id) AS txn_id FROM transactions WHERE student_id = %s", (student_id,))
+            txn_id = cur.fetchone()['txn_id']
+            cur.close()
+        return txn_id
+
+
+def get(path, rule=None):
+    # Scenario for a plain GET; `path` may take the worker to fill in ids
+    def run(worker, ticket):
+        url = path(worker) if callable(path) else path
+        return [worker.call('GET', url, rule or (path if isinstance(path, str) else url))[0]]
+    return run
+
+
+def issue_return(worker, ticket):
+    student_id = worker.writer(ticket)
+    book_id = worker.rng.choice(worker.fixtures['writer_books'])
+    issued, _ = worker.call('POST', '/issue-book', '/issue-book', json={'student_id': student_id, 'book_id': book_id})
+    calls = [issued]
+    for issue_id in worker.open_issue_ids(student_id):
+        calls.append(worker.call('POST', '/return-book', '/return-book',
+                                 json={'issue_id': issue_id, 'student_id': student_id})[0])
+    return calls
+
+
+def books_issue_return_batch(worker, ticket):
+    student_id = worker.writer(ticket)
+    book_id = worker.rng.choice(worker.fixtures['writer_books'])
+    calls = [worker.call('POST', '/books/issue', '/books/issue',
+                         json={'student_id': student_id, 'book_id': book_id})[0]]
+    calls.append(worker.call('POST', '/books/return-batch', '/books/return-batch',
+                             json={'student_id': student_id, 'issue_ids': worker.open_issue_ids(student_id)})[0])
+    return calls
+
+
+def issue_batch_return_batch(worker, ticket):
+    student_id = worker.writer(ticket)
+    book_ids = worker.rng.sample(worker.fixtures['writer_books'], 3)
+    calls = [worker.call('POST', '/books/issue-batch', '/books/issue-batch',
+                         json={'student_id': student_id, 'book_ids': book_ids})[0]]
+    calls.append(worker.call('POST', '/books/return-batch', '/books/return-batch',
+                             json={'student_id': student_id, 'issue_ids': worker.open_issue_ids(student_id)})[0])
+    return calls
+
+
+def legacy_issue_return(worker, ticket):
+    student_id = worker.writer(ticket)
+    book_id = worker.rng.choice(worker.fixtures['writer_books'])
+    calls = [worker.call('POST', '/issue', '/issue', json={'student_id': student_id, 'book_id': book_id})[0]]
+    calls.append(worker.call('POST', '/return', '/return', json={'txn_id': worker.latest_txn(student_id)})[0])
+    return calls
+
+
+def new_student(rng, tag):
+    return {
+        'name': f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}", 'father_name': 'Benchmark',
+        'class': CREATED_CLASS, 'admission_year': datetime.now().year, 'roll_no': f"BN-{tag}",
+        'college_rollno': f"BENCH-N-{tag}", 'mobile_number': f"4{rng.randrange(10 ** 9):09d}",
+        'guardian_mobile_number': '7000000000',
+    }
+
+
+def new_book(rng, tag):
+    return {'title': f"New title {tag}", 'author': 'Benchmark', 'class': CREATED_CLASS,
+            'quantity': 5, 'semester': 1, 'subject': rng.choice(SUBJECTS)}
+
+
+def add_book(worker, ticket):
+    return [worker.call('POST', '/add-book', '/add-book', json=new_book(worker.rng, uuid.uuid4().hex[:10]))[0]]
+
+
+def add_student(worker, ticket):
+    return [worker.call('POST', '/add-student', '/add-student',
+                        json=new_student(worker.rng, uuid.uuid4().hex[:10]))[0]]
+
+
+def import_books(worker, ticket):
+    rows = [new_book(worker.rng, uuid.uuid4().hex[:10]) for _ in range(50)]
+    return [worker.call('POST', '/books/import', '/books/import', json=rows)[0]]
+
+
+def import_students(worker, ticket):
+    rows = [new_student(worker.rng, uuid.uuid4().hex[:10]) for _ in range(50)]
+    started, response = worker.call('POST', '/students/import', '/students/import', json=rows)
+    calls = [started]
+    job_id = response.json().get('job_id') if response.ok else None
+    if job_id:
+        calls.append(worker.call('GET', f"/students/import/{job_id}", '/students/import/<job_id>')[0])
+    return calls
+
+
+def student_login(worker, ticket):
+    student = worker.reader()
+    return [worker.call('POST', '/student-login', '/student-login', json={
+        'mobile_number': student['mobile_number'],
+        'device_info': {'name': 'Bench phone', 'os': 'Android', 'token': f"bench-token-{student['student_id']}"},
+    })[0]]
+
+
+def upload_photo(worker, ticket):
+    student_id = worker.writer(ticket)
+    return [worker.call('POST', f"/student/{student_id}/upload-photo", '/student/<int:student_id>/upload-photo',
+                        data=worker.fixtures['jpeg'], headers={'Content-Type': 'image/jpeg'})[0]]
+
+
+def upload_cover(worker, ticket):
+    book_id = worker.rng.choice(worker.fixtures['writer_books'])
+    return [worker.call('POST', f"/books/{book_id}/cover", '/books/<int:book_id>/cover',
+                        data=worker.fixtures['jpeg'], headers={'Content-Type': 'image/jpeg'})[0]]
+
+
+def send_notification(worker, ticket):
+    return [worker.call('POST', '/send-notification', '/send-notification', json={
+        'fcm_token': f"bench-{worker.index}-{ticket}", 'title': 'Benchmark', 'body': 'Benchmark message'})[0]]
+
+
+def scenarios(today):
+    recent = (today - timedelta(days=30)).strftime('%Y-%m-%d')
+    # name -> (run, share of --requests, writes)
+    return {
+        'test-db': (get('/test-db'), 1, False),
+        'dashboard-stats': (get('/dashboard-stats'), 1, False),
+        'classes': (get('/classes'), 1, False),
+        'login': (lambda w, t: [w.call('POST', '/login', '/login',
+                                       json={'email': LIBRARIAN[0], 'password': LIBRARIAN[1]})[0]], 1, False),
+        'books': (get('/books'), 0.1, False),
+        'books-page': (get(lambda w: f"/books?limit=50&after={w.book()['book_id'] - 1}", '/books?limit'), 1, False),
+        'books-stream': (get('/books?stream=1', '/books?stream'), 0.05, False),
+        'books-by-class': (get(lambda w: f"/books/{w.book()['class']}", '/books/<class_name>'), 1, False),
+        'book-by-id': (get(lambda w: f"/books/{w.book()['book_id']}", '/books/<int:book_id>'), 1, False),
+        'books-by-class-semester': (get(lambda w: "/books/{class}/{semester}".format(**w.book()),
+                                        '/books/<class_name>/<int:semester>'), 1, False),
+        'students': (get('/students'), 0.05, False),
+        'students-by-class-semester': (get(lambda w: "/students?class={class}&semester={current_semester}".format(
+            **w.reader()), '/students?class&semester'), 1, False),
+        'students-search': (get(lambda w: f"/students/search?search={w.reader()['name'][:3]}",
+                                '/students/search'), 1, False),
+        'transactions': (get(lambda w: f"/transactions?page={w.rng.randint(1, 20)}", '/transactions'), 1, False),
+        'transactions-search': (get(lambda w: f"/transactions?search={w.reader()['name'].split()[0]}",
+                                    '/transactions?search'), 1, False),
+        'overdue-books': (get('/overdue-books'), 0.2, False),
+        'export-transactions': (get(f"/export/transactions?format=ndjson&from={recent}", '/export/transactions'),
+                                0.05, False),
+        'export-overdue-books': (get('/export/overdue-books?format=csv', '/export/overdue-books'), 0.05, False),
+        'export-students': (get(lambda w: f"/export/students?class={w.reader()['class']}", '/export/students'),
+                            0.05, False),
+        'student-issued-books': (get(lambda w: f"/students/{w.reader()['student_id']}/issued-books",
+                                     '/students/<int:student_id>/issued-books'), 1, False),
+        'student-stats': (get(lambda w: f"/student/{w.reader()['student_id']}/stats",
+                              '/student/<int:student_id>/stats'), 1, False),
+        'student-app-books': (get(lambda w: f"/student/{w.reader()['student_id']}/issued-books-student",
+                                  '/student/<int:student_id>/issued-books-student'), 1, False),
+        'cover-placeholder': (get('/uploads/book_covers/placeholder.svg', '/uploads/<path:filename>'), 1, False),
+        'outbox-stats': (get('/notifications/outbox-stats'), 1, False),
+        'overdue-reminders-dry-run': (lambda w, t: [w.call('POST', '/notifications/overdue-reminders?dry_run=1',
+                                                           '/notifications/overdue-reminders')[0]], 0.05, False),
+        'stats-endpoints': (lambda w, t: [w.call('GET', path, path)[0] for path in (
+            '/db-pool-stats', '/catalog-cache-stats', '/student-snapshot-stats',
+            '/students/search-index-stats', '/metrics', '/metrics/slow-queries')], 0.2, False),
+        'student-login': (student_login, 1, True),
+        'issue-return': (issue_return, 1, True),
+        'books-issue-return-batch': (books_issue_return_batch, 1, True),
+        'issue-batch-return-batch': (issue_batch_return_batch, 1, True),
+        'legacy-issue-return': (legacy_issue_return, 1, True),
+        'add-book': (add_book, 0.2, True),
+        'add-student': (add_student, 0.2, True),
+        'import-books': (import_books, 0.05, True),
+        'import-students': (import_students, 0.05, True),
+        'upload-photo': (upload_photo, 0.1, True),
+        'upload-cover': (upload_cover, 0.1, True),
+        'send-notification': (send_notification, 1, True),
+    }
+
+
+def percentile(latencies, fraction):
+    return round(latencies[max(0, int(len(latencies) * fraction + 0.5) - 1)] * 1000, 2)
+
+
+def run_scenario(run, total, workers):
+    results = []
+    lock = threading.Lock()
+    tickets = iter(range(total))
+
+    def loop(worker):
+        while True:
+            with lock:
+                ticket = next(tickets, None)
+            if ticket is None:
+                return
+            calls = run(worker, ticket)
+            with lock:
+                results.extend(calls)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(workers)) as executor:
+        for future in [executor.submit(loop, worker) for worker in workers]:
+            future.result()
+    elapsed = time.perf_counter() - started
+
+    calls = {}
+    for label, status, seconds in results:
+        calls.setdefault(label, []).append((status, seconds))
+    server_errors = sum(1 for _, status, _ in results if status >= 500)
+    report = {'operations': total, 'elapsed_seconds': round(elapsed, 3),
+              'throughput_ops': round(total / elapsed, 1), 'calls': {},
+              'server_errors': server_errors, 'valid': not server_errors}
+    for label, outcomes in calls.items():
+        latencies = sorted(seconds for _, seconds in outcomes)
+        statuses = {}
+        for status, _ in outcomes:
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+        report['calls'][label] = {
+            'requests': len(outcomes),
+            'throughput_rps': round(len(outcomes) / elapsed, 1),
+            'errors': sum(1 for status, _ in outcomes if status >= 500),
+            'status': statuses,
+            'latency_ms': {
+                'mean': round(sum(latencies) / len(latencies) * 1000, 2),
+                'p50': percentile(latencies, 0.50),
+                'p95': percentile(latencies, 0.95),
+                'p99': percentile(latencies, 0.99),
+            },
+        }
+    return report
+
+
+def query_report(before, after):
+    routes = {}
+    for route, totals in after.items():
+        previous = before.get(route, {'requests': 0, 'queries': 0, 'errors': 0, 'seconds': 0.0})
+        requests_made = totals['requests'] - previous['requests']
+        if requests_made <= 0:
+            continue
+        queries = totals['queries'] - previous['queries']
+        routes[route] = {
+            'requests': requests_made,
+            'queries': queries,
+            'queries_per_request': round(queries / requests_made, 2),
+            'sql_ms_per_request': round((totals['seconds'] - previous['seconds']) * 1000 / requests_made, 3),
+            'sql_errors': totals['errors'] - previous['errors'],
+        }
+    return routes
+
+
+def compare(report, baseline_path):
+    with open(baseline_path) as baseline_file:
+        baseline = json.load(baseline_file)
+    print(f"{'scenario':<30}{'ops/s':>10}{'was':>10}{'change':>9}   {'p95 ms (first call)':<24}", file=sys.stderr)
+    for name, current in report['scenarios'].items():
+        previous = baseline.get('scenarios', {}).get(name)
+        if not previous:
+            continue
+        change = (current['throughput_ops'] - previous['throughput_ops']) / previous['throughput_ops'] * 100
+        label = next(iter(current['calls']), None)
+        p95 = current['calls'][label]['latency_ms']['p95'] if label else None
+        was = previous['calls'].get(label, {}).get('latency_ms', {}).get('p95') if label else None
+        print(f"{name:<30}{current['throughput_ops']:>10}{previous['throughput_ops']:>10}{change:>+8.1f}%   "
+              f"{p95} (was {was})" + ("" if current['valid'] and previous.get('valid', True) else "   INVALID"),
+              file=sys.stderr)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every API route against a local database')
+    parser.add_argument('--scale', default='1k', help='issue rows to seed: 1k, 100k, 1m or a number')
+    parser.add_argument('--requests', type=int, default=200, help='operations per scenario (heavy ones run fewer)')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--seed', type=int, default=1, help='random seed for data and request mix')
+    parser.add_argument('--only', action='append', help='run only scenarios containing this text (repeatable)')
+    parser.add_argument('--read-only', action='store_true', help='skip the write scenarios')
+    parser.add_argument('--cold', action='store_true', help='disable the catalog and student snapshot caches')
+    parser.add_argument('--reset', action='store_true', help='delete all BENCH-* rows and reseed')
+    parser.add_argument('--port', type=int, default=5077)
+    parser.add_argument('--output', help='write the JSON report here as well as to stdout')
+    parser.add_argument('--compare', help='print throughput/p95 changes against an earlier report')
+    args = parser.parse_args()
+
+    if not os.environ.get('MYSQL_HOST'):
+        parser.error("set MYSQL_HOST (and MYSQL_PORT/USER/PASSWORD/DB) to a local scratch database")
+    issues = SCALES[args.scale.lower()] if args.scale.lower() in SCALES else int(args.scale)
+    if args.concurrency > WRITER_STUDENTS:
+        parser.error(f"--concurrency can be at most {WRITER_STUDENTS}")
+
+    # Settings read when api is imported
+    os.environ['SQL_METRICS'] = '1'
+    os.environ.setdefault('SLOW_QUERY_MS', '1000')
+    os.environ.setdefault('MYSQL_POOL_MAX_SIZE', str(args.concurrency * 2 + 4))
+    if args.cold:
+        os.environ['CATALOG_CACHE_MAX_BYTES'] = '0'
+
+    from api import app, pool, sql_metrics, student_snapshots
+    from migrations import apply_migrations
+    from semesters import SemesterRollover
+
+    if args.cold:
+        student_snapshots.max_students = 0
+
+    today = datetime.now().date()
+    with pool.connection() as conn:
+        apply_migrations(conn)
+        SemesterRollover(pool).ensure_current(datetime.now())
+        if args.reset:
+            print("Removing BENCH-* rows", file=sys.stderr)
+            reset(conn)
+        cur = conn.cursor()
+        students, seeded_issues = bench_counts(cur)
+        cur.close()
+        if seeded_issues == 0 and students == 0:
+            print(f"Seeding {sizes(issues)}", file=sys.stderr)
+            started = time.perf_counter()
+            seed(conn, issues, random.Random(args.seed), today)
+            print(f"Seeded in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        elif seeded_issues != issues or students != sizes(issues)['students']:
+            parser.error(f"database holds a different data set ({students} students, {seeded_issues} issues); "
+                         "use --reset")
+        fixtures = load_fixtures(conn)
+        cur = conn.cursor()
+        cur.execute("SELECT VERSION() AS version")
+        server_version = cur.fetchone()['version']
+        cur.close()
+    fixtures['jpeg'] = sample_jpeg()
+
+    server = make_server('127.0.0.1', args.port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{args.port}"
+    workers = [Worker(index, base_url, fixtures, pool, args.concurrency, args.seed)
+               for index in range(args.concurrency)]
+    for worker in workers:
+        worker.session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=4))
+
+    report = {
+        'meta': {
+            'commit': git_commit(),
+            'started_at': datetime.now().isoformat(timespec='seconds'),
+            'scale': sizes(issues),
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'seed': args.seed,
+            'cold': args.cold,
+            'python': platform.python_version(),
+            'database': server_version,
+        },
+        'scenarios': {},
+    }
+
+    before = sql_metrics.route_totals()
+    for name, (run, share, writes) in scenarios(today).items():
+        if args.read_only and writes:
+            continue
+        if args.only and not any(text in name for text in args.only):
+            continue
+        total = max(args.concurrency, int(args.requests * share))
+        print(f"{name}: {total} operations", file=sys.stderr)
+        result = report['scenarios'][name] = run_scenario(run, total, workers)
+        if not result['valid']:
+            print(f"WARNING: {name} got {result['server_errors']} 5xx response(s); "
+                  "its results are invalid", file=sys.stderr)
+    report['routes'] = query_report(before, sql_metrics.route_totals())
+    invalid = sorted(name for name, result in report['scenarios'].items() if not result['valid'])
+    server.shutdown()
+
+    output = json.dumps(report, indent=2, sort_keys=True)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            report_file.write(output + '\n')
+    if args.compare:
+        compare(report, args.compare)
+    if invalid:
+        print(f"Invalid scenarios (5xx responses): {', '.join(invalid)}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
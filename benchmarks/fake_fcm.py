@@ -0,0 +1,166 @@
+# Local stand-in for FCM batch sends, plus a load test of outbox delivery
+# against it.
+#
+# The fake accepts the HttpTransport protocol (POST {"messages": [...]}),
+# sleeps for a configurable per-batch latency and reports a fraction of the
+# tokens as UNREGISTERED.
+#
+#   python benchmarks/fake_fcm.py --serve --port 5066
+#   flask --app api send-overdue-reminders
+#   FCM_TRANSPORT_URL=http://127.0.0.1:5066/batch flask --app api outbox-worker
+#
+# Without --serve it starts the fake in-process, queues --messages synthetic
+# reminders in notification_outbox and drains them with --workers threads
+# calling outbox.OutboxWorkers.run_once, printing a JSON report:
+#
+#   MYSQL_HOST=127.0.0.1 MYSQL_PORT=3306 MYSQL_DB=library_test \
+#       python benchmarks/fake_fcm.py --messages 20000 --workers 4
+#
+# Point it at a scratch database: its workers claim any due outbox row, not
+# just the synthetic ones, which are deleted afterwards unless --keep is given.
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import pool  # noqa: E402
+from notifications import FCM_BATCH_SIZE, HttpTransport  # noqa: E402
+from outbox import OutboxWorkers  # noqa: E402
+
+
+def fake_fcm_app(latency, dead_rate, seed=None):
+    app = Flask('fake_fcm')
+    rng = random.Random(seed)
+    lock = threading.Lock()
+    stats = {'batches': 0, 'messages': 0}
+
+    @app.route('/batch', methods=['POST'])
+    def batch():
+        messages = request.get_json()['messages']
+        if len(messages) > FCM_BATCH_SIZE:
+            return jsonify({'error': f"At most {FCM_BATCH_SIZE} messages per batch"}), 400
+        time.sleep(latency)
+        with lock:
+            stats['batches'] += 1
+            stats['messages'] += len(messages)
+            dead = [rng.random() < dead_rate for _ in messages]
+        return jsonify({'results': [
+            {'success': False, 'error': 'UNREGISTERED'} if is_dead else {'success': True}
+            for is_dead in dead
+        ]})
+
+    @app.route('/stats', methods=['GET'])
+    def get_stats():
+        with lock:
+            return jsonify(stats)
+
+    return app
+
+
+def seed(conn, messages, tag):
+    cur = conn.cursor()
+    cur.executemany("""
+        INSERT INTO notification_outbox (token, title, body, data, next_attempt_at)
+        VALUES (%s, %s, 'Benchmark', %s, NOW(3))
+    """, [
+        (f"token-{tag}-{n}", f"Benchmark {tag}", json.dumps({'type': 'overdue', 'student_id': str(n)}))
+        for n in range(messages)
+    ])
+    conn.commit()
+    cur.close()
+
+
+def outcome(conn, tag, keep):
+    cur = conn.cursor()
+    cur.execute("""
+        SELECT status, COUNT(*) as count, MAX(latency_ms) as max_ms
+        FROM notification_outbox
+        WHERE title = %s
+        GROUP BY status
+    """, (f"Benchmark {tag}",))
+    rows = {row['status']: row for row in cur.fetchall()}
+    if not keep:
+        cur.execute("DELETE FROM notification_outbox WHERE title = %s", (f"Benchmark {tag}",))
+        conn.commit()
+    cur.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake FCM server and outbox delivery load test')
+    parser.add_argument('--serve', action='store_true', help='only run the fake server')
+    parser.add_argument('--port', type=int, default=5066)
+    parser.add_argument('--latency-ms', type=float, default=150, help='per-batch response time')
+    parser.add_argument('--dead-rate', type=float, default=0.02, help='fraction of tokens reported dead')
+    parser.add_argument('--messages', type=int, default=20000)
+    parser.add_argument('--batch-size', type=int, default=FCM_BATCH_SIZE)
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--keep', action='store_true', help='leave the synthetic outbox rows in place')
+    args = parser.parse_args()
+
+    app = fake_fcm_app(args.latency_ms / 1000, args.dead_rate, args.seed)
+    server = make_server('127.0.0.1', args.port, app, threaded=True)
+    if args.serve:
+        print(f"Fake FCM listening on http://127.0.0.1:{args.port}/batch")
+        server.serve_forever()
+        return 0
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{args.port}/batch"
+    tag = uuid.uuid4().hex[:8]
+    with pool.connection() as conn:
+        seed(conn, args.messages, tag)
+
+    # The same claim/deliver/record cycle the outbox threads run, stopping
+    # once nothing is left to claim
+    workers = OutboxWorkers(pool, None, workers=args.workers, batch_size=args.batch_size)
+
+    def drain():
+        transport = HttpTransport(url)
+        while workers.run_once(transport):
+            pass
+
+    threads = [threading.Thread(target=drain) for _ in range(args.workers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    with pool.connection() as conn:
+        rows = outcome(conn, tag, args.keep)
+    totals = workers.stats()
+    sent = rows['sent']['count'] if 'sent' in rows else 0
+    failed = rows['failed']['count'] if 'failed' in rows else 0
+
+    print(json.dumps({
+        'messages': args.messages,
+        'batch_size': args.batch_size,
+        'workers': args.workers,
+        'latency_ms': args.latency_ms,
+        'elapsed_seconds': round(elapsed, 3),
+        'messages_per_second': round((sent + failed) / elapsed, 1),
+        'batches': totals['batches'],
+        'sent': sent,
+        'failed': failed,
+        'pending': rows['pending']['count'] if 'pending' in rows else 0,
+        'max_queue_latency_ms': rows['sent']['max_ms'] if 'sent' in rows else None,
+    }, indent=2))
+    return 0 if 'pending' not in rows else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,148 @@
+# Contention benchmark for the issue path.
+#
+# Seeds one "hot" title with a few copies plus a batch of students, starts the
+# API on a local port and fires concurrent POST /issue-book requests at that
+# title. Reports throughput and checks that the title was never oversold.
+#
+#   MYSQL_HOST=127.0.0.1 MYSQL_PORT=3306 MYSQL_DB=library_test \
+#       python benchmarks/issue_contention.py --requests 500 --copies 50 --concurrency 64
+#
+# Raise MYSQL_POOL_MAX_SIZE alongside --concurrency to keep pool waits out of
+# the numbers.
+#
+# Point it at a scratch database: it writes real rows (removed afterwards
+# unless --keep is given) and reconciles the dashboard counters when done.
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import app, pool  # noqa: E402
+from counters import reconcile_counters  # noqa: E402
+
+
+def seed(conn, copies, students):
+    tag = uuid.uuid4().hex[:8]
+    mobile_prefix = f"7{int(tag, 16) % 1000:03d}"
+    cur = conn.cursor()
+    cur.execute(
+        """INSERT INTO books (title, author, class, quantity, semester, subject)
+        VALUES (%s, %s, %s, %s, %s, %s)""",
+        (f"Contention {tag}", "Benchmark", "BENCH", copies, 1, "Benchmark")
+    )
+    book_id = cur.lastrowid
+    cur.executemany(
+        """INSERT INTO students
+        (name, father_name, class, admission_year, roll_no, college_rollno,
+         mobile_number, guardian_mobile_number)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
+        [
+            (f"Bench {tag} {n}", "Benchmark", "BENCH", 2024, f"B{tag}{n}",
+             f"BENCH-{tag}-{n}", f"{mobile_prefix}{n:06d}", "9000000000")
+            for n in range(students)
+        ]
+    )
+    cur.execute("SELECT student_id FROM students WHERE college_rollno LIKE %s", (f"BENCH-{tag}-%",))
+    student_ids = [row['student_id'] for row in cur.fetchall()]
+    conn.commit()
+    cur.close()
+    return book_id, student_ids
+
+
+def cleanup(conn, book_id, student_ids):
+    cur = conn.cursor()
+    placeholders = ', '.join(['%s'] * len(student_ids))
+    cur.execute("DELETE FROM book_issues WHERE book_id = %s", (book_id,))
+    cur.execute(f"DELETE FROM students WHERE student_id IN ({placeholders})", student_ids)
+    cur.execute("DELETE FROM books WHERE book_id = %s", (book_id,))
+    reconcile_counters(cur)
+    conn.commit()
+    cur.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Concurrent issue benchmark against one hot title')
+    parser.add_argument('--requests', type=int, default=500, help='issue attempts to fire')
+    parser.add_argument('--copies', type=int, default=50, help='copies of the hot title')
+    parser.add_argument('--concurrency', type=int, default=64, help='concurrent clients')
+    parser.add_argument('--port', type=int, default=5055)
+    parser.add_argument('--keep', action='store_true', help='leave the seeded rows in place')
+    args = parser.parse_args()
+
+    # One attempt per student keeps the per-student limit out of the picture
+    with pool.connection() as conn:
+        book_id, student_ids = seed(conn, args.copies, args.requests)
+
+    server = make_server('127.0.0.1', args.port, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{args.port}/issue-book"
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency)
+    session.mount('http://', adapter)
+
+    def attempt(student_id):
+        started = time.perf_counter()
+        response = session.post(url, json={'student_id': student_id, 'book_id': book_id})
+        return response.status_code, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        outcomes = list(executor.map(attempt, student_ids))
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    with pool.connection() as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT quantity FROM books WHERE book_id = %s", (book_id,))
+        final_quantity = cur.fetchone()['quantity']
+        cur.execute("SELECT COUNT(*) as issued FROM book_issues WHERE book_id = %s", (book_id,))
+        issued_rows = cur.fetchone()['issued']
+        cur.close()
+        if not args.keep:
+            cleanup(conn, book_id, student_ids)
+
+    latencies = sorted(latency for _, latency in outcomes)
+
+    def percentile(fraction):
+        return round(latencies[max(0, int(len(latencies) * fraction) - 1)] * 1000, 2)
+
+    successes = sum(1 for status, _ in outcomes if status == 200)
+    rejected = sum(1 for status, _ in outcomes if status == 400)
+    oversold = max(0, issued_rows - args.copies) + max(0, -final_quantity)
+
+    report = {
+        'requests': args.requests,
+        'copies': args.copies,
+        'concurrency': args.concurrency,
+        'elapsed_seconds': round(elapsed, 3),
+        'throughput_rps': round(args.requests / elapsed, 1),
+        'latency_ms': {
+            'p50': percentile(0.50),
+            'p95': percentile(0.95),
+            'p99': percentile(0.99),
+        },
+        'issued': successes,
+        'rejected': rejected,
+        'errors': len(outcomes) - successes - rejected,
+        'final_quantity': final_quantity,
+        'issue_rows': issued_rows,
+        'oversold': oversold,
+        'consistent': oversold == 0 and issued_rows == successes == args.copies - final_quantity,
+    }
+    print(json.dumps(report, indent=2))
+    return 0 if report['consistent'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,191 @@
+# Payload size and encode time for the list endpoints.
+#
+# Builds response bodies shaped like /books, /students, /transactions and
+# /overdue-books at a given row count and reports, per endpoint, the body
+# size and encode time for JSON and MessagePack, then what gzip (and brotli,
+# if installed) make of each at a few levels.
+#
+#   python benchmarks/payload_sizes.py --rows 5000
+#
+# With --url, the same endpoints are fetched from a running server under each
+# Accept / Accept-Encoding combination instead, reporting bytes on the wire
+# and response time:
+#
+#   python benchmarks/payload_sizes.py --url http://127.0.0.1:5000
+
+import argparse
+import gzip
+import os
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api import app  # noqa: E402
+from negotiation import JSON, MSGPACK, brotli, pack  # noqa: E402
+
+ENDPOINTS = ['/books', '/students', '/transactions?per_page=500', '/overdue-books']
+CLASSES = ['BCA', 'BBA', 'BSC', 'MCA', 'MBA']
+SUBJECTS = ['Mathematics', 'Physics', 'Accounting', 'Databases', 'Networks', 'English']
+WORDS = ['Introduction', 'Principles', 'Advanced', 'Applied', 'Modern', 'Systems',
+         'Theory', 'Practice', 'Fundamentals', 'Analysis', 'Design', 'Handbook']
+
+
+def title(rng):
+    return ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 5)))
+
+
+def person(rng):
+    return f"{rng.choice(['Aarav', 'Diya', 'Kabir', 'Meera', 'Rohan', 'Sara'])} " \
+           f"{rng.choice(['Sharma', 'Verma', 'Gupta', 'Singh', 'Khan', 'Patel'])}"
+
+
+def books_body(rng, rows):
+    books = []
+    for n in range(1, rows + 1):
+        quantity = rng.randint(0, 20)
+        books.append({
+            'id': n, 'title': title(rng), 'author': person(rng), 'subject': rng.choice(SUBJECTS),
+            'class': rng.choice(CLASSES), 'quantity': quantity, 'semester': rng.randint(1, 8),
+            'status': 'Available' if quantity > 5 else 'Low Stock' if quantity else 'Out of Stock',
+            'isbn': f"ISBN-{n:010d}",
+        })
+    return {
+        'books': books,
+        'filters': {'classes': CLASSES, 'subjects': SUBJECTS,
+                    'statuses': ['Available', 'Low Stock', 'Out of Stock']},
+        'stats': {'available': Decimal(rows // 2), 'low_stock': Decimal(rows // 4),
+                  'out_of_stock': Decimal(rows // 4), 'total': rows},
+    }
+
+
+def students_body(rng, rows):
+    students = [{
+        'student_id': n, 'name': person(rng), 'father_name': person(rng),
+        'mobile_number': f"9{rng.randint(0, 999999999):09d}",
+        'guardian_mobile_number': f"8{rng.randint(0, 999999999):09d}",
+        'class': rng.choice(CLASSES), 'admission_year': rng.randint(2019, 2025),
+        'roll_no': f"R{n:05d}", 'college_rollno': f"CR-{n:06d}", 'current_semester': rng.randint(1, 8),
+    } for n in range(1, rows + 1)]
+    return {'students': students,
+            'filters': {'classes': CLASSES, 'years': list(range(2019, 2026))},
+            'stats': {'total_students': rows}}
+
+
+def transactions_body(rng, rows):
+    start = datetime(2025, 1, 1, 9, 0)
+    transactions = []
+    for n in range(rows, 0, -1):
+        issued = start + timedelta(minutes=17 * n)
+        returned = rng.random() < 0.6
+        transactions.append({
+            'issue_id': n, 'issue_date': issued, 'due_date': issued + timedelta(days=14),
+            'return_date': issued + timedelta(days=rng.randint(1, 20)) if returned else None,
+            'status': 'Returned' if returned else 'Issued',
+            'book_title': title(rng), 'book_author': person(rng),
+            'student_name': person(rng), 'student_roll': f"R{rng.randint(1, 99999):05d}",
+        })
+    return {'transactions': transactions,
+            'pagination': {'page': 1, 'per_page': rows, 'total': rows * 10,
+                           'total_is_approximate': False, 'next': 'MjAyNS0wMS0wMSAwOTowMDowMHwx',
+                           'prev': None}}
+
+
+def overdue_body(rng, rows):
+    today = date(2025, 6, 1)
+    return {'overdue_books': [{
+        'issue_id': n, 'due_date': datetime.combine(today - timedelta(days=rng.randint(1, 60)),
+                                                    datetime.min.time()),
+        'book_title': title(rng), 'book_author': person(rng), 'student_name': person(rng),
+        'roll_no': f"R{rng.randint(1, 99999):05d}", 'mobile_number': f"9{rng.randint(0, 999999999):09d}",
+    } for n in range(1, rows + 1)]}
+
+
+BODIES = {
+    '/books': books_body,
+    '/students': students_body,
+    '/transactions': transactions_body,
+    '/overdue-books': overdue_body,
+}
+
+
+def timed(encode, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = encode()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best * 1000
+
+
+def offline(rows, repeat, seed):
+    rng = random.Random(seed)
+    encoders = {
+        'json': lambda data: app.json.dumps(data).encode('utf-8'),
+        'msgpack': pack,
+    }
+    compressors = [(f"gzip-{level}", lambda body, level=level: gzip.compress(body, compresslevel=level))
+                   for level in (1, 6, 9)]
+    if brotli is not None:
+        compressors += [(f"br-{quality}", lambda body, quality=quality: brotli.compress(body, quality=quality))
+                        for quality in (1, 5, 9)]
+
+    print(f"{rows} rows per endpoint, best of {repeat}")
+    print(f"{'endpoint':<16}{'encoding':<18}{'bytes':>12}{'ratio':>8}{'ms':>10}")
+    with app.app_context():
+        for endpoint, build in BODIES.items():
+            data = build(rng, rows)
+            baseline = None
+            for name, encode in encoders.items():
+                body, elapsed = timed(lambda: encode(data), repeat)
+                baseline = baseline or len(body)
+                print(f"{endpoint:<16}{name:<18}{len(body):>12,}{len(body) / baseline:>8.2f}{elapsed:>10.2f}")
+                for compressor, squeeze in compressors:
+                    packed, squeeze_ms = timed(lambda: squeeze(body), repeat)
+                    print(f"{'':<16}{name + '+' + compressor:<18}{len(packed):>12,}"
+                          f"{len(packed) / baseline:>8.2f}{elapsed + squeeze_ms:>10.2f}")
+
+
+def online(url, repeat):
+    variants = [(JSON, 'identity'), (JSON, 'gzip'), (MSGPACK, 'identity'), (MSGPACK, 'gzip')]
+    if brotli is not None:
+        variants += [(JSON, 'br'), (MSGPACK, 'br')]
+
+    session = requests.Session()
+    print(f"{'endpoint':<30}{'accept':<22}{'encoding':<10}{'bytes':>12}{'ms':>10}")
+    for endpoint in ENDPOINTS:
+        for accept, encoding in variants:
+            best, size = None, None
+            for _ in range(repeat):
+                started = time.perf_counter()
+                response = session.get(url.rstrip('/') + endpoint, stream=True,
+                                       headers={'Accept': accept, 'Accept-Encoding': encoding})
+                size = len(response.raw.read())
+                elapsed = (time.perf_counter() - started) * 1000
+                response.raise_for_status()
+                best = elapsed if best is None else min(best, elapsed)
+            print(f"{endpoint:<30}{accept:<22}{encoding:<10}{size:>12,}{best:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Payload size and encode time for the list endpoints')
+    parser.add_argument('--rows', type=int, default=5000, help='rows per synthetic body')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement (best is kept)')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--url', help='measure a running server instead')
+    args = parser.parse_args()
+
+    if args.url:
+        online(args.url, args.repeat)
+    else:
+        offline(args.rows, args.repeat, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# In-process read-through cache for the catalog endpoints.
+# Entries are the encoded JSON bodies, kept in LRU order under a byte budget.
+# Each entry records the version of the scopes it was built from (a book, a
+# class, a class/semester, or the whole catalog); writes bump those versions
+# after they commit, so a stale entry is never served, even one that was
+# being filled while the write happened.
+#
+# Versions are per process, so entries also expire after `ttl` seconds to
+# bound staleness from writes made by other processes.
+
+import threading
+import time
+from collections import OrderedDict
+
+CATALOG_CACHE_MAX_BYTES = 64 * 1024 * 1024
+CATALOG_CACHE_TTL = 300  # seconds
+ENTRY_OVERHEAD = 200     # rough per-entry bookkeeping, in bytes
+
+ALL_BOOKS = ('catalog',)
+
+
+def book_scopes(book_id, book_class, semester):
+    # Everything a change to this book can show up in
+    return {('book', int(book_id)), ('class', book_class),
+            ('class', book_class, int(semester)), ALL_BOOKS}
+
+
+class CatalogCache:
+    def __init__(self, max_bytes=CATALOG_CACHE_MAX_BYTES, ttl=CATALOG_CACHE_TTL):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (body, versions, expires_at, size)
+        self._versions = {}            # scope -> version
+        self._epoch = 0                # bumped by clear()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'stale': 0, 'evictions': 0, 'invalidations': 0}
+
+    def _snapshot(self, scopes):
+        return (self._epoch,) + tuple(self._versions.get(scope, 0) for scope in scopes)
+
+    def _drop(self, key):
+        self._bytes -= self._entries.pop(key)[3]
+
+    def get_or_load(self, key, scopes, load):
+        # Returns the cached body for `key`, or calls load() (which returns
+        # the encoded body, or None for "don't cache") and stores its result.
+        scopes = tuple(scopes)
+        with self._lock:
+            versions = self._snapshot(scopes)
+            entry = self._entries.get(key)
+            if entry is not None:
+                body, entry_versions, expires_at, _ = entry
+                if entry_versions == versions and expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return body
+                self._drop(key)
+                self._stats['stale'] += 1
+            self._stats['misses'] += 1
+
+        body = load()
+        if body is None:
+            return None
+
+        size = len(body) + ENTRY_OVERHEAD
+        if size > self.max_bytes // 4:
+            return body
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (body, versions, time.monotonic() + self.ttl, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+        return body
+
+    def invalidate(self, scopes):
+        with self._lock:
+            for scope in scopes:
+                self._versions[scope] = self._versions.get(scope, 0) + 1
+            self._stats['invalidations'] += 1
+
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['misses']
+            return dict(
+                self._stats,
+                entries=len(self._entries),
+                bytes=self._bytes,
+                max_bytes=self.max_bytes,
+                hit_ratio=round(self._stats['hits'] / lookups, 3) if lookups else None,
+            )
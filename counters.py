@@ -0,0 +1,128 @@
+# Rollup counters behind /dashboard-stats.
+# Write paths bump these in the same transaction as their own changes, so the
+# dashboard never has to COUNT(*) over books, students or book_issues.
+
+COUNTER_COLUMNS = ['total_books', 'available_books', 'total_students', 'issued_books']
+
+
+def bump_counters(cur, **deltas):
+    deltas = {col: delta for col, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    assignments = ", ".join(f"{col} = {col} + %s" for col in deltas)
+    cur.execute(f"UPDATE library_counters SET {assignments} WHERE id = 1", tuple(deltas.values()))
+
+
+def bump_due_bucket(cur, due_date, delta):
+    cur.execute("""
+        INSERT INTO issue_due_buckets (due_date, open_count)
+        VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE open_count = open_count + VALUES(open_count)
+    """, (due_date, delta))
+
+
+def bump_due_buckets(cur, deltas):
+    # deltas: {due_date: change in open issues}
+    rows = [(due_date, delta) for due_date, delta in deltas.items() if delta]
+    if not rows:
+        return
+    cur.executemany("""
+        INSERT INTO issue_due_buckets (due_date, open_count)
+        VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE open_count = open_count + VALUES(open_count)
+    """, rows)
+
+
+def track_stock_change(cur, book_id, delta):
+    track_stock_changes(cur, [book_id], delta)
+
+
+def track_stock_changes(cur, book_ids, delta):
+    # Call after books.quantity changed by `delta` for each of book_ids. A
+    # title only moves in or out of available_books when it crosses zero copies.
+    if not book_ids or not delta:
+        return
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    if delta < 0:
+        cur.execute(f"""
+            UPDATE library_counters
+            SET available_books = available_books -
+                (SELECT COUNT(*) FROM books WHERE book_id IN ({placeholders}) AND quantity = 0)
+            WHERE id = 1
+        """, tuple(book_ids))
+    else:
+        cur.execute(f"""
+            UPDATE library_counters
+            SET available_books = available_books +
+                (SELECT COUNT(*) FROM books WHERE book_id IN ({placeholders}) AND quantity = %s)
+            WHERE id = 1
+        """, tuple(book_ids) + (delta,))
+
+
+def read_dashboard_stats(cur, today):
+    # One primary-key lookup plus a sum over the (small) due-date bucket table
+    cur.execute("""
+        SELECT
+            c.total_books, c.available_books, c.total_students, c.issued_books,
+            (SELECT COALESCE(SUM(open_count), 0)
+             FROM issue_due_buckets
+             WHERE due_date < %s) AS overdue_books
+        FROM library_counters c
+        WHERE c.id = 1
+    """, (today,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    return {key: int(value) for key, value in row.items()}
+
+
+def reconcile_counters(cur):
+    # Recompute every counter from scratch, overwrite the stored values and
+    # return {name: (stored, actual)} for anything that had drifted.
+    cur.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM books) AS total_books,
+            (SELECT COUNT(*) FROM books WHERE quantity > 0) AS available_books,
+            (SELECT COUNT(*) FROM students) AS total_students,
+            (SELECT COUNT(*) FROM book_issues WHERE status = 'Issued') AS issued_books
+    """)
+    actual = cur.fetchone()
+
+    cur.execute("SELECT * FROM library_counters WHERE id = 1 FOR UPDATE")
+    stored = cur.fetchone() or {col: None for col in COUNTER_COLUMNS}
+
+    drift = {}
+    for col in COUNTER_COLUMNS:
+        if stored[col] != actual[col]:
+            drift[col] = (stored[col], actual[col])
+
+    cur.execute("""
+        SELECT DATE(due_date) as due_date, COUNT(*) as open_count
+        FROM book_issues
+        WHERE status = 'Issued'
+        GROUP BY DATE(due_date)
+    """)
+    actual_buckets = {row['due_date']: row['open_count'] for row in cur.fetchall()}
+    cur.execute("SELECT due_date, open_count FROM issue_due_buckets FOR UPDATE")
+    stored_buckets = {row['due_date']: row['open_count'] for row in cur.fetchall()}
+
+    for due_date in sorted(set(actual_buckets) | set(stored_buckets)):
+        stored_count = stored_buckets.get(due_date, 0)
+        actual_count = actual_buckets.get(due_date, 0)
+        if stored_count != actual_count:
+            drift[f"due_bucket:{due_date}"] = (stored_count, actual_count)
+
+    cur.execute("""
+        REPLACE INTO library_counters
+            (id, total_books, available_books, total_students, issued_books)
+        VALUES (1, %s, %s, %s, %s)
+    """, tuple(actual[col] for col in COUNTER_COLUMNS))
+
+    cur.execute("DELETE FROM issue_due_buckets")
+    if actual_buckets:
+        cur.executemany(
+            "INSERT INTO issue_due_buckets (due_date, open_count) VALUES (%s, %s)",
+            list(actual_buckets.items())
+        )
+
+    return drift
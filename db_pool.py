@@ -0,0 +1,208 @@
+# MySQL connection pool.
+# Keeps authenticated connections to the database open between requests so a
+# request doesn't pay a TCP+TLS+auth handshake to the remote host every time.
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+import MySQLdb
+from MySQLdb import cursors
+
+logger = logging.getLogger(__name__)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    def __init__(self, host, port, user, password, db, cursorclass='DictCursor',
+                 charset='utf8', min_size=2, max_size=10, checkout_timeout=10,
+                 ping_after_idle=30, max_lifetime=1800, connect_timeout=10):
+        self.connect_args = {
+            'host': host,
+            'port': port,
+            'user': user,
+            'passwd': password,
+            'db': db,
+            'charset': charset,
+            'use_unicode': True,
+            'connect_timeout': connect_timeout,
+            'cursorclass': getattr(cursors, cursorclass),
+        }
+        self.min_size = min_size
+        self.max_size = max_size
+        self.checkout_timeout = checkout_timeout
+        self.ping_after_idle = ping_after_idle
+        self.max_lifetime = max_lifetime
+
+        self._cond = threading.Condition()
+        self._idle = []        # [(conn, last_used)] - used as a stack so warm connections are reused first
+        self._created_at = {}  # id(conn) -> monotonic creation time
+        self._size = 0         # open + being-opened connections
+        self._in_use = 0
+
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'wait_seconds_total': 0.0,
+            'wait_seconds_max': 0.0,
+            'timeouts': 0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'failed_pings': 0,
+        }
+
+    def _connect(self):
+        conn = MySQLdb.connect(**self.connect_args)
+        self._created_at[id(conn)] = time.monotonic()
+        with self._cond:
+            self._stats['connections_created'] += 1
+        return conn
+
+    def _close(self, conn):
+        self._created_at.pop(id(conn), None)
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _expired(self, conn, now):
+        return now - self._created_at.get(id(conn), now) > self.max_lifetime
+
+    def prewarm(self):
+        # Open connections up to min_size so the first requests don't pay for them
+        opened = []
+        with self._cond:
+            wanted = max(0, self.min_size - self._size)
+            self._size += wanted
+        try:
+            for _ in range(wanted):
+                opened.append(self._connect())
+        finally:
+            now = time.monotonic()
+            with self._cond:
+                self._size -= wanted - len(opened)
+                self._idle.extend((conn, now) for conn in opened)
+                self._cond.notify_all()
+        return len(opened)
+
+    def checkout(self):
+        started = time.monotonic()
+        deadline = started + self.checkout_timeout
+        waited = False
+
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, last_used = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolTimeout(f"No database connection available after {self.checkout_timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+
+            wait = time.monotonic() - started
+            self._stats['checkouts'] += 1
+            if waited:
+                self._stats['waits'] += 1
+            self._stats['wait_seconds_total'] += wait
+            self._stats['wait_seconds_max'] = max(self._stats['wait_seconds_max'], wait)
+            self._in_use += 1
+
+        try:
+            now = time.monotonic()
+            if conn is not None and self._expired(conn, now):
+                self._close(conn)
+                conn = None
+                with self._cond:
+                    self._stats['connections_recycled'] += 1
+            elif conn is not None and now - last_used > self.ping_after_idle:
+                try:
+                    conn.ping()
+                except MySQLdb.Error:
+                    self._close(conn)
+                    conn = None
+                    with self._cond:
+                        self._stats['failed_pings'] += 1
+            if conn is None:
+                conn = self._connect()
+            return conn
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def checkin(self, conn, discard=False):
+        # End whatever transaction the borrower left open; a connection that
+        # can't even roll back is not worth keeping.
+        if not discard:
+            try:
+                conn.rollback()
+            except MySQLdb.Error:
+                discard = True
+
+        now = time.monotonic()
+        if not discard and self._expired(conn, now):
+            discard = True
+            with self._cond:
+                self._stats['connections_recycled'] += 1
+
+        if discard:
+            self._close(conn)
+
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._size -= 1
+            else:
+                self._idle.append((conn, now))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        # For code running outside a request (CLI commands, background workers)
+        conn = self.checkout()
+        try:
+            yield conn
+        except MySQLdb.OperationalError:
+            self.checkin(conn, discard=True)
+            raise
+        except Exception:
+            self.checkin(conn)
+            raise
+        else:
+            self.checkin(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._in_use,
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+            })
+        if stats['checkouts']:
+            stats['wait_seconds_avg'] = stats['wait_seconds_total'] / stats['checkouts']
+        else:
+            stats['wait_seconds_avg'] = 0.0
+        return stats
@@ -0,0 +1,73 @@
+# Streaming exports (/export/transactions, /export/overdue-books,
+# /export/students).
+# Rows are read from an unbuffered server-side cursor (SSCursor) and encoded
+# a batch at a time, so an export of any size holds one batch in memory and
+# the first bytes go out as soon as MySQL returns the first rows.
+#
+# Dates are written as ISO 8601 in both formats.
+
+import csv
+import io
+import json
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+EXPORT_BATCH = 1000
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    if isinstance(value, timedelta):
+        return value.total_seconds()
+    raise TypeError(f"Cannot encode {type(value).__name__} as JSON")
+
+
+def _csv_value(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def columns_of(cur):
+    return [column[0] for column in cur.description]
+
+
+def csv_chunks(cur, batch_size=EXPORT_BATCH):
+    # cur has executed its query; yields the header, then one chunk per batch
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns_of(cur))
+    yield buffer.getvalue()
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows([_csv_value(value) for value in row] for row in rows)
+        yield buffer.getvalue()
+
+
+def ndjson_chunks(cur, batch_size=EXPORT_BATCH):
+    columns = columns_of(cur)
+    while True:
+        rows = cur.fetchmany(batch_size)
+        if not rows:
+            break
+        yield ''.join(
+            json.dumps(dict(zip(columns, row)), default=_json_default, ensure_ascii=False) + '\n'
+            for row in rows
+        )
+
+
+def export_chunks(cur, fmt, batch_size=EXPORT_BATCH):
+    if fmt == 'csv':
+        return csv_chunks(cur, batch_size)
+    return ndjson_chunks(cur, batch_size)
@@ -0,0 +1,113 @@
+# Overdue fines and the per-student fine ledger.
+# FINE_PER_DAY is the only place the rate is defined; both the Python return
+# paths and the set-based SQL below take it from here.
+
+from datetime import datetime
+
+FINE_PER_DAY = 10  # ₹ per day overdue
+
+# accrue_fines, step one: every open overdue issue's fine up to today
+ACCRUE_ISSUE_FINES = """
+    UPDATE book_issues
+    SET fine = DATEDIFF(%s, due_date) * %s
+    WHERE status = 'Issued' AND due_date < %s
+"""
+
+# Step two's per-student totals of those fines
+OPEN_FINES_BY_STUDENT = """
+    SELECT student_id, SUM(fine) AS accrued
+    FROM book_issues
+    WHERE status = 'Issued' AND due_date < %s
+    GROUP BY student_id
+"""
+
+STUDENT_LEDGER = """
+    SELECT issued_count, accrued_fine, settled_fine, accrued_through
+    FROM student_fine_ledger
+    WHERE student_id = %s
+"""
+
+# A student's open overdue issues, for the fine accrued since the ledger's
+# accrued_through
+STUDENT_OVERDUE_ISSUES = """
+    SELECT due_date
+    FROM book_issues
+    WHERE student_id = %s AND status = 'Issued' AND due_date < %s
+"""
+
+
+def _as_date(value):
+    # Fines count whole days; a datetime (e.g. from a DATETIME column) is cut
+    # to its date so it can be mixed with plain dates
+    return value.date() if isinstance(value, datetime) else value
+
+
+def calculate_fine(due_date, returned_on):
+    days_late = max(0, (_as_date(returned_on) - _as_date(due_date)).days)
+    return days_late, days_late * FINE_PER_DAY
+
+
+def record_issues(cur, student_id, count=1):
+    cur.execute("""
+        INSERT INTO student_fine_ledger (student_id, issued_count)
+        VALUES (%s, %s)
+        ON DUPLICATE KEY UPDATE issued_count = issued_count + VALUES(issued_count)
+    """, (student_id, count))
+
+
+def record_returns(cur, returns):
+    # returns: iterable of (student_id, fine accrued so far, final fine).
+    # The accrued part leaves the open balance and the final fine is settled.
+    per_student = {}
+    for student_id, accrued, fine in returns:
+        closed, open_fine, settled = per_student.get(student_id, (0, 0, 0))
+        per_student[student_id] = (closed + 1, open_fine + (accrued or 0), settled + fine)
+    if not per_student:
+        return
+    cur.executemany("""
+        UPDATE student_fine_ledger
+        SET issued_count = issued_count - %s,
+            accrued_fine = accrued_fine - %s,
+            settled_fine = settled_fine + %s
+        WHERE student_id = %s
+    """, [(closed, open_fine, settled, student_id)
+          for student_id, (closed, open_fine, settled) in per_student.items()])
+
+
+def accrue_fines(cur, today):
+    # Nightly job: bring every open overdue issue's fine up to `today`, then
+    # refresh each student's open balance from those rows. Both are single
+    # set-based statements regardless of how many issues are open.
+    cur.execute(ACCRUE_ISSUE_FINES, (today, FINE_PER_DAY, today))
+    advanced = cur.rowcount
+
+    cur.execute("""
+        UPDATE student_fine_ledger l
+        LEFT JOIN (""" + OPEN_FINES_BY_STUDENT + """) a ON a.student_id = l.student_id
+        SET l.accrued_fine = COALESCE(a.accrued, 0),
+            l.accrued_through = %s
+    """, (today, today))
+    return advanced
+
+
+def read_student_ledger(cur, student_id):
+    cur.execute(STUDENT_LEDGER, (student_id,))
+    return cur.fetchone() or {
+        'issued_count': 0, 'accrued_fine': 0, 'settled_fine': 0, 'accrued_through': None
+    }
+
+
+def open_fine(cur, student_id, ledger, today):
+    # The student's open fine as of `today`: the ledger balance from the last
+    # accrual plus what each open overdue issue has accrued since, so the
+    # figure doesn't wait for the next accrue-fines run
+    total = ledger['accrued_fine']
+    if not ledger['issued_count']:
+        return total
+    accrued_through = ledger['accrued_through']
+    cur.execute(STUDENT_OVERDUE_ISSUES, (student_id, today))
+    for row in cur.fetchall():
+        total += calculate_fine(row['due_date'], today)[1]
+        if accrued_through:
+            total -= calculate_fine(row['due_date'], accrued_through)[1]
+    return total
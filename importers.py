@@ -0,0 +1,241 @@
+# Row sources for the bulk import endpoints.
+# Uploads are read incrementally where the format allows it (CSV, NDJSON), so
+# a large file is never held in memory as a whole.
+
+import csv
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+NDJSON_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonl')
+CSV_TYPES = ('text/csv', 'application/csv')
+
+log = logging.getLogger(__name__)
+
+
+def _text_stream(stream):
+    if isinstance(stream, io.RawIOBase):
+        stream = io.BufferedReader(stream)
+    return io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+
+
+def _upload_format(filename, mimetype):
+    filename = (filename or '').lower()
+    if mimetype in NDJSON_TYPES or filename.endswith(('.ndjson', '.jsonl')):
+        return 'ndjson'
+    if mimetype == 'application/json' or filename.endswith('.json'):
+        return 'json'
+    return 'csv'
+
+
+def upload_source(req):
+    # (binary stream, format) for a multipart `file` upload or a raw body
+    if 'file' in req.files:
+        upload = req.files['file']
+        return upload.stream, _upload_format(upload.filename, upload.mimetype)
+    return req.stream, _upload_format(None, req.mimetype)
+
+
+def iter_upload_rows(req):
+    stream, fmt = upload_source(req)
+    return iter_rows(stream, fmt)
+
+
+def iter_rows(stream, fmt):
+    # Yields (row_number, record, error) from a JSON array, NDJSON or CSV
+    # stream. Row numbers start at 1 and count data rows only.
+    if fmt == 'json':
+        records = json.load(_text_stream(stream))
+        if not isinstance(records, list):
+            raise ValueError("Expected a JSON array of rows")
+        for row_number, record in enumerate(records, start=1):
+            if isinstance(record, dict):
+                yield row_number, record, None
+            else:
+                yield row_number, None, "Row is not an object"
+        return
+
+    text = _text_stream(stream)
+    if fmt == 'ndjson':
+        row_number = 0
+        for line in text:
+            line = line.strip()
+            if not line:
+                continue
+            row_number += 1
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f"Invalid JSON: {e}"
+                continue
+            if isinstance(record, dict):
+                yield row_number, record, None
+            else:
+                yield row_number, None, "Row is not an object"
+        return
+
+    for row_number, record in enumerate(csv.DictReader(text), start=1):
+        yield row_number, {key.strip(): value for key, value in record.items() if key}, None
+
+
+def spool_upload(req, directory=None, chunk_size=64 * 1024):
+    # Copy the upload to a temporary file a chunk at a time so a background
+    # job can read it after the request has finished. Returns (path, format).
+    stream, fmt = upload_source(req)
+    fd, path = tempfile.mkstemp(prefix='import-', suffix=f'.{fmt}', dir=directory)
+    with os.fdopen(fd, 'wb') as spool:
+        while True:
+            chunk = stream.read(chunk_size)
+            if not chunk:
+                break
+            spool.write(chunk)
+    return path, fmt
+
+
+class ImportJob:
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = 'queued'
+        self.rows = 0
+        self.inserted = 0
+        self.errors = []
+        self.failed = None  # set on jobs loaded mid-run, whose errors aren't stored yet
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+
+    @classmethod
+    def from_row(cls, row):
+        job = cls(row['kind'])
+        job.id = row['job_id']
+        job.status = row['status']
+        job.rows = row['row_count']
+        job.inserted = row['inserted_count']
+        job.errors = json.loads(row['errors']) if row['errors'] else []
+        job.failed = row['failed_count']
+        job.error = row['error']
+        job.created_at = row['created_at']
+        job.finished_at = row['finished_at']
+        return job
+
+    def to_dict(self, max_errors=None):
+        errors = self.errors if max_errors is None else self.errors[:max_errors]
+        return {
+            'job_id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'rows': self.rows,
+            'inserted': self.inserted,
+            'failed': len(self.errors) if self.failed is None else self.failed,
+            'errors': errors,
+            'error': self.error,
+            'elapsed': round((self.finished_at or time.time()) - self.created_at, 3),
+        }
+
+
+class ImportJobs:
+    # Background runner for imports too large to process inside a request.
+    # Jobs run on the worker that accepted the upload and are saved to the
+    # import_jobs table as they go, so a status poll can land on any worker.
+    # Finished jobs are kept for `retention` seconds so clients can poll them.
+
+    def __init__(self, pool, max_workers=2, retention=3600):
+        self.pool = pool
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='import')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.retention = retention
+
+    def submit(self, kind, fn, *args):
+        job = ImportJob(kind)
+        self._save(job)
+        with self._lock:
+            self._expire()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, *args)
+        return job
+
+    def get(self, job_id):
+        # Jobs running here are read from memory, everything else from the table
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job:
+            return job
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT * FROM import_jobs WHERE job_id = %s", (job_id,))
+            row = cur.fetchone()
+            cur.close()
+        return ImportJob.from_row(row) if row else None
+
+    def checkpoint(self, job):
+        # Progress counters for pollers on other workers; called by the
+        # import function between chunks
+        try:
+            self._save(job, with_errors=False)
+        except Exception:
+            log.exception("Could not save progress of import job %s", job.id)
+
+    def _run(self, job, fn, *args):
+        job.status = 'running'
+        self.checkpoint(job)
+        try:
+            fn(job, *args)
+            job.status = 'finished'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            try:
+                self._save(job)
+            except Exception:
+                log.exception("Could not save import job %s", job.id)
+
+    def _save(self, job, with_errors=True):
+        errors = json.dumps(job.errors) if with_errors else None
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("""
+                INSERT INTO import_jobs
+                    (job_id, kind, status, row_count, inserted_count, failed_count,
+                     errors, error, created_at, finished_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE
+                    status = VALUES(status), row_count = VALUES(row_count),
+                    inserted_count = VALUES(inserted_count), failed_count = VALUES(failed_count),
+                    errors = COALESCE(VALUES(errors), errors), error = VALUES(error),
+                    finished_at = VALUES(finished_at)
+            """, (job.id, job.kind, job.status, job.rows, job.inserted, len(job.errors),
+                  errors, job.error, job.created_at, job.finished_at))
+            conn.commit()
+            cur.close()
+
+    def _expire(self):
+        cutoff = time.time() - self.retention
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished_at and job.finished_at < cutoff]:
+            del self._jobs[job_id]
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("DELETE FROM import_jobs WHERE finished_at < %s", (cutoff,))
+            conn.commit()
+            cur.close()
+
+
+def chunked(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
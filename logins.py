@@ -0,0 +1,120 @@
+# Device/login bookkeeping for /student-login.
+# Each student has one student_logins row (unique since migration 0007), so a
+# login is a single upsert. With write-behind enabled, logins are buffered in
+# memory instead, coalesced per student and flushed as multi-row upserts.
+
+import atexit
+import logging
+import threading
+
+from importers import chunked
+
+LOGIN_FLUSH_INTERVAL = 2.0   # seconds between write-behind flushes
+LOGIN_FLUSH_BATCH = 1000     # rows per multi-row upsert
+LOGIN_MAX_PENDING = 50000    # flush early once this many students are buffered
+
+log = logging.getLogger(__name__)
+
+UPSERT_LOGIN = """
+    INSERT INTO student_logins
+    (student_id, register_on, last_login, device_name, device_os, device_token)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        last_login = VALUES(last_login),
+        device_name = VALUES(device_name),
+        device_os = VALUES(device_os),
+        device_token = VALUES(device_token)
+"""
+
+
+def login_row(student_id, now, device_info):
+    return (student_id, now, now, device_info.get('name'), device_info.get('os'),
+            device_info.get('token'))
+
+
+def record_login(cur, student_id, now, device_info):
+    cur.execute(UPSERT_LOGIN, login_row(student_id, now, device_info))
+
+
+class LoginBuffer:
+    # Write-behind buffer: the latest login per student wins, and rows are
+    # written by a background thread. Logins still buffered when the process
+    # dies are lost, which is acceptable for last_login/device telemetry.
+
+    def __init__(self, pool, flush_interval=LOGIN_FLUSH_INTERVAL, batch_size=LOGIN_FLUSH_BATCH,
+                 max_pending=LOGIN_MAX_PENDING):
+        self.pool = pool
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._totals = {'recorded': 0, 'flushed': 0, 'flushes': 0, 'failures': 0}
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='login-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def record(self, student_id, now, device_info):
+        row = login_row(student_id, now, device_info)
+        with self._lock:
+            previous = self._pending.get(student_id)
+            if previous:
+                # Keep the first register_on seen in this window
+                row = (student_id, previous[1]) + row[2:]
+            self._pending[student_id] = row
+            self._totals['recorded'] += 1
+            full = len(self._pending) >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, {}
+            if not rows:
+                return 0
+            try:
+                with self.pool.connection() as conn:
+                    cur = conn.cursor()
+                    for batch in chunked(rows.values(), self.batch_size):
+                        cur.executemany(UPSERT_LOGIN, batch)
+                    conn.commit()
+                    cur.close()
+            except Exception:
+                # Put the rows back unless a newer login arrived meanwhile
+                with self._lock:
+                    for student_id, row in rows.items():
+                        self._pending.setdefault(student_id, row)
+                    self._totals['failures'] += 1
+                raise
+            with self._lock:
+                self._totals['flushed'] += len(rows)
+                self._totals['flushes'] += 1
+            return len(rows)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._totals, pending=len(self._pending))
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                log.exception("Login write-behind flush failed")
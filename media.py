@@ -0,0 +1,73 @@
+# Serving of stored images (student photos, book covers) under /uploads.
+# Files written by photos.save_upload are named after their sha256, so the
+# name is a strong ETag and the URL can be cached for a year: a new picture
+# always gets a new URL. The cover placeholder is revalidated hourly.
+#
+# Responses go through send_from_directory, which handles If-None-Match,
+# If-Modified-Since and Range, and hands the open file to the server's
+# wsgi.file_wrapper (sendfile under gunicorn). With USE_X_SENDFILE set, the
+# body is left to the front-end proxy instead.
+#
+# Only published files are served: content-named originals and variants and
+# the cover placeholder. Uploads still being written (the tmp directories,
+# *.tmp variants) and anything else under MEDIA_ROOT are a 404.
+
+import os
+import posixpath
+import re
+
+from flask import abort, send_from_directory
+
+MEDIA_ROOT = 'uploads'
+COVER_ROOT = os.path.join(MEDIA_ROOT, 'book_covers')
+COVER_PLACEHOLDER = os.path.join(COVER_ROOT, 'placeholder.svg')
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+MUTABLE_MAX_AGE = 3600
+
+_CONTENT_NAME = re.compile(r'^([0-9a-f]{64}(?:_[a-z]+)?)\.[a-z]+$')
+
+# Directories under MEDIA_ROOT whose content-named files are public
+PUBLISHED_DIRS = (
+    'student_photos/originals/', 'student_photos/variants/', 'book_covers/originals/',
+)
+PUBLISHED_PLACEHOLDER = os.path.relpath(COVER_PLACEHOLDER, MEDIA_ROOT).replace(os.sep, '/')
+
+PLACEHOLDER_SVG = """<svg xmlns="http://www.w3.org/2000/svg" width="150" height="150" viewBox="0 0 150 150">
+<rect width="150" height="150" fill="#e0e0e0"/>
+<text x="75" y="80" font-family="sans-serif" font-size="14" fill="#757575" text-anchor="middle">No cover</text>
+</svg>
+"""
+
+
+def ensure_placeholder():
+    if not os.path.exists(COVER_PLACEHOLDER):
+        os.makedirs(COVER_ROOT, exist_ok=True)
+        with open(COVER_PLACEHOLDER, 'w', encoding='utf-8') as placeholder:
+            placeholder.write(PLACEHOLDER_SVG)
+
+
+def media_url(path):
+    # Stored path -> URL served by serve_media
+    return '/' + path.replace(os.sep, '/')
+
+
+def cover_url(cover_path):
+    return media_url(cover_path or COVER_PLACEHOLDER)
+
+
+def serve_media(filename):
+    filename = posixpath.normpath(filename)
+    match = _CONTENT_NAME.match(posixpath.basename(filename))
+    if match and filename.startswith(PUBLISHED_DIRS):
+        response = send_from_directory(
+            os.path.abspath(MEDIA_ROOT), filename,
+            conditional=True, etag=match.group(1), max_age=IMMUTABLE_MAX_AGE
+        )
+        response.cache_control.immutable = True
+        return response
+    if filename == PUBLISHED_PLACEHOLDER:
+        return send_from_directory(
+            os.path.abspath(MEDIA_ROOT), filename, conditional=True, max_age=MUTABLE_MAX_AGE
+        )
+    abort(404)
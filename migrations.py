@@ -0,0 +1,614 @@
+# Schema migrations for the library database.
+# Each migration is a list of statements that runs once; applied ids are
+# recorded in schema_migrations so `flask --app api migrate` is safe to re-run.
+# 0000 creates the core tables as they stood before these migrations (a no-op
+# on existing databases), so an empty database can be built from scratch.
+#
+# query_plans.py checks that the hot queries actually use these indexes.
+
+# Whole issue path in one server round trip. Locks the student row (so the
+# active-issue limit can't be raced) and then the book row (so quantity can't
+# be oversold), and keeps the dashboard counters and fine ledger in step like
+# counters.py and fines.py do for the Python write paths. The caller commits.
+#
+# Every migration that (re)creates issue_book_atomic gets its own copy of the
+# text, frozen once the migration has shipped: changing the procedure means a
+# new copy and a new migration, never an edit to an old one.
+
+# 0004: the first version; the student's semester is worked out from
+# admission_year and the term passed in
+ISSUE_BOOK_PROCEDURE_0004 = """
+CREATE PROCEDURE issue_book_atomic(
+    IN p_student_id INT,
+    IN p_book_id INT,
+    IN p_issue_date DATE,
+    IN p_due_date DATE,
+    IN p_max_issues INT,
+    IN p_check_semester TINYINT,
+    IN p_year INT,
+    IN p_term INT
+)
+proc: BEGIN
+    DECLARE v_found TINYINT DEFAULT 1;
+    DECLARE v_student_class VARCHAR(100);
+    DECLARE v_admission_year INT;
+    DECLARE v_semester INT;
+    DECLARE v_active INT DEFAULT 0;
+    DECLARE v_title VARCHAR(255);
+    DECLARE v_book_class VARCHAR(100);
+    DECLARE v_book_semester INT;
+    DECLARE v_quantity INT;
+    DECLARE v_issue_id INT;
+    DECLARE CONTINUE HANDLER FOR NOT FOUND SET v_found = 0;
+
+    SELECT class, admission_year INTO v_student_class, v_admission_year
+    FROM students WHERE student_id = p_student_id
+    FOR UPDATE;
+    IF v_found = 0 THEN
+        SELECT 'student_not_found' AS result, NULL AS issue_id, NULL AS book_title,
+               NULL AS book_class, NULL AS book_semester, NULL AS student_class, NULL AS student_semester;
+        LEAVE proc;
+    END IF;
+    SET v_semester = (p_year - v_admission_year) * 2 + p_term;
+
+    SELECT COUNT(*) INTO v_active FROM book_issues
+    WHERE student_id = p_student_id AND status = 'Issued';
+    IF v_active >= p_max_issues THEN
+        SELECT 'limit_reached' AS result, NULL AS issue_id, NULL AS book_title,
+               NULL AS book_class, NULL AS book_semester, v_student_class AS student_class, v_semester AS student_semester;
+        LEAVE proc;
+    END IF;
+
+    SELECT title, class, semester, quantity INTO v_title, v_book_class, v_book_semester, v_quantity
+    FROM books WHERE book_id = p_book_id
+    FOR UPDATE;
+    IF v_found = 0 OR v_quantity <= 0 THEN
+        SELECT 'not_available' AS result, NULL AS issue_id, v_title AS book_title,
+               v_book_class AS book_class, v_book_semester AS book_semester,
+               v_student_class AS student_class, v_semester AS student_semester;
+        LEAVE proc;
+    END IF;
+
+    IF p_check_semester AND (v_book_class <> v_student_class OR v_book_semester <> v_semester) THEN
+        SELECT 'wrong_semester' AS result, NULL AS issue_id, v_title AS book_title,
+               v_book_class AS book_class, v_book_semester AS book_semester,
+               v_student_class AS student_class, v_semester AS student_semester;
+        LEAVE proc;
+    END IF;
+
+    UPDATE books SET quantity = quantity - 1 WHERE book_id = p_book_id;
+
+    INSERT INTO book_issues (student_id, book_id, issue_date, due_date, status)
+    VALUES (p_student_id, p_book_id, p_issue_date, p_due_date, 'Issued');
+    SET v_issue_id = LAST_INSERT_ID();
+
+    UPDATE library_counters
+    SET issued_books = issued_books + 1,
+        available_books = available_books - IF(v_quantity = 1, 1, 0)
+    WHERE id = 1;
+    INSERT INTO issue_due_buckets (due_date, open_count) VALUES (p_due_date, 1)
+    ON DUPLICATE KEY UPDATE open_count = open_count + 1;
+
+    SELECT 'issued' AS result, v_issue_id AS issue_id, v_title AS book_title,
+           v_book_class AS book_class, v_book_semester AS book_semester,
+           v_student_class AS student_class, v_semester AS student_semester;
+END
+"""
+
+# 0005: also counts the issue in student_fine_ledger
+ISSUE_BOOK_PROCEDURE_0005 = """
+CREATE PROCEDURE issue_book_atomic(
+    IN p_student_id INT,
+    IN p_book_id INT,
+    IN p_issue_date DATE,
+    IN p_due_date DATE,
+    IN p_max_issues INT,
+    IN p_check_semester TINYINT,
+    IN p_year INT,
+    IN p_term INT
+)
+proc: BEGIN
+    DECLARE v_found TINYINT DEFAULT 1;
+    DECLARE v_student_class VARCHAR(100);
+    DECLARE v_admission_year INT;
+    DECLARE v_semester INT;
+    DECLARE v_active INT DEFAULT 0;
+    DECLARE v_title VARCHAR(255);
+    DECLARE v_book_class VARCHAR(100);
+    DECLARE v_book_semester INT;
+    DECLARE v_quantity INT;
+    DECLARE v_issue_id INT;
+    DECLARE CONTINUE HANDLER FOR NOT FOUND SET v_found = 0;
+
+    SELECT class, admission_year INTO v_student_class, v_admission_year
+    FROM students WHERE student_id = p_student_id
+    FOR UPDATE;
+    IF v_found = 0 THEN
+        SELECT 'student_not_found' AS result, NULL AS issue_id, NULL AS book_title,
+               NULL AS book_class, NULL AS book_semester, NULL AS student_class, NULL AS student_semester;
+        LEAVE proc;
+    END IF;
+    SET v_semester = (p_year - v_admission_year) * 2 + p_term;
+
+    SELECT COUNT(*) INTO v_active FROM book_issues
+    WHERE student_id = p_student_id AND status = 'Issued';
+    IF v_active >= p_max_issues THEN
+        SELECT 'limit_reached' AS result, NULL AS issue_id, NULL AS book_title,
+               NULL AS book_class, NULL AS book_semester, v_student_class AS student_class, v_semester AS student_semester;
+        LEAVE proc;
+    END IF;
+
+    SELECT title, class, semester, quantity INTO v_title, v_book_class, v_book_semester, v_quantity
+    FROM books WHERE book_id = p_book_id
+    FOR UPDATE;
+    IF v_found = 0 OR v_quantity <= 0 THEN
+        SELECT 'not_available' AS result, NULL AS issue_id, v_title AS book_title,
+               v_book_class AS book_class, v_book_semester AS book_semester,
+               v_student_class AS student_class, v_semester AS student_semester;
+        LEAVE proc;
+    END IF;
+
+    IF p_check_semester AND (v_book_class <> v_student_class OR v_book_semester <> v_semester) THEN
+        SELECT 'wrong_semester' AS result, NULL AS issue_id, v_title AS book_title,
+               v_book_class AS book_class, v_book_semester AS book_semester,
+               v_student_class AS student_class, v_semester AS student_semester;
+        LEAVE proc;
+    END IF;
+
+    UPDATE books SET quantity = quantity - 1 WHERE book_id = p_book_id;
+
+    INSERT INTO book_issues (student_id, book_id, issue_date, due_date, status)
+    VALUES (p_student_id, p_book_id, p_issue_date, p_due_date, 'Issued');
+    SET v_issue_id = LAST_INSERT_ID();
+
+    UPDATE library_counters
+    SET issued_books = issued_books + 1,
+        available_books = available_books - IF(v_quantity = 1, 1, 0)
+    WHERE id = 1;
+    INSERT INTO issue_due_buckets (due_date, open_count) VALUES (p_due_date, 1)
+    ON DUPLICATE KEY UPDATE open_count = open_count + 1;
+    INSERT INTO student_fine_ledger (student_id, issued_count) VALUES (p_student_id, 1)
+    ON DUPLICATE KEY UPDATE issued_count = issued_count + 1;
+
+    SELECT 'issued' AS result, v_issue_id AS issue_id, v_title AS book_title,
+           v_book_class AS book_class, v_book_semester AS book_semester,
+           v_student_class AS student_class, v_semester AS student_semester;
+END
+"""
+
+# 0010: reads students.current_semester instead of computing it
+ISSUE_BOOK_PROCEDURE_0010 = """
+CREATE PROCEDURE issue_book_atomic(
+    IN p_student_id INT,
+    IN p_book_id INT,
+    IN p_issue_date DATE,
+    IN p_due_date DATE,
+    IN p_max_issues INT,
+    IN p_check_semester TINYINT
+)
+proc: BEGIN
+    DECLARE v_found TINYINT DEFAULT 1;
+    DECLARE v_student_class VARCHAR(100);
+    DECLARE v_semester INT;
+    DECLARE v_active INT DEFAULT 0;
+    DECLARE v_title VARCHAR(255);
+    DECLARE v_book_class VARCHAR(100);
+    DECLARE v_book_semester INT;
+    DECLARE v_quantity INT;
+    DECLARE v_issue_id INT;
+    DECLARE CONTINUE HANDLER FOR NOT FOUND SET v_found = 0;
+
+    SELECT class, current_semester INTO v_student_class, v_semester
+    FROM students WHERE student_id = p_student_id
+    FOR UPDATE;
+    IF v_found = 0 THEN
+        SELECT 'student_not_found' AS result, NULL AS issue_id, NULL AS book_title,
+               NULL AS book_class, NULL AS book_semester, NULL AS student_class, NULL AS student_semester;
+        LEAVE proc;
+    END IF;
+
+    SELECT COUNT(*) INTO v_active FROM book_issues
+    WHERE student_id = p_student_id AND status = 'Issued';
+    IF v_active >= p_max_issues THEN
+        SELECT 'limit_reached' AS result, NULL AS issue_id, NULL AS book_title,
+               NULL AS book_class, NULL AS book_semester, v_student_class AS student_class, v_semester AS student_semester;
+        LEAVE proc;
+    END IF;
+
+    SELECT title, class, semester, quantity INTO v_title, v_book_class, v_book_semester, v_quantity
+    FROM books WHERE book_id = p_book_id
+    FOR UPDATE;
+    IF v_found = 0 OR v_quantity <= 0 THEN
+        SELECT 'not_available' AS result, NULL AS issue_id, v_title AS book_title,
+               v_book_class AS book_class, v_book_semester AS book_semester,
+               v_student_class AS student_class, v_semester AS student_semester;
+        LEAVE proc;
+    END IF;
+
+    IF p_check_semester AND (v_book_class <> v_student_class OR v_book_semester <> v_semester) THEN
+        SELECT 'wrong_semester' AS result, NULL AS issue_id, v_title AS book_title,
+               v_book_class AS book_class, v_book_semester AS book_semester,
+               v_student_class AS student_class, v_semester AS student_semester;
+        LEAVE proc;
+    END IF;
+
+    UPDATE books SET quantity = quantity - 1 WHERE book_id = p_book_id;
+
+    INSERT INTO book_issues (student_id, book_id, issue_date, due_date, status)
+    VALUES (p_student_id, p_book_id, p_issue_date, p_due_date, 'Issued');
+    SET v_issue_id = LAST_INSERT_ID();
+
+    UPDATE library_counters
+    SET issued_books = issued_books + 1,
+        available_books = available_books - IF(v_quantity = 1, 1, 0)
+    WHERE id = 1;
+    INSERT INTO issue_due_buckets (due_date, open_count) VALUES (p_due_date, 1)
+    ON DUPLICATE KEY UPDATE open_count = open_count + 1;
+    INSERT INTO student_fine_ledger (student_id, issued_count) VALUES (p_student_id, 1)
+    ON DUPLICATE KEY UPDATE issued_count = issued_count + 1;
+
+    SELECT 'issued' AS result, v_issue_id AS issue_id, v_title AS book_title,
+           v_book_class AS book_class, v_book_semester AS book_semester,
+           v_student_class AS student_class, v_semester AS student_semester;
+END
+"""
+
+# 0012: a NULL class or semester on either side fails the semester check
+# (with <> the comparison was NULL and the check passed)
+ISSUE_BOOK_PROCEDURE_0012 = """
+CREATE PROCEDURE issue_book_atomic(
+    IN p_student_id INT,
+    IN p_book_id INT,
+    IN p_issue_date DATE,
+    IN p_due_date DATE,
+    IN p_max_issues INT,
+    IN p_check_semester TINYINT
+)
+proc: BEGIN
+    DECLARE v_found TINYINT DEFAULT 1;
+    DECLARE v_student_class VARCHAR(100);
+    DECLARE v_semester INT;
+    DECLARE v_active INT DEFAULT 0;
+    DECLARE v_title VARCHAR(255);
+    DECLARE v_book_class VARCHAR(100);
+    DECLARE v_book_semester INT;
+    DECLARE v_quantity INT;
+    DECLARE v_issue_id INT;
+    DECLARE CONTINUE HANDLER FOR NOT FOUND SET v_found = 0;
+
+    SELECT class, current_semester INTO v_student_class, v_semester
+    FROM students WHERE student_id = p_student_id
+    FOR UPDATE;
+    IF v_found = 0 THEN
+        SELECT 'student_not_found' AS result, NULL AS issue_id, NULL AS book_title,
+               NULL AS book_class, NULL AS book_semester, NULL AS student_class, NULL AS student_semester;
+        LEAVE proc;
+    END IF;
+
+    SELECT COUNT(*) INTO v_active FROM book_issues
+    WHERE student_id = p_student_id AND status = 'Issued';
+    IF v_active >= p_max_issues THEN
+        SELECT 'limit_reached' AS result, NULL AS issue_id, NULL AS book_title,
+               NULL AS book_class, NULL AS book_semester, v_student_class AS student_class, v_semester AS student_semester;
+        LEAVE proc;
+    END IF;
+
+    SELECT title, class, semester, quantity INTO v_title, v_book_class, v_book_semester, v_quantity
+    FROM books WHERE book_id = p_book_id
+    FOR UPDATE;
+    IF v_found = 0 OR v_quantity <= 0 THEN
+        SELECT 'not_available' AS result, NULL AS issue_id, v_title AS book_title,
+               v_book_class AS book_class, v_book_semester AS book_semester,
+               v_student_class AS student_class, v_semester AS student_semester;
+        LEAVE proc;
+    END IF;
+
+    IF p_check_semester AND NOT COALESCE(v_book_class = v_student_class AND v_book_semester = v_semester, FALSE) THEN
+        SELECT 'wrong_semester' AS result, NULL AS issue_id, v_title AS book_title,
+               v_book_class AS book_class, v_book_semester AS book_semester,
+               v_student_class AS student_class, v_semester AS student_semester;
+        LEAVE proc;
+    END IF;
+
+    UPDATE books SET quantity = quantity - 1 WHERE book_id = p_book_id;
+
+    INSERT INTO book_issues (student_id, book_id, issue_date, due_date, status)
+    VALUES (p_student_id, p_book_id, p_issue_date, p_due_date, 'Issued');
+    SET v_issue_id = LAST_INSERT_ID();
+
+    UPDATE library_counters
+    SET issued_books = issued_books + 1,
+        available_books = available_books - IF(v_quantity = 1, 1, 0)
+    WHERE id = 1;
+    INSERT INTO issue_due_buckets (due_date, open_count) VALUES (p_due_date, 1)
+    ON DUPLICATE KEY UPDATE open_count = open_count + 1;
+    INSERT INTO student_fine_ledger (student_id, issued_count) VALUES (p_student_id, 1)
+    ON DUPLICATE KEY UPDATE issued_count = issued_count + 1;
+
+    SELECT 'issued' AS result, v_issue_id AS issue_id, v_title AS book_title,
+           v_book_class AS book_class, v_book_semester AS book_semester,
+           v_student_class AS student_class, v_semester AS student_semester;
+END
+"""
+
+MIGRATIONS = [
+    ('0000_base_tables', [
+        """
+        CREATE TABLE IF NOT EXISTS books (
+            book_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            title VARCHAR(255) NOT NULL,
+            author VARCHAR(255) NOT NULL,
+            subject VARCHAR(100) NOT NULL,
+            class VARCHAR(100) NOT NULL,
+            quantity INT NOT NULL DEFAULT 0,
+            semester INT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS students (
+            student_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            father_name VARCHAR(255) NOT NULL,
+            class VARCHAR(100) NOT NULL,
+            admission_year SMALLINT NOT NULL,
+            roll_no VARCHAR(50) NOT NULL,
+            college_rollno VARCHAR(50) NULL,
+            mobile_number VARCHAR(15) NOT NULL,
+            guardian_mobile_number VARCHAR(15) NOT NULL,
+            photo_path VARCHAR(255) NULL,
+            email VARCHAR(255) NULL,
+            password VARCHAR(255) NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS book_issues (
+            issue_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            student_id INT NOT NULL,
+            book_id INT NOT NULL,
+            issue_date DATE NOT NULL,
+            due_date DATE NOT NULL,
+            return_date DATE NULL,
+            status VARCHAR(20) NOT NULL DEFAULT 'Issued',
+            fine INT NOT NULL DEFAULT 0,
+            CONSTRAINT fk_book_issues_student FOREIGN KEY (student_id) REFERENCES students (student_id),
+            CONSTRAINT fk_book_issues_book FOREIGN KEY (book_id) REFERENCES books (book_id)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS student_logins (
+            id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            student_id INT NOT NULL,
+            register_on DATETIME NULL,
+            last_login DATETIME NULL,
+            device_name VARCHAR(255) NULL,
+            device_os VARCHAR(100) NULL,
+            device_token VARCHAR(512) NULL,
+            CONSTRAINT fk_student_logins_student FOREIGN KEY (student_id) REFERENCES students (student_id)
+        )
+        """,
+        # Used by the legacy /issue and /return endpoints
+        """
+        CREATE TABLE IF NOT EXISTS transactions (
+            txn_id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            book_id INT NOT NULL,
+            student_id INT NOT NULL,
+            issue_date DATE NOT NULL,
+            due_date DATE NOT NULL,
+            return_date DATE NULL,
+            fine INT NOT NULL DEFAULT 0
+        )
+        """,
+    ]),
+    ('0001_library_counters', [
+        # Single-row rollup read by /dashboard-stats
+        """
+        CREATE TABLE IF NOT EXISTS library_counters (
+            id TINYINT UNSIGNED NOT NULL PRIMARY KEY,
+            total_books INT NOT NULL DEFAULT 0,
+            available_books INT NOT NULL DEFAULT 0,
+            total_students INT NOT NULL DEFAULT 0,
+            issued_books INT NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+        """,
+        # Open issues grouped by due date, so overdue = sum of buckets before today
+        """
+        CREATE TABLE IF NOT EXISTS issue_due_buckets (
+            due_date DATE NOT NULL PRIMARY KEY,
+            open_count INT NOT NULL DEFAULT 0
+        )
+        """,
+        """
+        INSERT IGNORE INTO library_counters
+            (id, total_books, available_books, total_students, issued_books)
+        SELECT 1,
+               (SELECT COUNT(*) FROM books),
+               (SELECT COUNT(*) FROM books WHERE quantity > 0),
+               (SELECT COUNT(*) FROM students),
+               (SELECT COUNT(*) FROM book_issues WHERE status = 'Issued')
+        """,
+        """
+        INSERT IGNORE INTO issue_due_buckets (due_date, open_count)
+        SELECT DATE(due_date), COUNT(*)
+        FROM book_issues
+        WHERE status = 'Issued'
+        GROUP BY DATE(due_date)
+        """,
+    ]),
+    ('0002_search_indexes', [
+        # Term -> id resolution for /transactions search (see search.py)
+        "ALTER TABLE books ADD FULLTEXT INDEX ft_books_title_author (title, author)",
+        "ALTER TABLE students ADD FULLTEXT INDEX ft_students_name_roll (name, roll_no)",
+        "CREATE INDEX idx_students_roll_no ON students (roll_no)",
+        # Matched ids -> their issues, already in display order
+        "CREATE INDEX idx_book_issues_book_date ON book_issues (book_id, issue_date)",
+        "CREATE INDEX idx_book_issues_student_date ON book_issues (student_id, issue_date)",
+    ]),
+    ('0003_transactions_keyset', [
+        # Keyset paging on (issue_date, issue_id); InnoDB appends the primary key
+        "CREATE INDEX idx_book_issues_issue_date ON book_issues (issue_date)",
+    ]),
+    ('0004_issue_book_procedure', [
+        "DROP PROCEDURE IF EXISTS issue_book_atomic",
+        ISSUE_BOOK_PROCEDURE_0004,
+    ]),
+    ('0005_student_fine_ledger', [
+        # One row per student read by /student/<id>/stats (see fines.py).
+        # accrued_fine is the open balance as of accrued_through; run
+        # `flask --app api accrue-fines` nightly to advance it.
+        """
+        CREATE TABLE IF NOT EXISTS student_fine_ledger (
+            student_id INT NOT NULL PRIMARY KEY,
+            issued_count INT NOT NULL DEFAULT 0,
+            accrued_fine INT NOT NULL DEFAULT 0,
+            settled_fine INT NOT NULL DEFAULT 0,
+            accrued_through DATE NULL,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        INSERT IGNORE INTO student_fine_ledger (student_id, issued_count, settled_fine)
+        SELECT student_id,
+               SUM(status = 'Issued'),
+               COALESCE(SUM(CASE WHEN status = 'Returned' THEN fine ELSE 0 END), 0)
+        FROM book_issues
+        GROUP BY student_id
+        """,
+        # The issue procedure now keeps issued_count in step
+        "DROP PROCEDURE IF EXISTS issue_book_atomic",
+        ISSUE_BOOK_PROCEDURE_0005,
+    ]),
+    ('0006_notification_outbox', [
+        # Pending pushes, written in the same transaction as the change they
+        # announce and delivered by outbox.OutboxWorkers
+        """
+        CREATE TABLE IF NOT EXISTS notification_outbox (
+            id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+            student_id INT NULL,
+            token VARCHAR(512) NOT NULL,
+            title VARCHAR(255) NOT NULL,
+            body TEXT NOT NULL,
+            data TEXT NULL,
+            status ENUM('pending', 'sent', 'failed') NOT NULL DEFAULT 'pending',
+            attempts INT NOT NULL DEFAULT 0,
+            next_attempt_at DATETIME(3) NOT NULL,
+            last_error VARCHAR(255) NULL,
+            created_at DATETIME(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3),
+            sent_at DATETIME(3) NULL,
+            latency_ms INT NULL,
+            KEY idx_outbox_due (status, next_attempt_at),
+            KEY idx_outbox_sent (status, sent_at)
+        )
+        """,
+    ]),
+    ('0007_student_logins_upsert', [
+        # One row per student so /student-login can upsert; keep the newest
+        """
+        DELETE older FROM student_logins older
+        JOIN student_logins newer
+          ON newer.student_id = older.student_id AND newer.id > older.id
+        """,
+        "ALTER TABLE student_logins ADD UNIQUE KEY uq_student_logins_student (student_id)",
+        # The login lookup itself
+        "CREATE INDEX idx_students_mobile_number ON students (mobile_number)",
+    ]),
+    ('0008_student_photo_variants', [
+        # photo_path keeps the original; see photos.py for the variants
+        """
+        ALTER TABLE students
+            ADD COLUMN photo_hash CHAR(64) NULL,
+            ADD COLUMN photo_thumb_path VARCHAR(255) NULL,
+            ADD COLUMN photo_web_path VARCHAR(255) NULL
+        """,
+    ]),
+    ('0009_book_covers', [
+        # Local cover store (media.COVER_ROOT); NULL means the placeholder
+        "ALTER TABLE books ADD COLUMN cover_path VARCHAR(255) NULL",
+    ]),
+    ('0010_current_semester', [
+        # Filled in by semesters.SemesterRollover (`flask --app api migrate`
+        # runs it straight after this) and kept current once per term
+        "ALTER TABLE students ADD COLUMN current_semester TINYINT NULL",
+        "CREATE INDEX idx_students_class_semester ON students (class, current_semester)",
+        "CREATE INDEX idx_books_class_semester ON books (class, semester)",
+        """
+        CREATE TABLE IF NOT EXISTS semester_rollover (
+            id TINYINT NOT NULL PRIMARY KEY,
+            year SMALLINT NOT NULL,
+            term TINYINT NOT NULL,
+            rolled_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+        )
+        """,
+        # The issue procedure reads the stored semester
+        "DROP PROCEDURE IF EXISTS issue_book_atomic",
+        ISSUE_BOOK_PROCEDURE_0010,
+    ]),
+    ('0011_issue_status_indexes', [
+        # Open issues by due date: /overdue-books, the exports, overdue
+        # reminders and nightly fine accrual
+        "CREATE INDEX idx_book_issues_status_due ON book_issues (status, due_date)",
+        # A student's active issues: the issue limit in issue_book_atomic,
+        # batch issue and the student stats
+        "CREATE INDEX idx_book_issues_student_status ON book_issues (student_id, status)",
+    ]),
+    ('0012_issue_semester_check_nulls', [
+        # Students missing current_semester are filled in by
+        # semesters.fill_missing_semesters, which `migrate` runs afterwards
+        "DROP PROCEDURE IF EXISTS issue_book_atomic",
+        ISSUE_BOOK_PROCEDURE_0012,
+    ]),
+    ('0013_students_email_index', [
+        # The /login student lookup
+        "CREATE INDEX idx_students_email ON students (email)",
+    ]),
+    ('0014_students_college_rollno_index', [
+        # Bulk student import's per-chunk duplicate check; with this the
+        # mobile/roll number OR is an index merge instead of a scan
+        "CREATE INDEX idx_students_college_rollno ON students (college_rollno)",
+    ]),
+    ('0015_import_jobs', [
+        # Bulk import progress (importers.ImportJobs), so any worker can
+        # answer the status_url; errors is the JSON row error list, written
+        # when the job ends
+        """
+        CREATE TABLE IF NOT EXISTS import_jobs (
+            job_id CHAR(32) NOT NULL PRIMARY KEY,
+            kind VARCHAR(32) NOT NULL,
+            status VARCHAR(16) NOT NULL,
+            row_count INT NOT NULL DEFAULT 0,
+            inserted_count INT NOT NULL DEFAULT 0,
+            failed_count INT NOT NULL DEFAULT 0,
+            errors LONGTEXT NULL,
+            error TEXT NULL,
+            created_at DOUBLE NOT NULL,
+            finished_at DOUBLE NULL,
+            KEY idx_import_jobs_finished (finished_at)
+        )
+        """,
+    ]),
+]
+
+
+def apply_migrations(conn):
+    cur = conn.cursor()
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            id VARCHAR(100) NOT NULL PRIMARY KEY,
+            applied_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    cur.execute("SELECT id FROM schema_migrations")
+    applied = {row['id'] for row in cur.fetchall()}
+
+    newly_applied = []
+    for migration_id, statements in MIGRATIONS:
+        if migration_id in applied:
+            continue
+        for statement in statements:
+            cur.execute(statement)
+        cur.execute("INSERT INTO schema_migrations (id) VALUES (%s)", (migration_id,))
+        conn.commit()
+        newly_applied.append(migration_id)
+
+    cur.close()
+    return newly_applied
@@ -0,0 +1,135 @@
+# Push notification content and transports.
+# Overdue reminders are built as one notice per student with overdue books
+# and a registered device, and queued through outbox.enqueue_for_students;
+# the outbox workers deliver them in FCM_BATCH_SIZE batches and prune tokens
+# FCM reports as gone.
+#
+# The transport is pluggable: FirebaseTransport talks to FCM through
+# firebase_admin, HttpTransport posts the same batches to any HTTP endpoint
+# (see benchmarks/fake_fcm.py for a local stand-in used in load tests).
+
+import requests
+
+from fines import calculate_fine
+from importers import chunked
+from search import id_filter
+
+FCM_BATCH_SIZE = 500  # messaging.send_each limit
+REMINDER_TITLE = 'Library books overdue'
+MAX_TITLES_IN_BODY = 3
+
+# Errors meaning the token will never work again
+DEAD_TOKEN_ERRORS = ('UNREGISTERED', 'SENDER_ID_MISMATCH')
+
+OVERDUE_REMINDERS = """
+    SELECT bi.issue_id, bi.student_id, s.name, b.title, bi.due_date, sl.device_token
+    FROM book_issues bi
+    JOIN students s ON bi.student_id = s.student_id
+    JOIN books b ON bi.book_id = b.book_id
+    JOIN student_logins sl ON sl.student_id = bi.student_id
+    WHERE bi.status = 'Issued' AND bi.due_date < %s
+      AND sl.device_token IS NOT NULL AND sl.device_token <> ''
+    ORDER BY bi.student_id, bi.due_date
+"""
+
+
+class FirebaseTransport:
+    def __init__(self, app=None):
+        import firebase_admin
+        from firebase_admin import messaging
+        self._messaging = messaging
+        if app is None:
+            try:
+                app = firebase_admin.get_app()
+            except ValueError:
+                # Credentials come from GOOGLE_APPLICATION_CREDENTIALS
+                app = firebase_admin.initialize_app()
+        self._app = app
+
+    def _error_code(self, exc):
+        if isinstance(exc, self._messaging.UnregisteredError):
+            return 'UNREGISTERED'
+        if isinstance(exc, self._messaging.SenderIdMismatchError):
+            return 'SENDER_ID_MISMATCH'
+        return getattr(exc, 'code', None) or type(exc).__name__
+
+    def send_batch(self, messages):
+        # Returns one (success, error_code) per message, in order
+        response = self._messaging.send_each([
+            self._messaging.Message(
+                notification=self._messaging.Notification(
+                    title=message['title'],
+                    body=message['body']
+                ),
+                data=message.get('data'),
+                token=message['token']
+            )
+            for message in messages
+        ], app=self._app)
+        return [
+            (result.success, None if result.success else self._error_code(result.exception))
+            for result in response.responses
+        ]
+
+
+class HttpTransport:
+    # POSTs {"messages": [...]} and expects {"results": [{"success", "error"}]}
+    # back in the same order.
+
+    def __init__(self, url, timeout=30, session=None):
+        self.url = url
+        self.timeout = timeout
+        self._session = session or requests.Session()
+
+    def send_batch(self, messages):
+        response = self._session.post(self.url, json={'messages': messages}, timeout=self.timeout)
+        response.raise_for_status()
+        return [(result['success'], result.get('error')) for result in response.json()['results']]
+
+
+def issue_notice(student_id, titles, due_date):
+    # (student_id, title, body, data) for outbox.enqueue_for_students
+    body = f"{', '.join(titles)} due back on {due_date}"
+    return student_id, 'Book issued' if len(titles) == 1 else 'Books issued', body, {'type': 'issued'}
+
+
+def return_notice(student_id, title, fine):
+    body = f"{title} returned" + (f". Fine: ₹{fine}" if fine else '')
+    return student_id, 'Book returned', body, {'type': 'returned'}
+
+
+def overdue_reminders(cur, today):
+    # (student_id, title, body, data) for outbox.enqueue_for_students, one per
+    # student with overdue books and a registered device
+    cur.execute(OVERDUE_REMINDERS, (today,))
+
+    students = {}
+    for row in cur.fetchall():
+        student = students.setdefault(row['student_id'], {
+            'name': row['name'], 'issues': set(), 'titles': [], 'fine': 0
+        })
+        if row['issue_id'] not in student['issues']:
+            student['issues'].add(row['issue_id'])
+            student['titles'].append(row['title'])
+            student['fine'] += calculate_fine(row['due_date'], today)[1]
+
+    notices = []
+    for student_id, student in students.items():
+        titles = student['titles']
+        listed = ', '.join(titles[:MAX_TITLES_IN_BODY])
+        if len(titles) > MAX_TITLES_IN_BODY:
+            listed += f" and {len(titles) - MAX_TITLES_IN_BODY} more"
+        body = f"{len(titles)} book(s) overdue: {listed}. Fine so far: ₹{student['fine']}"
+        notices.append((student_id, REMINDER_TITLE, body,
+                        {'type': 'overdue', 'student_id': str(student_id)}))
+    return notices
+
+
+def prune_tokens(cur, tokens):
+    # Keep the login rows, just forget the token
+    pruned = 0
+    for batch in chunked(sorted(set(tokens)), FCM_BATCH_SIZE):
+        clause, params = id_filter('device_token', batch)
+        cur.execute("UPDATE student_logins SET device_token = NULL WHERE " + clause, params)
+        pruned += cur.rowcount
+    return pruned
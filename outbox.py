@@ -0,0 +1,316 @@
+# Durable push-notification outbox.
+# Request handlers append rows to notification_outbox with the same cursor,
+# and so in the same transaction, as the write they describe. Nothing is sent
+# inside a request: OutboxWorkers claim due rows with FOR UPDATE SKIP LOCKED
+# (MySQL 8.0+), deliver each claim as one transport batch of up to
+# FCM_BATCH_SIZE messages and retry failures with exponential backoff.
+#
+# A claim pushes next_attempt_at forward by the lease, so rows held by a
+# worker that dies become due again once the lease runs out.
+#
+# Sent and failed rows are kept for `retention_days` (for outbox_stats and
+# debugging) and then deleted by purge(), which idle workers run every
+# OUTBOX_PURGE_INTERVAL seconds.
+
+import json
+import logging
+import random
+import threading
+import time
+
+from notifications import DEAD_TOKEN_ERRORS, FCM_BATCH_SIZE, prune_tokens
+from search import id_filter
+
+OUTBOX_BATCH_SIZE = FCM_BATCH_SIZE  # one send_each call per claim
+OUTBOX_LEASE = 60           # seconds a claimed row stays hidden from other workers
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_BACKOFF_BASE = 5     # seconds before the first retry
+OUTBOX_BACKOFF_MAX = 3600   # cap on the retry delay
+OUTBOX_POLL_INTERVAL = 1.0  # idle sleep between claims
+OUTBOX_RETENTION_DAYS = 7   # how long sent and failed rows are kept
+OUTBOX_PURGE_BATCH = 1000
+OUTBOX_PURGE_INTERVAL = 3600
+
+log = logging.getLogger(__name__)
+
+
+def enqueue(cur, token, title, body, data=None, student_id=None):
+    cur.execute("""
+        INSERT INTO notification_outbox (student_id, token, title, body, data, next_attempt_at)
+        VALUES (%s, %s, %s, %s, %s, NOW(3))
+    """, (student_id, token, title, body, json.dumps(data or {})))
+    return cur.lastrowid
+
+
+def enqueue_for_students(cur, notifications):
+    # notifications: iterable of (student_id, title, body, data). One row per
+    # registered device, resolved in SQL so no extra round trip is needed.
+    # Returns the number of rows queued.
+    rows = [(title, body, json.dumps(data or {}), student_id)
+            for student_id, title, body, data in notifications]
+    if not rows:
+        return 0
+    cur.executemany("""
+        INSERT INTO notification_outbox (student_id, token, title, body, data, next_attempt_at)
+        SELECT student_id, device_token, %s, %s, %s, NOW(3)
+        FROM student_logins
+        WHERE student_id = %s AND device_token IS NOT NULL AND device_token <> ''
+    """, rows)
+    return cur.rowcount
+
+
+def backoff_delay(attempts):
+    # Exponential with jitter so a burst of failures does not retry in lockstep
+    delay = min(OUTBOX_BACKOFF_BASE * 2 ** max(attempts - 1, 0), OUTBOX_BACKOFF_MAX)
+    return round(delay * (0.5 + random.random() / 2), 3)
+
+
+def claim(conn, limit=OUTBOX_BATCH_SIZE, lease=OUTBOX_LEASE):
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT id, token, title, body, data, attempts
+            FROM notification_outbox
+            WHERE status = 'pending' AND next_attempt_at <= NOW(3)
+            ORDER BY next_attempt_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (limit,))
+        rows = cur.fetchall()
+        if rows:
+            clause, params = id_filter('id', [row['id'] for row in rows])
+            cur.execute("""
+                UPDATE notification_outbox
+                SET attempts = attempts + 1,
+                    next_attempt_at = NOW(3) + INTERVAL %s SECOND
+                WHERE """ + clause, [lease] + params)
+        conn.commit()
+    finally:
+        cur.close()
+    for row in rows:
+        row['attempts'] += 1
+        row['data'] = json.loads(row['data']) if row['data'] else {}
+    return rows
+
+
+def record_results(conn, rows, results, max_attempts=OUTBOX_MAX_ATTEMPTS):
+    # results: one (success, error_code) per row, as returned by a transport.
+    # Tokens FCM reports as gone are also cleared from student_logins.
+    sent, retries, failed, dead_tokens = [], [], [], []
+    for row, (success, error) in zip(rows, results):
+        if success:
+            sent.append(row['id'])
+        elif error in DEAD_TOKEN_ERRORS:
+            failed.append((str(error)[:255], row['id']))
+            dead_tokens.append(row['token'])
+        elif row['attempts'] >= max_attempts:
+            failed.append((str(error)[:255], row['id']))
+        else:
+            retries.append((backoff_delay(row['attempts']), str(error)[:255], row['id']))
+
+    cur = conn.cursor()
+    try:
+        if sent:
+            clause, params = id_filter('id', sent)
+            cur.execute("""
+                UPDATE notification_outbox
+                SET status = 'sent',
+                    sent_at = NOW(3),
+                    latency_ms = TIMESTAMPDIFF(MICROSECOND, created_at, NOW(3)) DIV 1000,
+                    last_error = NULL
+                WHERE """ + clause, params)
+        if retries:
+            cur.executemany("""
+                UPDATE notification_outbox
+                SET next_attempt_at = NOW(3) + INTERVAL %s SECOND, last_error = %s
+                WHERE id = %s
+            """, retries)
+        if failed:
+            cur.executemany("""
+                UPDATE notification_outbox
+                SET status = 'failed', last_error = %s
+                WHERE id = %s
+            """, failed)
+        if dead_tokens:
+            prune_tokens(cur, dead_tokens)
+        conn.commit()
+    finally:
+        cur.close()
+    return {'sent': len(sent), 'retried': len(retries), 'failed': len(failed)}
+
+
+def deliver(transport, rows):
+    messages = [{
+        'token': row['token'],
+        'title': row['title'],
+        'body': row['body'],
+        'data': {key: str(value) for key, value in row['data'].items()},
+    } for row in rows]
+    try:
+        return transport.send_batch(messages)
+    except Exception as e:
+        return [(False, type(e).__name__)] * len(rows)
+
+
+def purge(conn, retention_days=OUTBOX_RETENTION_DAYS, batch_size=OUTBOX_PURGE_BATCH):
+    # Deletes sent rows by sent_at and failed rows by their last attempt, in
+    # short committed batches so live claims aren't held up behind one long
+    # DELETE. Both go through the status indexes. Returns the rows deleted.
+    deleted = 0
+    cur = conn.cursor()
+    try:
+        for query in ("""
+                DELETE FROM notification_outbox
+                WHERE status = 'sent' AND sent_at < NOW(3) - INTERVAL %s DAY
+                LIMIT %s
+            """, """
+                DELETE FROM notification_outbox
+                WHERE status = 'failed' AND next_attempt_at < NOW(3) - INTERVAL %s DAY
+                LIMIT %s
+            """):
+            while True:
+                cur.execute(query, (retention_days, batch_size))
+                removed = cur.rowcount
+                conn.commit()
+                deleted += removed
+                if removed < batch_size:
+                    break
+    finally:
+        cur.close()
+    return deleted
+
+
+def outbox_stats(cur, window_minutes=60):
+    cur.execute("SELECT status, COUNT(*) as count FROM notification_outbox GROUP BY status")
+    counts = {row['status']: row['count'] for row in cur.fetchall()}
+    cur.execute("""
+        SELECT COUNT(*) as delivered, AVG(latency_ms) as avg_ms, MAX(latency_ms) as max_ms
+        FROM notification_outbox
+        WHERE status = 'sent' AND sent_at >= NOW(3) - INTERVAL %s MINUTE
+    """, (window_minutes,))
+    recent = cur.fetchone()
+    cur.execute("""
+        SELECT MIN(next_attempt_at) as oldest_due
+        FROM notification_outbox
+        WHERE status = 'pending' AND next_attempt_at <= NOW(3)
+    """)
+    oldest_due = cur.fetchone()['oldest_due']
+    return {
+        'pending': counts.get('pending', 0),
+        'sent': counts.get('sent', 0),
+        'failed': counts.get('failed', 0),
+        'oldest_due': oldest_due.isoformat() if oldest_due else None,
+        'recent': {
+            'window_minutes': window_minutes,
+            'delivered': recent['delivered'],
+            'avg_latency_ms': round(float(recent['avg_ms']), 1) if recent['avg_ms'] is not None else None,
+            'max_latency_ms': recent['max_ms'],
+        },
+    }
+
+
+class OutboxWorkers:
+    # Background delivery threads. Each has its own transport and checks a
+    # connection out of the pool only while claiming or recording.
+
+    def __init__(self, pool, transport_factory, workers=4, batch_size=OUTBOX_BATCH_SIZE,
+                 lease=OUTBOX_LEASE, max_attempts=OUTBOX_MAX_ATTEMPTS,
+                 poll_interval=OUTBOX_POLL_INTERVAL, retention_days=OUTBOX_RETENTION_DAYS,
+                 purge_interval=OUTBOX_PURGE_INTERVAL):
+        self.pool = pool
+        self.transport_factory = transport_factory
+        self.workers = workers
+        self.batch_size = batch_size
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self.retention_days = retention_days
+        self.purge_interval = purge_interval
+        self._next_purge = time.monotonic()
+        self._stop = threading.Event()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._totals = {'batches': 0, 'sent': 0, 'retried': 0, 'failed': 0, 'errors': 0, 'purged': 0}
+
+    def start(self):
+        # No-op while already running
+        with self._lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for n in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f'outbox-{n}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def stats(self):
+        with self._lock:
+            return dict(self._totals, workers=sum(thread.is_alive() for thread in self._threads))
+
+    def run_once(self, transport):
+        # Claim, deliver and record one batch; returns the number of rows handled
+        with self.pool.connection() as conn:
+            rows = claim(conn, self.batch_size, self.lease)
+        if not rows:
+            return 0
+        results = deliver(transport, rows)
+        with self.pool.connection() as conn:
+            outcome = record_results(conn, rows, results, self.max_attempts)
+        with self._lock:
+            self._totals['batches'] += 1
+            for key, value in outcome.items():
+                self._totals[key] += value
+        return len(rows)
+
+    def purge_if_due(self):
+        # At most one purge per interval across this process's workers
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_purge:
+                return 0
+            self._next_purge = now + self.purge_interval
+        with self.pool.connection() as conn:
+            deleted = purge(conn, self.retention_days)
+        with self._lock:
+            self._totals['purged'] += deleted
+        return deleted
+
+    def _run(self):
+        # The transport is (re)created inside the loop so a worker whose
+        # transport can't be set up (bad credentials, endpoint down) keeps
+        # retrying with backoff instead of dying
+        transport = None
+        setup_failures = 0
+        while not self._stop.is_set():
+            if transport is None:
+                try:
+                    transport = self.transport_factory()
+                    setup_failures = 0
+                except Exception:
+                    setup_failures += 1
+                    log.exception("Could not set up the outbox transport")
+                    with self._lock:
+                        self._totals['errors'] += 1
+                    self._stop.wait(backoff_delay(setup_failures))
+                    continue
+            try:
+                handled = self.run_once(transport)
+                if not handled:
+                    self.purge_if_due()
+            except Exception:
+                log.exception("Outbox delivery failed")
+                with self._lock:
+                    self._totals['errors'] += 1
+                handled = 0
+            if not handled:
+                self._stop.wait(self.poll_interval)
@@ -0,0 +1,178 @@
+# Student photo storage.
+# Uploads are streamed to disk a chunk at a time, hashed on the way and stored
+# under their sha256, so uploading the same picture again reuses the file.
+# Resized variants (an avatar thumbnail and a compressed web copy) are
+# rendered in a process pool; the request only waits for the disk write.
+#
+# Layout under the photo root:
+#   originals/<aa>/<sha256>.<ext>
+#   variants/<aa>/<sha256>_thumb.jpg
+#   variants/<aa>/<sha256>_web.jpg
+
+import hashlib
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+PHOTO_ROOT = os.path.join('uploads', 'student_photos')
+MAX_PHOTO_BYTES = 10 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 64 * 1024
+
+THUMB_SIZE = (160, 160)   # square avatar, centre-cropped
+WEB_MAX_SIZE = (1024, 1024)
+THUMB_QUALITY = 85
+WEB_QUALITY = 80
+
+# Leading bytes -> stored extension
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
+log = logging.getLogger(__name__)
+
+
+class PhotoTooLarge(Exception):
+    pass
+
+
+class UnsupportedPhoto(Exception):
+    pass
+
+
+def image_extension(head):
+    for signature, extension in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return extension
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def _sharded(root, kind, name):
+    return os.path.join(root, kind, name[:2], name)
+
+
+def variant_paths(digest, root=PHOTO_ROOT):
+    return {
+        'thumb': _sharded(root, 'variants', f"{digest}_thumb.jpg"),
+        'web': _sharded(root, 'variants', f"{digest}_web.jpg"),
+    }
+
+
+def save_upload(stream, root=PHOTO_ROOT, max_bytes=MAX_PHOTO_BYTES, chunk_size=UPLOAD_CHUNK_SIZE):
+    # Returns (sha256, stored path, size, already stored). The file is written
+    # to a temporary name first and only moved into place once complete.
+    tmp_dir = os.path.join(root, 'tmp')
+    os.makedirs(tmp_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+    digest = hashlib.sha256()
+    size = 0
+    head = b''
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(chunk_size)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise PhotoTooLarge(f"Photo is larger than {max_bytes // (1024 * 1024)} MB")
+                if len(head) < 16:
+                    head += chunk[:16 - len(head)]
+                digest.update(chunk)
+                out.write(chunk)
+
+        extension = image_extension(head)
+        if not extension:
+            raise UnsupportedPhoto("Photo must be a JPEG, PNG, GIF or WebP image")
+
+        digest = digest.hexdigest()
+        path = _sharded(root, 'originals', f"{digest}.{extension}")
+        if os.path.exists(path):
+            os.remove(tmp_path)
+            return digest, path, size, True
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(tmp_path, path)
+        return digest, path, size, False
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _save_jpeg(image, path, quality):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    image.save(tmp_path, 'JPEG', quality=quality, optimize=True, progressive=True)
+    os.replace(tmp_path, path)
+
+
+def render_variants(original, digest, root=PHOTO_ROOT):
+    # Runs in a worker process. Variants that already exist (a re-upload of
+    # the same picture) are left alone.
+    from PIL import Image, ImageOps
+
+    paths = variant_paths(digest, root)
+    if all(os.path.exists(path) for path in paths.values()):
+        return paths
+
+    with Image.open(original) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        _save_jpeg(ImageOps.fit(image, THUMB_SIZE, Image.LANCZOS), paths['thumb'], THUMB_QUALITY)
+        web = image.copy()
+        web.thumbnail(WEB_MAX_SIZE, Image.LANCZOS)
+        _save_jpeg(web, paths['web'], WEB_QUALITY)
+    return paths
+
+
+class PhotoProcessor:
+    # Renders variants off the request thread and records them on the student
+    # row when done. A result is only written if the student's photo has not
+    # changed again in the meantime.
+
+    def __init__(self, pool, max_workers=2, root=PHOTO_ROOT):
+        self.pool = pool
+        self.max_workers = max_workers
+        self.root = root
+        self._executor = None
+
+    def _get_executor(self):
+        # Spawned, not forked: by the first upload the web process holds pool
+        # sockets and background threads that a forked child would inherit
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    def submit(self, student_id, original, digest):
+        future = self._get_executor().submit(render_variants, original, digest, self.root)
+        future.add_done_callback(lambda done: self._record(student_id, original, done))
+        return future
+
+    def _record(self, student_id, original, future):
+        try:
+            paths = future.result()
+            with self.pool.connection() as conn:
+                cur = conn.cursor()
+                cur.execute("""
+                    UPDATE students
+                    SET photo_thumb_path = %s, photo_web_path = %s
+                    WHERE student_id = %s AND photo_path = %s
+                """, (paths['thumb'], paths['web'], student_id, original))
+                conn.commit()
+                cur.close()
+        except Exception:
+            log.exception("Could not render photo variants for student %s", student_id)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
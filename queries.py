@@ -0,0 +1,126 @@
+# SQL for the api.py routes that query_plans.py checks.
+# The routes and the plan check both build their statements from these, so
+# the check EXPLAINs exactly what the routes run. Hot queries that belong to
+# other modules live there (notifications.OVERDUE_REMINDERS,
+# fines.ACCRUE_ISSUE_FINES, student_snapshots.STUDENT_SNAPSHOT, the search
+# matches in search.py).
+
+from search import id_filter
+
+BOOKS_BY_CLASS = "SELECT * FROM books WHERE class = %s"
+
+BOOKS_BY_CLASS_SEMESTER = """
+    SELECT
+        book_id, title, author, subject,
+        quantity, semester, class, cover_path
+    FROM books
+    WHERE class = %s AND semester = %s
+    ORDER BY subject
+"""
+
+# /books?limit=&after=: one keyset page on the primary key
+CATALOG_PAGE = """
+    SELECT book_id as id, title, author, subject, class,
+           quantity, semester
+    FROM books
+    WHERE book_id > %s
+    ORDER BY book_id
+    LIMIT %s
+"""
+
+CATALOG = """
+    SELECT book_id as id, title, author, subject, class,
+           quantity, semester
+    FROM books
+"""
+
+STUDENTS = """
+    SELECT
+        student_id, name, father_name, mobile_number,
+        guardian_mobile_number, class, admission_year,
+        roll_no, college_rollno, current_semester
+    FROM students
+"""
+
+STUDENT_BY_MOBILE = """
+    SELECT student_id, name, class
+    FROM students
+    WHERE mobile_number = %s
+"""
+
+STUDENT_BY_EMAIL = "SELECT student_id FROM students WHERE email = %s AND password = %s"
+
+STUDENT_CLASHES = "SELECT mobile_number, college_rollno FROM students WHERE "
+
+OVERDUE_BOOKS = """
+    SELECT
+        bi.issue_id, bi.due_date,
+        b.title as book_title, b.author as book_author,
+        s.name as student_name, s.roll_no, s.mobile_number
+    FROM book_issues bi
+    JOIN books b ON bi.book_id = b.book_id
+    JOIN students s ON bi.student_id = s.student_id
+    WHERE bi.status = 'Issued' AND bi.due_date < %s
+    ORDER BY bi.due_date
+"""
+
+# /transactions: TRANSACTIONS_PAGE + transactions_where() + one of the
+# paging tails, newest first on (issue_date, issue_id)
+TRANSACTIONS_PAGE = """
+    SELECT
+        bi.issue_id, bi.issue_date, bi.due_date, bi.return_date, bi.status,
+        b.title as book_title, b.author as book_author,
+        s.name as student_name, s.roll_no as student_roll
+    FROM book_issues bi
+    JOIN books b ON bi.book_id = b.book_id
+    JOIN students s ON bi.student_id = s.student_id
+"""
+
+TRANSACTIONS_AFTER = """
+    AND (bi.issue_date < %s OR (bi.issue_date = %s AND bi.issue_id < %s))
+    ORDER BY bi.issue_date DESC, bi.issue_id DESC LIMIT %s
+"""
+
+TRANSACTIONS_BEFORE = """
+    AND (bi.issue_date > %s OR (bi.issue_date = %s AND bi.issue_id > %s))
+    ORDER BY bi.issue_date ASC, bi.issue_id ASC LIMIT %s
+"""
+
+TRANSACTIONS_OFFSET = " ORDER BY bi.issue_date DESC, bi.issue_id DESC LIMIT %s OFFSET %s"
+
+
+def student_filters(class_name=None, semester=None):
+    # WHERE clause (or '') and params for the /students class/semester
+    # filters; semester only counts together with class, which keeps it a
+    # seek on idx_students_class_semester; the routes return 400 for semester
+    # without class
+    conditions, params = [], []
+    if class_name:
+        conditions.append("class = %s")
+        params.append(class_name)
+        if semester:
+            conditions.append("current_semester = %s")
+            params.append(semester)
+    if not conditions:
+        return "", params
+    return " WHERE " + " AND ".join(conditions), params
+
+
+def student_clashes(mobiles, rollnos):
+    # Existing students sharing a mobile number or college roll number with
+    # an import chunk; one lookup per chunk on the two indexes
+    query, params = id_filter('mobile_number', mobiles)
+    if rollnos:
+        rollno_clause, rollno_params = id_filter('college_rollno', rollnos)
+        query += " OR " + rollno_clause
+        params += rollno_params
+    return STUDENT_CLASHES + query, params
+
+
+def transactions_where(filters=()):
+    # filters: (clause, params) pairs from search.match_filter; a row matching
+    # any of them is kept
+    if not filters:
+        return "WHERE 1=1", []
+    params = [param for _, clause_params in filters for param in clause_params]
+    return "WHERE 1=1 AND (" + " OR ".join(clause for clause, _ in filters) + ")", params
@@ -0,0 +1,125 @@
+# EXPLAIN checks for the hot queries.
+# Each entry is a query a route or job runs, with representative parameters.
+# `flask --app api check-query-plans` EXPLAINs them all and fails if any of
+# them reads a table with a full scan (access type ALL), which is how a
+# dropped index or a rewritten WHERE clause shows up.
+#
+# The SQL is never copied here: entries are built from the same constants
+# and helpers the routes use (queries.py and the modules that own the other
+# queries), and the lookups inside issue_book_atomic are read out of the
+# procedure text the latest migration installs.
+#
+# The optimizer may scan a tiny table even when an index exists, so scans of
+# tables estimated below `min_rows` are reported but don't fail the check.
+# Unfiltered list reads (/books, /students without filters) scan by design
+# and aren't listed.
+
+import re
+
+from fines import (
+    ACCRUE_ISSUE_FINES, FINE_PER_DAY, OPEN_FINES_BY_STUDENT, STUDENT_LEDGER, STUDENT_OVERDUE_ISSUES
+)
+from migrations import MIGRATIONS
+from notifications import OVERDUE_REMINDERS
+from queries import (
+    BOOKS_BY_CLASS, BOOKS_BY_CLASS_SEMESTER, CATALOG_PAGE, OVERDUE_BOOKS, STUDENT_BY_EMAIL,
+    STUDENT_BY_MOBILE, STUDENTS, TRANSACTIONS_AFTER, TRANSACTIONS_PAGE, student_clashes,
+    student_filters, transactions_where
+)
+from search import MAX_MATCHED_IDS, book_match, id_filter, limited, student_match, subquery_filter
+from student_snapshots import STUDENT_SNAPSHOT
+
+PLAN_MIN_ROWS = 1000
+SAMPLE_DATE = '2025-01-15'
+SAMPLE_TERM = 'data structures'
+SAMPLE_IDS = [1, 2, 3]
+# Values for the p_* parameters of the stored procedures
+PROCEDURE_SAMPLES = {'p_student_id': 1, 'p_book_id': 1}
+
+_PROCEDURE_SELECT = re.compile(r"\bSELECT\b[^;]*?\bFROM\s+(\w+)[^;]*;")
+_INTO = re.compile(r"\s+INTO\s+[\w\s,]+?(?=\s+FROM\b)")
+_FOR_UPDATE = re.compile(r"\s+FOR\s+UPDATE\s*$")
+_PROCEDURE_PARAM = re.compile(r"\bp_\w+\b")
+
+
+def installed_procedure(name):
+    # CREATE PROCEDURE text from the last migration that (re)creates `name`
+    text = None
+    for _, statements in MIGRATIONS:
+        for statement in statements:
+            if f"CREATE PROCEDURE {name}(" in statement:
+                text = statement
+    return text
+
+
+def procedure_queries(name, samples=PROCEDURE_SAMPLES):
+    # The table reads inside a procedure, as plain SELECTs with the p_*
+    # parameters turned into placeholders
+    queries = []
+    for match in _PROCEDURE_SELECT.finditer(installed_procedure(name)):
+        query = _FOR_UPDATE.sub('', _INTO.sub('', match.group(0).rstrip(';')))
+        params = [samples[param] for param in _PROCEDURE_PARAM.findall(query)]
+        queries.append((f"{name} ({match.group(1)})", _PROCEDURE_PARAM.sub('%s', query), params))
+    return queries
+
+
+def _search_queries():
+    # /transactions?search=: the two match lookups, then the page filtered by
+    # the resolved ids or, for terms matching too many, by the subqueries
+    books, students = book_match(SAMPLE_TERM), student_match(SAMPLE_TERM)
+    by_ids = transactions_where([id_filter('bi.book_id', SAMPLE_IDS), id_filter('bi.student_id', SAMPLE_IDS)])
+    by_subquery = transactions_where([subquery_filter('bi.book_id', books),
+                                      subquery_filter('bi.student_id', students)])
+    return [
+        ('/transactions?search (books)',) + limited(books, MAX_MATCHED_IDS + 1),
+        ('/transactions?search (students)',) + limited(students, MAX_MATCHED_IDS + 1),
+        ('/transactions?search (ids)', TRANSACTIONS_PAGE + by_ids[0] + TRANSACTIONS_AFTER,
+         by_ids[1] + [SAMPLE_DATE, SAMPLE_DATE, 1000000, 11]),
+        ('/transactions?search (broad term)', TRANSACTIONS_PAGE + by_subquery[0] + TRANSACTIONS_AFTER,
+         by_subquery[1] + [SAMPLE_DATE, SAMPLE_DATE, 1000000, 11]),
+    ]
+
+
+_class_semester, _class_semester_params = student_filters('BCA', 1)
+
+HOT_QUERIES = [
+    ('/overdue-books', OVERDUE_BOOKS, [SAMPLE_DATE]),
+    ('send-overdue-reminders', OVERDUE_REMINDERS, [SAMPLE_DATE]),
+    ('accrue-fines (issues)', ACCRUE_ISSUE_FINES, [SAMPLE_DATE, FINE_PER_DAY, SAMPLE_DATE]),
+    ('accrue-fines (ledger totals)', OPEN_FINES_BY_STUDENT, [SAMPLE_DATE]),
+    ('/student/<id>/stats', STUDENT_LEDGER, [1]),
+    ('/student/<id>/stats (overdue issues)', STUDENT_OVERDUE_ISSUES, [1, SAMPLE_DATE]),
+    ('/student/<id>/issued-books-student', STUDENT_SNAPSHOT, [1]),
+    ('/transactions', TRANSACTIONS_PAGE + transactions_where()[0] + TRANSACTIONS_AFTER,
+     [SAMPLE_DATE, SAMPLE_DATE, 1000000, 11]),
+    *_search_queries(),
+    ('/books?after', CATALOG_PAGE, [500, 51]),
+    ('/books/<class>', BOOKS_BY_CLASS, ['BCA']),
+    ('/books/<class>/<semester>', BOOKS_BY_CLASS_SEMESTER, ['BCA', 1]),
+    ('/students?class&semester', STUDENTS + _class_semester, _class_semester_params),
+    ('/student-login', STUDENT_BY_MOBILE, ['9000000000']),
+    ('/login', STUDENT_BY_EMAIL, ['student@college.com', 'secret']),
+    ('/students/import (duplicate check)',
+     *student_clashes(['9000000000', '9000000001'], ['CR-000001', 'CR-000002'])),
+    *procedure_queries('issue_book_atomic'),
+]
+
+
+def explain(cur, query, params):
+    cur.execute("EXPLAIN " + query, params)
+    return cur.fetchall()
+
+
+def check_query_plans(cur, queries=HOT_QUERIES, min_rows=PLAN_MIN_ROWS):
+    # Returns (findings, failed): one finding per full table scan, as
+    # (query name, table, estimated rows, fails)
+    findings = []
+    for name, query, params in queries:
+        for row in explain(cur, query, params):
+            table = row['table'] or ''
+            # Derived tables and temporary results are scanned by nature
+            if row['type'] != 'ALL' or table.startswith('<'):
+                continue
+            rows = row['rows'] or 0
+            findings.append((name, table, rows, rows >= min_rows))
+    return findings, any(fails for _, _, _, fails in findings)
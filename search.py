@@ -0,0 +1,94 @@
+# Indexed lookups behind the search boxes.
+# Terms are resolved to book/student ids through the FULLTEXT indexes created
+# in migration 0002, so callers can hit book_issues by id instead of running
+# LIKE '%term%' across a join.
+#
+# match_filter() passes up to MAX_MATCHED_IDS resolved ids as an IN list,
+# which keeps the outer query on its index. A term that matches more than that
+# is filtered through the match subquery itself instead, so no match is
+# dropped.
+
+import re
+
+MAX_MATCHED_IDS = 1000
+# innodb_ft_min_token_size; shorter words are not in the index
+MIN_WORD_LENGTH = 3
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+
+def fulltext_terms(term):
+    # "harry pot" -> "+harry* +pot*": every word must match as a prefix.
+    # Boolean-mode operators in user input are dropped rather than escaped,
+    # and words too short to be indexed are skipped.
+    words = [word for word in _WORD.findall(term) if len(word) >= MIN_WORD_LENGTH]
+    return ' '.join(f"+{word}*" for word in words)
+
+
+def like_prefix(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return escaped + '%'
+
+
+def book_match(term):
+    # (subquery, params) selecting the ids of matching books, or None when the
+    # term has no indexable word
+    terms = fulltext_terms(term)
+    if not terms:
+        return None
+    return """
+        SELECT book_id FROM books
+        WHERE MATCH(title, author) AGAINST (%s IN BOOLEAN MODE)
+    """, [terms]
+
+
+def student_match(term):
+    # Roll numbers are mostly short tokens the FULLTEXT parser skips, so they
+    # also get an indexed prefix match.
+    terms = fulltext_terms(term)
+    if terms:
+        return """
+            SELECT student_id FROM students
+            WHERE MATCH(name, roll_no) AGAINST (%s IN BOOLEAN MODE)
+            UNION
+            SELECT student_id FROM students
+            WHERE roll_no LIKE %s
+        """, [terms, like_prefix(term.strip())]
+    return """
+        SELECT student_id FROM students
+        WHERE roll_no LIKE %s
+    """, [like_prefix(term.strip())]
+
+
+def limited(match, limit):
+    query, params = match
+    return query + " LIMIT %s", params + [limit]
+
+
+def find_ids(cur, match, limit=MAX_MATCHED_IDS):
+    if match is None:
+        return []
+    cur.execute(*limited(match, limit))
+    return [next(iter(row.values())) for row in cur.fetchall()]
+
+
+def subquery_filter(column, match):
+    query, params = match
+    return f"{column} IN ({query})", list(params)
+
+
+def match_filter(cur, column, match, limit=MAX_MATCHED_IDS):
+    # (clause, params) restricting column to the ids `match` selects, or None
+    # when nothing matches
+    ids = find_ids(cur, match, limit + 1)
+    if not ids:
+        return None
+    if len(ids) > limit:
+        return subquery_filter(column, match)
+    return id_filter(column, ids)
+
+
+def id_filter(column, ids):
+    # "column IN (%s, %s, ...)" plus its parameters
+    placeholders = ', '.join(['%s'] * len(ids))
+    return f"{column} IN ({placeholders})", list(ids)
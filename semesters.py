@@ -0,0 +1,107 @@
+# Student semesters.
+# A student's semester follows from their admission year and the current
+# term. calculate_semester is the one place that rule lives; its result is
+# also stored in students.current_semester (indexed with class, migration
+# 0010) so class/semester lookups are index seeks rather than a computed
+# expression over every student.
+#
+# The stored value changes only when the term does: new students get it on
+# insert, and SemesterRollover rewrites the column once per term and fills in
+# rows that were inserted without it.
+
+import logging
+import threading
+
+log = logging.getLogger(__name__)
+
+
+def current_term(on_date):
+    # Two semesters a year: January-June is the first, July-December the second
+    return 1 if on_date.month <= 6 else 2
+
+
+def calculate_semester(admission_year, on_date):
+    return (on_date.year - admission_year) * 2 + current_term(on_date)
+
+
+def term_of(on_date):
+    return on_date.year, current_term(on_date)
+
+
+def rolled_over_term(cur):
+    cur.execute("SELECT year, term FROM semester_rollover WHERE id = 1")
+    row = cur.fetchone()
+    return (row['year'], row['term']) if row else None
+
+
+def set_semesters(cur, on_date, only_missing=False):
+    # calculate_semester once per admission year, sent as a CASE so the rule
+    # isn't restated in SQL; returns the rows changed
+    missing = " WHERE current_semester IS NULL" if only_missing else ""
+    cur.execute("SELECT DISTINCT admission_year FROM students" + missing)
+    years = [row['admission_year'] for row in cur.fetchall() if row['admission_year'] is not None]
+    if not years:
+        return 0
+    cases, params = [], []
+    for admission_year in years:
+        cases.append("WHEN %s THEN %s")
+        params += [admission_year, calculate_semester(admission_year, on_date)]
+    placeholders = ', '.join(['%s'] * len(years))
+    cur.execute(
+        "UPDATE students SET current_semester = CASE admission_year " + ' '.join(cases) + " END"
+        " WHERE admission_year IN (" + placeholders + ")"
+        + (" AND current_semester IS NULL" if only_missing else ""),
+        params + years
+    )
+    return cur.rowcount
+
+
+def fill_missing_semesters(cur, on_date):
+    # Students inserted without current_semester (e.g. outside the API)
+    return set_semesters(cur, on_date, only_missing=True)
+
+
+def roll_over(cur, on_date):
+    # calculate_semester for every student
+    year, term = term_of(on_date)
+    updated = set_semesters(cur, on_date)
+    cur.execute("""
+        INSERT INTO semester_rollover (id, year, term) VALUES (1, %s, %s)
+        ON DUPLICATE KEY UPDATE year = VALUES(year), term = VALUES(term)
+    """, (year, term))
+    return updated
+
+
+class SemesterRollover:
+    # Makes sure students.current_semester matches the current term. Each
+    # process checks the database once per term; rolling over is idempotent,
+    # so processes racing at the term boundary do no harm.
+
+    def __init__(self, pool):
+        self.pool = pool
+        self._term = None
+        self._lock = threading.Lock()
+
+    def ensure_current(self, on_date):
+        term = term_of(on_date)
+        if self._term == term:
+            return False
+        with self._lock:
+            if self._term == term:
+                return False
+            rolled = False
+            with self.pool.connection() as conn:
+                cur = conn.cursor()
+                if rolled_over_term(cur) != term:
+                    updated = roll_over(cur, on_date)
+                    conn.commit()
+                    log.info("Rolled students over to %s term %s (%s rows)", term[0], term[1], updated)
+                    rolled = True
+                else:
+                    filled = fill_missing_semesters(cur, on_date)
+                    conn.commit()
+                    if filled:
+                        log.info("Filled in current_semester for %s student(s)", filled)
+                cur.close()
+            self._term = term
+            return rolled
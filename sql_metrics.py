@@ -0,0 +1,210 @@
+# SQL instrumentation behind /metrics.
+# Request cursors are wrapped in InstrumentedCursor, which times every
+# statement and records, per route and per statement fingerprint (the SQL
+# with literals and placeholders folded to `?`), the query count, a latency
+# histogram, rows returned or affected, and errors. Statements slower than
+# `slow_threshold` are logged and kept in a short in-memory slow-query log;
+# only fingerprints are recorded, never parameter values.
+#
+# render() writes the Prometheus text exposition format. Metrics are per
+# process, like the other in-memory stats; under several workers each one
+# reports its own. With SQL_METRICS off no cursor is wrapped, so the only
+# cost is one check in db_cursor().
+
+import logging
+import re
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from functools import lru_cache
+
+from flask import has_request_context, request
+
+SLOW_QUERY_SECONDS = 0.2
+SLOW_QUERY_LOG_SIZE = 100
+MAX_SERIES = 1000  # (route, statement) pairs; further statements count as "other"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+MAX_FINGERPRINT = 300
+
+_COMMENT = re.compile(r'--[^\n]*|/\*.*?\*/', re.DOTALL)
+_STRING = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.)*\"")
+_PLACEHOLDER = re.compile(r'%s|%\(\w+\)s')
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_LIST = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_SPACE = re.compile(r'\s+')
+
+log = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(query):
+    # "SELECT * FROM books WHERE class = %s AND id IN (%s, %s)"
+    #   -> "SELECT * FROM books WHERE class = ? AND id IN (?+)"
+    text = _COMMENT.sub(' ', query)
+    text = _STRING.sub('?', text)
+    text = _PLACEHOLDER.sub('?', text)
+    text = _NUMBER.sub('?', text)
+    text = _LIST.sub('(?+)', text)
+    text = _SPACE.sub(' ', text).strip()
+    return text[:MAX_FINGERPRINT]
+
+
+def current_route():
+    if has_request_context():
+        return request.url_rule.rule if request.url_rule else '<unmatched>'
+    return '<cli>'
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class SqlMetrics:
+    def __init__(self, slow_threshold=SLOW_QUERY_SECONDS, slow_log_size=SLOW_QUERY_LOG_SIZE,
+                 buckets=LATENCY_BUCKETS, max_series=MAX_SERIES):
+        self.slow_threshold = slow_threshold
+        self.buckets = buckets
+        self.max_series = max_series
+        self._series = {}     # (route, statement) -> [count, errors, rows, seconds, bucket counts]
+        self._responses = {}  # (route, status) -> count
+        self._slow = deque(maxlen=slow_log_size)
+        self._lock = threading.Lock()
+
+    def observe(self, route, query, seconds, rows, error=False):
+        statement = fingerprint(query)
+        key = (route, statement)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                if len(self._series) >= self.max_series:
+                    key = (route, 'other')
+                    series = self._series.get(key)
+                if series is None:
+                    series = self._series[key] = [0, 0, 0, 0.0, [0] * len(self.buckets)]
+            series[0] += 1
+            series[1] += error
+            series[2] += rows
+            series[3] += seconds
+            for position, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    series[4][position] += 1
+                    break
+            if seconds >= self.slow_threshold:
+                self._slow.append({
+                    'at': datetime.now().isoformat(timespec='seconds'),
+                    'route': route,
+                    'statement': statement,
+                    'ms': round(seconds * 1000, 1),
+                    'rows': rows,
+                    'error': bool(error),
+                })
+        if seconds >= self.slow_threshold:
+            log.warning("Slow query (%.0f ms) on %s: %s", seconds * 1000, route, statement)
+
+    def observe_response(self, route, status):
+        key = (route, status)
+        with self._lock:
+            self._responses[key] = self._responses.get(key, 0) + 1
+
+    def slow_queries(self):
+        with self._lock:
+            return list(self._slow)
+
+    def route_totals(self):
+        # {route: {requests, queries, errors, seconds}}, summed over statements
+        with self._lock:
+            totals = {}
+            for (route, _), (count, errors, _, seconds, _) in self._series.items():
+                route_total = totals.setdefault(route, {'requests': 0, 'queries': 0, 'errors': 0, 'seconds': 0.0})
+                route_total['queries'] += count
+                route_total['errors'] += errors
+                route_total['seconds'] += seconds
+            for (route, _), count in self._responses.items():
+                totals.setdefault(route, {'requests': 0, 'queries': 0, 'errors': 0, 'seconds': 0.0})
+                totals[route]['requests'] += count
+            return totals
+
+    def cursor(self, cursor, route):
+        return InstrumentedCursor(cursor, self, route)
+
+    def render(self):
+        with self._lock:
+            series = {key: (count, errors, rows, seconds, list(buckets))
+                      for key, (count, errors, rows, seconds, buckets) in self._series.items()}
+            responses = dict(self._responses)
+
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        def labels(route, statement, **extra):
+            pairs = [('route', route), ('statement', statement)] + list(extra.items())
+            return '{' + ','.join(f'{name}="{_label(value)}"' for name, value in pairs) + '}'
+
+        family('library_sql_queries_total', 'counter', 'SQL statements executed')
+        for (route, statement), (count, _, _, _, _) in series.items():
+            lines.append(f"library_sql_queries_total{labels(route, statement)} {count}")
+
+        family('library_sql_errors_total', 'counter', 'SQL statements that raised')
+        for (route, statement), (_, errors, _, _, _) in series.items():
+            lines.append(f"library_sql_errors_total{labels(route, statement)} {errors}")
+
+        family('library_sql_rows_total', 'counter', 'Rows returned or affected, as reported by the driver')
+        for (route, statement), (_, _, rows, _, _) in series.items():
+            lines.append(f"library_sql_rows_total{labels(route, statement)} {rows}")
+
+        family('library_sql_query_duration_seconds', 'histogram', 'SQL statement latency')
+        for (route, statement), (count, _, _, seconds, buckets) in series.items():
+            cumulative = 0
+            for bound, hits in zip(self.buckets, buckets):
+                cumulative += hits
+                lines.append(f"library_sql_query_duration_seconds_bucket"
+                             f"{labels(route, statement, le=bound)} {cumulative}")
+            lines.append(f"library_sql_query_duration_seconds_bucket"
+                         f"{labels(route, statement, le='+Inf')} {count}")
+            lines.append(f"library_sql_query_duration_seconds_sum{labels(route, statement)} {seconds:.6f}")
+            lines.append(f"library_sql_query_duration_seconds_count{labels(route, statement)} {count}")
+
+        family('library_http_responses_total', 'counter', 'Responses by route and status code')
+        for (route, status), count in responses.items():
+            lines.append(f'library_http_responses_total{{route="{_label(route)}",status="{status}"}} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class InstrumentedCursor:
+    # Times execute/executemany/callproc; everything else goes straight to
+    # the wrapped cursor
+    def __init__(self, cursor, metrics, route):
+        self._cursor = cursor
+        self._metrics = metrics
+        self._route = route
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, statement, call, *args):
+        started = time.perf_counter()
+        try:
+            result = call(*args)
+        except Exception:
+            self._metrics.observe(self._route, statement, time.perf_counter() - started, 0, error=True)
+            raise
+        self._metrics.observe(self._route, statement, time.perf_counter() - started,
+                              max(self._cursor.rowcount or 0, 0))
+        return result
+
+    def execute(self, query, args=None):
+        return self._timed(query, self._cursor.execute, query, args)
+
+    def executemany(self, query, args):
+        return self._timed(query, self._cursor.executemany, query, args)
+
+    def callproc(self, procname, args=()):
+        return self._timed(f"CALL {procname}", self._cursor.callproc, procname, args)
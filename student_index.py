@@ -0,0 +1,210 @@
+# In-process index behind /students/search typeahead.
+# Name words and roll numbers are kept in a sorted array, so a prefix lookup
+# is a bisect plus a short scan. Active-issue counts are kept next to it and
+# adjusted by the issue/return paths after they commit, so a search never
+# touches MySQL.
+#
+# Each process has its own copy. It is loaded on first use and reloaded in
+# the background every `refresh_interval` seconds to pick up writes made by
+# other processes (or anything that bypassed add()/adjust_issued()).
+
+import bisect
+import heapq
+import logging
+import re
+import threading
+import time
+
+STUDENT_INDEX_REFRESH = 300  # seconds
+SEARCH_LIMIT = 20
+# With more prefix hits than this ("a", "cs-"), walking students in name
+# order and stopping at the limit beats collecting every hit
+DENSE_MATCH = 500
+
+_WORD = re.compile(r'\w+', re.UNICODE)
+
+log = logging.getLogger(__name__)
+
+
+def index_keys(name, roll_no):
+    keys = {word.lower() for word in _WORD.findall(name or '')}
+    if roll_no:
+        roll_no = str(roll_no).lower()
+        keys.add(roll_no)
+        keys.update(_WORD.findall(roll_no))
+    return keys
+
+
+class StudentIndex:
+    def __init__(self, pool, semester_of, refresh_interval=STUDENT_INDEX_REFRESH):
+        self.pool = pool
+        self.semester_of = semester_of
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._students = {}      # student_id -> row
+        self._student_keys = {}  # student_id -> its prefix keys
+        self._keys = []          # sorted prefix keys...
+        self._key_ids = []       # ...and the student each belongs to
+        self._by_name = []       # sorted (lower name, student_id)
+        self._issued = {}      # student_id -> active issues
+        self._loaded_at = None
+        self._refreshing = False
+
+    def load(self):
+        with self.pool.connection() as conn:
+            cur = conn.cursor()
+            cur.execute("SELECT student_id, name, roll_no, class, admission_year FROM students")
+            students = {row['student_id']: row for row in cur.fetchall()}
+            cur.execute("""
+                SELECT student_id, COUNT(*) as issued
+                FROM book_issues
+                WHERE status = 'Issued'
+                GROUP BY student_id
+            """)
+            issued = {row['student_id']: row['issued'] for row in cur.fetchall()}
+            cur.close()
+
+        student_keys = {
+            student_id: tuple(index_keys(row['name'], row['roll_no']))
+            for student_id, row in students.items()
+        }
+        entries = sorted((key, student_id) for student_id, keys in student_keys.items() for key in keys)
+        by_name = sorted(((row['name'] or '').lower(), student_id) for student_id, row in students.items())
+        with self._lock:
+            self._students, self._student_keys, self._by_name, self._issued = (
+                students, student_keys, by_name, issued
+            )
+            self._keys = [key for key, _ in entries]
+            self._key_ids = [student_id for _, student_id in entries]
+            self._loaded_at = time.monotonic()
+        return len(students)
+
+    def add(self, student):
+        # student: student_id, name, roll_no, class, admission_year
+        row = {field: student[field] for field in ('student_id', 'name', 'roll_no', 'class', 'admission_year')}
+        with self._lock:
+            if self._loaded_at is None or row['student_id'] in self._students:
+                return
+            keys = tuple(index_keys(row['name'], row['roll_no']))
+            self._students[row['student_id']] = row
+            self._student_keys[row['student_id']] = keys
+            for key in keys:
+                position = bisect.bisect_right(self._keys, key)
+                self._keys.insert(position, key)
+                self._key_ids.insert(position, row['student_id'])
+            bisect.insort(self._by_name, ((row['name'] or '').lower(), row['student_id']))
+
+    def adjust_issued(self, counts):
+        # counts: {student_id: delta}
+        with self._lock:
+            if self._loaded_at is None:
+                return
+            for student_id, delta in counts.items():
+                self._issued[student_id] = max(0, self._issued.get(student_id, 0) + delta)
+
+    def refresh(self):
+        # Reload now, unless nothing has searched yet (the first search loads)
+        if self._loaded_at is not None:
+            self.load()
+
+    def _ensure_fresh(self):
+        if self._loaded_at is None:
+            with self._lock:
+                if self._loaded_at is None:
+                    self.load()
+            return
+        if time.monotonic() - self._loaded_at < self.refresh_interval:
+            return
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+        threading.Thread(target=self._refresh, name='student-index-refresh', daemon=True).start()
+
+    def _refresh(self):
+        try:
+            self.load()
+        except Exception:
+            log.exception("Could not refresh the student search index")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _prefix_range(self, prefix):
+        return (bisect.bisect_left(self._keys, prefix),
+                bisect.bisect_left(self._keys, prefix + '\U0010ffff'))
+
+    def _matches(self, student_id, words, whole):
+        # A term with no word characters ("-", "/") can only match as a
+        # roll number prefix
+        keys = self._student_keys[student_id]
+        if words and all(any(key.startswith(word) for key in keys) for word in words):
+            return True
+        return any(key.startswith(whole) for key in keys)
+
+    def _semester_if_listed(self, row, on_date, class_filter, semester_filter):
+        # The student's current semester, or None if the filters exclude them
+        if class_filter and row['class'] != class_filter:
+            return None
+        semester = self.semester_of(row['admission_year'], on_date)
+        if semester_filter is not None and semester != semester_filter:
+            return None
+        return semester
+
+    def _result(self, student_id, semester):
+        return dict(self._students[student_id], current_semester=semester,
+                    issued_count=self._issued.get(student_id, 0))
+
+    def search(self, term, on_date, class_filter=None, semester_filter=None, limit=SEARCH_LIMIT):
+        # Every word of `term` must prefix a name word or roll number part,
+        # or the whole term must prefix a roll number ("CS-21/0").
+        # Results are ordered by name, like the SQL this replaces.
+        self._ensure_fresh()
+        words = [word.lower() for word in _WORD.findall(term or '')]
+        whole = (term or '').strip().lower()
+        with self._lock:
+            # Start from the most selective word; the others are checked
+            # against each candidate's own keys
+            hits = None
+            if whole:
+                start, end = min((self._prefix_range(word) for word in words),
+                                 key=lambda span: span[1] - span[0], default=(0, 0))
+                if whole not in words:
+                    whole_start, whole_end = self._prefix_range(whole)
+                else:
+                    whole_start = whole_end = 0
+                if end - start + whole_end - whole_start <= DENSE_MATCH:
+                    hits = set(self._key_ids[start:end])
+                    hits.update(self._key_ids[whole_start:whole_end])
+
+            if hits is None:
+                results = []
+                for _, student_id in self._by_name:
+                    if whole and not self._matches(student_id, words, whole):
+                        continue
+                    semester = self._semester_if_listed(
+                        self._students[student_id], on_date, class_filter, semester_filter)
+                    if semester is not None:
+                        results.append(self._result(student_id, semester))
+                        if len(results) >= limit:
+                            break
+                return results
+
+            listed = []
+            for student_id in hits:
+                if not self._matches(student_id, words, whole):
+                    continue
+                row = self._students[student_id]
+                semester = self._semester_if_listed(row, on_date, class_filter, semester_filter)
+                if semester is not None:
+                    listed.append(((row['name'] or '').lower(), student_id, semester))
+            return [self._result(student_id, semester)
+                    for _, student_id, semester in heapq.nsmallest(limit, listed)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'students': len(self._students),
+                'keys': len(self._keys),
+                'age_seconds': round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None,
+            }
@@ -0,0 +1,103 @@
+# Per-student snapshot shared by the student app endpoints
+# (/student/<id>/issued-books-student and /students/<id>/issued-books). One
+# query loads the student and every issue with its book; overdue flags are
+# worked out once per day. /student/<id>/stats doesn't need the issue list and
+# reads its totals from student_fine_ledger instead (see fines.py).
+#
+# A snapshot is rebuilt when that student issues or returns a book (the write
+# paths call invalidate() after committing), when the day changes, or after
+# `ttl` seconds to bound staleness from writes made by other processes.
+
+import threading
+import time
+from collections import OrderedDict
+
+STUDENT_SNAPSHOT_MAX = 10000   # students kept, least recently used dropped first
+STUDENT_SNAPSHOT_TTL = 300     # seconds
+
+STUDENT_SNAPSHOT = """
+    SELECT
+        s.name as student_name,
+        bi.issue_id,
+        b.book_id,
+        b.title as book_title,
+        b.author as book_author,
+        b.class as book_class,
+        b.subject as book_subject,
+        b.cover_path,
+        DATE(bi.issue_date) as issue_date,
+        DATE(bi.due_date) as due_date,
+        bi.status
+    FROM students s
+    LEFT JOIN book_issues bi ON bi.student_id = s.student_id
+    LEFT JOIN books b ON bi.book_id = b.book_id
+    WHERE s.student_id = %s
+    ORDER BY bi.issue_date DESC
+"""
+
+
+def load_snapshot(cur, student_id, today):
+    cur.execute(STUDENT_SNAPSHOT, (student_id,))
+    rows = cur.fetchall()
+    if not rows:
+        return None
+
+    issues = []
+    for row in rows:
+        if row['issue_id'] is None:
+            continue
+        row['overdue'] = row['status'] == 'Issued' and row['due_date'] < today
+        issues.append(row)
+
+    return {
+        'student_name': rows[0]['student_name'],
+        'issues': issues,
+        'currently_issued': sum(1 for issue in issues if issue['status'] == 'Issued'),
+        'overdue_books': sum(1 for issue in issues if issue['overdue']),
+    }
+
+
+class StudentSnapshots:
+    def __init__(self, max_students=STUDENT_SNAPSHOT_MAX, ttl=STUDENT_SNAPSHOT_TTL):
+        self.max_students = max_students
+        self.ttl = ttl
+        self._entries = OrderedDict()  # student_id -> (snapshot, version, day, expires_at)
+        self._versions = {}            # student_id -> bumped on every write
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+    def get(self, student_id, today, load):
+        # load() builds the snapshot (None if the student doesn't exist)
+        with self._lock:
+            version = self._versions.get(student_id, 0)
+            entry = self._entries.get(student_id)
+            if entry is not None:
+                snapshot, entry_version, day, expires_at = entry
+                if entry_version == version and day == today and expires_at > time.monotonic():
+                    self._entries.move_to_end(student_id)
+                    self._stats['hits'] += 1
+                    return snapshot
+                del self._entries[student_id]
+            self._stats['misses'] += 1
+
+        snapshot = load()
+        if snapshot is None:
+            return None
+        with self._lock:
+            self._entries[student_id] = (snapshot, version, today, time.monotonic() + self.ttl)
+            self._entries.move_to_end(student_id)
+            while len(self._entries) > self.max_students:
+                self._entries.popitem(last=False)
+        return snapshot
+
+    def invalidate(self, student_ids):
+        with self._lock:
+            for student_id in student_ids:
+                student_id = int(student_id)
+                self._versions[student_id] = self._versions.get(student_id, 0) + 1
+                self._entries.pop(student_id, None)
+            self._stats['invalidations'] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats, students=len(self._entries))